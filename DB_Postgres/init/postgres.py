@@ -1,3 +1,5 @@
+import os
+
 import psycopg2
 from psycopg2 import sql
 
@@ -7,6 +9,7 @@ DB_USER     = "postgres_user"
 DB_PASSWORD = "postgres_password"
 DB_HOST     = "localhost"
 DB_PORT     = "5430"
+REBUILD_ATTENDANCE_BITMAPS = os.getenv("REBUILD_ATTENDANCE_BITMAPS", "0") == "1"
 
 def main():
     conn = psycopg2.connect(
@@ -82,7 +85,11 @@ def main():
             CREATE TABLE IF NOT EXISTS Material_of_lecture (
                 id SERIAL PRIMARY KEY,
                 name VARCHAR(100) NOT NULL,
-                course_of_lecture_id INTEGER REFERENCES Lecture(id))
+                course_of_lecture_id INTEGER REFERENCES Lecture(id));
+
+            -- before в CDC-событиях несёт лекцию удалённого или перенесённого
+            -- материала (DB_scripts/elastic_cdc_sync.py), а не только id
+            ALTER TABLE Material_of_lecture REPLICA IDENTITY FULL;
         """)
 
         
@@ -115,6 +122,9 @@ def main():
             ON Schedule
             FOR EACH ROW
             EXECUTE FUNCTION trg_compute_schedule_semester();
+
+            -- старая дата нужна в before CDC-событий (снимки отчётов lab2)
+            ALTER TABLE Schedule REPLICA IDENTITY FULL;
         """)
         
         # 3. Студенты
@@ -126,6 +136,9 @@ def main():
                 mail     VARCHAR(100),
                 group_id INTEGER REFERENCES St_group(id)
             );
+
+            -- before в CDC-событиях несёт старые name/mail/group_id (redis_cdc_sync.py)
+            ALTER TABLE Students REPLICA IDENTITY FULL;
         """)
         
         # 4. Attendance — родительская партиционированная таблица
@@ -147,6 +160,7 @@ def main():
                 'Attendance_' || sem,
                 sem
             );
+            EXECUTE format('ALTER TABLE %I REPLICA IDENTITY FULL', 'Attendance_' || sem);
             END;
             $$ LANGUAGE plpgsql;
         """)
@@ -198,9 +212,345 @@ def main():
             -- А это значение списка:
             sem
         );
+        -- у Attendance нет ключа: before в CDC-событиях партиции несёт всю строку
+        -- (attendance_bitmap.py в lab1/lab3), а UPDATE/DELETE не отвергаются публикацией
+        EXECUTE format('ALTER TABLE %I REPLICA IDENTITY FULL', 'Attendance_' || sem);
         END;
         $$ LANGUAGE plpgsql;
     """)
+        cur.execute("""
+            DO $$
+            DECLARE
+                part REGCLASS;
+            BEGIN
+            FOR part IN SELECT inhrelid::REGCLASS FROM pg_inherits WHERE inhparent = 'attendance'::REGCLASS LOOP
+                EXECUTE format('ALTER TABLE %s REPLICA IDENTITY FULL', part);
+            END LOOP;
+            END;
+            $$;
+        """)
+
+        # 6. updated_at для инкрементальной синхронизации (DB_scripts/neo4j_sync.py)
+        cur.execute("""
+            CREATE OR REPLACE FUNCTION trg_touch_updated_at() RETURNS TRIGGER
+                LANGUAGE plpgsql AS $$
+                BEGIN
+                NEW.updated_at := now();
+                RETURN NEW;
+                END;
+                $$;
+        """)
+        for table in ("University", "Institute", "Department", "Specialty", "St_group",
+                      "Course_of_lecture", "Lecture", "Material_of_lecture", "Schedule", "Students"):
+            cur.execute(sql.SQL("""
+                ALTER TABLE {table}
+                    ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT now();
+                CREATE INDEX IF NOT EXISTS {index} ON {table} (updated_at);
+                DROP TRIGGER IF EXISTS {trigger} ON {table};
+                CREATE TRIGGER {trigger}
+                BEFORE INSERT OR UPDATE
+                ON {table}
+                FOR EACH ROW
+                EXECUTE FUNCTION trg_touch_updated_at();
+            """).format(
+                table=sql.Identifier(table.lower()),
+                index=sql.Identifier(f"{table.lower()}_updated_at_idx"),
+                trigger=sql.Identifier(f"{table.lower()}_touch_updated_at"),
+            ))
+
+        # Watermark последней синхронизации: (приёмник, таблица) -> max(updated_at)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS sync_watermark (
+                target     TEXT NOT NULL,
+                table_name TEXT NOT NULL,
+                watermark  TIMESTAMPTZ NOT NULL,
+                synced_at  TIMESTAMPTZ NOT NULL DEFAULT now(),
+                PRIMARY KEY (target, table_name)
+            );
+        """)
+
+        # 7. Снимки отчёта по аудиториям (lab2_service/audience_snapshot.py)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS audience_report_snapshot (
+                year     INTEGER  NOT NULL,
+                semester SMALLINT NOT NULL CHECK (semester IN (1, 2)),
+                report   JSONB    NOT NULL,
+                built_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                PRIMARY KEY (year, semester)
+            );
+        """)
+
+        # 8. Компактное представление посещаемости: битовая карта на (студент, семестр).
+        # Занятию семестра один раз выдаётся номер бита (attendance_bit_slot);
+        # recorded — есть ли строка Attendance, attended — был ли студент.
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS attendance_bit_slot (
+                schedule_id INTEGER PRIMARY KEY REFERENCES Schedule(id) ON DELETE CASCADE,
+                semester    TEXT    NOT NULL,
+                slot        INTEGER NOT NULL,
+                UNIQUE (semester, slot)
+            );
+            CREATE TABLE IF NOT EXISTS attendance_bitmap (
+                student_id INTEGER NOT NULL REFERENCES Students(id) ON DELETE CASCADE,
+                semester   TEXT    NOT NULL,
+                recorded   VARBIT  NOT NULL,
+                attended   VARBIT  NOT NULL,
+                PRIMARY KEY (student_id, semester)
+            );
+
+            -- a | b для строк разной длины: короткая дополняется нулями справа
+            DROP FUNCTION IF EXISTS varbit_set(VARBIT, INTEGER, INTEGER);
+            CREATE OR REPLACE FUNCTION varbit_or(a VARBIT, b VARBIT) RETURNS VARBIT
+                LANGUAGE sql IMMUTABLE STRICT AS $$
+                SELECT (a || repeat('0', greatest(length(b) - length(a), 0))::VARBIT)
+                     | (b || repeat('0', greatest(length(a) - length(b), 0))::VARBIT)
+                $$;
+
+            -- bit_count() появилась только в PostgreSQL 14, а образ — 13
+            CREATE OR REPLACE FUNCTION varbit_popcount(bits VARBIT) RETURNS INTEGER
+                LANGUAGE sql IMMUTABLE STRICT AS $$
+                SELECT length(replace(bits::TEXT, '0', ''))
+                $$;
+
+            -- карты пересчитываются по парам (студент, семестр) без перебора партиций
+            CREATE INDEX IF NOT EXISTS attendance_student_semester_idx ON Attendance (student_id, semester);
+
+            -- Номера битов новым занятиям: подряд внутри семестра, после уже выданных.
+            -- MAX(slot) + 1 требует блокировки семестра; она держится до конца
+            -- транзакции, но берётся только транзакциями, у которых есть новые занятия.
+            CREATE OR REPLACE FUNCTION assign_attendance_slots(p_schedule_ids INTEGER[], p_semesters TEXT[])
+                RETURNS VOID
+                LANGUAGE plpgsql AS $$
+                DECLARE
+                    sem TEXT;
+                BEGIN
+                -- семестры блокируются по порядку, чтобы транзакции не ждали друг друга по кругу
+                FOR sem IN SELECT DISTINCT unnest(p_semesters) ORDER BY 1 LOOP
+                    PERFORM pg_advisory_xact_lock(hashtext('attendance_bit_slot:' || sem));
+                END LOOP;
+                -- отдельный запрос после блокировки видит номера, выданные до неё
+                INSERT INTO attendance_bit_slot (schedule_id, semester, slot)
+                SELECT f.schedule_id, f.semester,
+                       COALESCE(m.max_slot, -1) + row_number() OVER (PARTITION BY f.semester ORDER BY f.schedule_id)
+                FROM (
+                    SELECT DISTINCT ON (t.schedule_id) t.schedule_id, t.semester
+                    FROM unnest(p_schedule_ids, p_semesters) AS t(schedule_id, semester)
+                    WHERE NOT EXISTS (SELECT 1 FROM attendance_bit_slot s WHERE s.schedule_id = t.schedule_id)
+                ) f
+                LEFT JOIN (
+                    SELECT semester, MAX(slot) AS max_slot
+                    FROM attendance_bit_slot
+                    WHERE semester = ANY(p_semesters)
+                    GROUP BY semester
+                ) m USING (semester);
+                END;
+                $$;
+
+            -- Пересчёт карт пар (студент, семестр) по строкам Attendance, оставшимся
+            -- после изменения: дубликат строки даёт тот же бит, и удаление одной
+            -- из двух одинаковых строк бит не снимает; пара без строк теряет карту
+            CREATE OR REPLACE FUNCTION refresh_attendance_bitmaps(p_student_ids INTEGER[], p_semesters TEXT[])
+                RETURNS VOID
+                LANGUAGE plpgsql AS $$
+                BEGIN
+                -- сначала блокируем карты: параллельная вставка в ту же пару дождётся
+                -- пересчёта, а следующий запрос (свежий снимок) увидит её закоммиченные строки
+                PERFORM 1
+                FROM attendance_bitmap b
+                JOIN unnest(p_student_ids, p_semesters) AS t(student_id, semester)
+                  ON b.student_id = t.student_id AND b.semester = t.semester
+                ORDER BY b.student_id, b.semester
+                FOR UPDATE OF b;
+                DELETE FROM attendance_bitmap b
+                USING unnest(p_student_ids, p_semesters) AS t(student_id, semester)
+                WHERE b.student_id = t.student_id AND b.semester = t.semester;
+                WITH targets AS (
+                    SELECT DISTINCT student_id, semester
+                    FROM unnest(p_student_ids, p_semesters) AS t(student_id, semester)
+                ), cells AS (
+                    SELECT a.student_id, a.semester, s.slot, bool_or(a.attended) AS attended
+                    FROM targets t
+                    JOIN Attendance a ON a.student_id = t.student_id AND a.semester = t.semester
+                    JOIN attendance_bit_slot s ON s.schedule_id = a.schedule_id
+                    GROUP BY a.student_id, a.semester, s.slot
+                ), pairs AS (
+                    SELECT student_id, semester, MAX(slot) AS last_slot
+                    FROM cells
+                    GROUP BY student_id, semester
+                )
+                INSERT INTO attendance_bitmap (student_id, semester, recorded, attended)
+                SELECT p.student_id, p.semester,
+                       string_agg(CASE WHEN c.slot IS NULL THEN '0' ELSE '1' END, '' ORDER BY g.i)::VARBIT,
+                       string_agg(CASE WHEN c.attended THEN '1' ELSE '0' END, '' ORDER BY g.i)::VARBIT
+                FROM pairs p
+                CROSS JOIN LATERAL generate_series(0, p.last_slot) AS g(i)
+                LEFT JOIN cells c
+                       ON c.student_id = p.student_id AND c.semester = p.semester AND c.slot = g.i
+                GROUP BY p.student_id, p.semester;
+                END;
+                $$;
+
+            -- Триггер уровня оператора: пакетная вставка (execute_values в
+            -- attendance_generator.py) обрабатывается одним вызовом. INSERT только
+            -- добавляет биты (OR с картой); UPDATE и DELETE могут снять бит, поэтому
+            -- затронутые карты пересчитываются по оставшимся строкам.
+            CREATE OR REPLACE FUNCTION trg_attendance_bitmap() RETURNS TRIGGER
+                LANGUAGE plpgsql AS $$
+                DECLARE
+                    students  INTEGER[];
+                    semesters TEXT[];
+                    schedules INTEGER[];
+                    schedule_semesters TEXT[];
+                BEGIN
+                IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                    SELECT array_agg(schedule_id), array_agg(semester) INTO schedules, schedule_semesters
+                    FROM (
+                        SELECT DISTINCT n.schedule_id, n.semester
+                        FROM new_rows n
+                        WHERE NOT EXISTS (SELECT 1 FROM attendance_bit_slot s WHERE s.schedule_id = n.schedule_id)
+                    ) t;
+                    IF schedules IS NOT NULL THEN
+                        PERFORM assign_attendance_slots(schedules, schedule_semesters);
+                    END IF;
+                END IF;
+
+                IF TG_OP = 'INSERT' THEN
+                    -- ON CONFLICT обновляет последнюю версию карты, поэтому параллельные
+                    -- вставки в ту же пару не теряют биты друг друга и не ждут конца транзакций
+                    WITH cells AS (
+                        SELECT n.student_id, n.semester, s.slot, bool_or(n.attended) AS attended
+                        FROM new_rows n
+                        JOIN attendance_bit_slot s ON s.schedule_id = n.schedule_id
+                        GROUP BY n.student_id, n.semester, s.slot
+                    ), pairs AS (
+                        SELECT student_id, semester, MAX(slot) AS last_slot
+                        FROM cells
+                        GROUP BY student_id, semester
+                    )
+                    INSERT INTO attendance_bitmap AS b (student_id, semester, recorded, attended)
+                    SELECT p.student_id, p.semester,
+                           string_agg(CASE WHEN c.slot IS NULL THEN '0' ELSE '1' END, '' ORDER BY g.i)::VARBIT,
+                           string_agg(CASE WHEN c.attended THEN '1' ELSE '0' END, '' ORDER BY g.i)::VARBIT
+                    FROM pairs p
+                    CROSS JOIN LATERAL generate_series(0, p.last_slot) AS g(i)
+                    LEFT JOIN cells c
+                           ON c.student_id = p.student_id AND c.semester = p.semester AND c.slot = g.i
+                    GROUP BY p.student_id, p.semester
+                    ORDER BY p.student_id, p.semester
+                    ON CONFLICT (student_id, semester) DO UPDATE
+                    SET recorded = varbit_or(b.recorded, EXCLUDED.recorded),
+                        attended = varbit_or(b.attended, EXCLUDED.attended);
+                    RETURN NULL;
+                END IF;
+
+                IF TG_OP = 'UPDATE' THEN
+                    SELECT array_agg(student_id), array_agg(semester) INTO students, semesters
+                    FROM (SELECT student_id, semester FROM old_rows
+                          UNION
+                          SELECT student_id, semester FROM new_rows) p;
+                ELSE
+                    SELECT array_agg(student_id), array_agg(semester) INTO students, semesters
+                    FROM (SELECT DISTINCT student_id, semester FROM old_rows) p;
+                END IF;
+                IF students IS NOT NULL THEN
+                    PERFORM refresh_attendance_bitmaps(students, semesters);
+                END IF;
+                RETURN NULL;
+                END;
+                $$;
+            DROP FUNCTION IF EXISTS attendance_slot(INTEGER, TEXT);
+            DROP TRIGGER IF EXISTS attendance_maintain_bitmap ON Attendance;
+            DROP TRIGGER IF EXISTS attendance_bitmap_insert ON Attendance;
+            DROP TRIGGER IF EXISTS attendance_bitmap_update ON Attendance;
+            DROP TRIGGER IF EXISTS attendance_bitmap_delete ON Attendance;
+            -- у триггера с transition-таблицами может быть только одно событие
+            CREATE TRIGGER attendance_bitmap_insert
+            AFTER INSERT ON Attendance
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT
+            EXECUTE FUNCTION trg_attendance_bitmap();
+            CREATE TRIGGER attendance_bitmap_update
+            AFTER UPDATE ON Attendance
+            REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+            FOR EACH STATEMENT
+            EXECUTE FUNCTION trg_attendance_bitmap();
+            CREATE TRIGGER attendance_bitmap_delete
+            AFTER DELETE ON Attendance
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT
+            EXECUTE FUNCTION trg_attendance_bitmap();
+
+            -- Процент посещаемости студента за семестр
+            CREATE OR REPLACE FUNCTION attendance_percent(p_student_id INTEGER, p_semester TEXT) RETURNS NUMERIC
+                LANGUAGE sql STABLE AS $$
+                SELECT round(100.0 * varbit_popcount(attended) / NULLIF(varbit_popcount(recorded), 0), 2)
+                FROM attendance_bitmap
+                WHERE student_id = p_student_id AND semester = p_semester
+                $$;
+
+            -- Посещаемость всех студентов семестра: читаются только битовые карты
+            CREATE OR REPLACE FUNCTION semester_attendance(p_semester TEXT)
+                RETURNS TABLE (student_id INTEGER, attended INTEGER, recorded INTEGER, percent NUMERIC)
+                LANGUAGE sql STABLE AS $$
+                SELECT b.student_id,
+                       varbit_popcount(b.attended),
+                       varbit_popcount(b.recorded),
+                       round(100.0 * varbit_popcount(b.attended) / NULLIF(varbit_popcount(b.recorded), 0), 2)
+                FROM attendance_bitmap b
+                WHERE b.semester = p_semester
+                $$;
+
+            -- Полная пересборка карт по строкам Attendance (заполнение уже загруженных данных)
+            CREATE OR REPLACE FUNCTION rebuild_attendance_bitmaps() RETURNS INTEGER
+                LANGUAGE plpgsql AS $$
+                DECLARE
+                    n INTEGER;
+                BEGIN
+                LOCK TABLE Attendance IN SHARE MODE;
+                LOCK TABLE attendance_bit_slot IN EXCLUSIVE MODE;
+                INSERT INTO attendance_bit_slot (schedule_id, semester, slot)
+                SELECT f.schedule_id, f.semester,
+                       COALESCE(m.max_slot, -1) + row_number() OVER (PARTITION BY f.semester ORDER BY f.schedule_id)
+                FROM (
+                    SELECT DISTINCT a.schedule_id, a.semester
+                    FROM Attendance a
+                    WHERE NOT EXISTS (SELECT 1 FROM attendance_bit_slot s WHERE s.schedule_id = a.schedule_id)
+                ) f
+                LEFT JOIN (
+                    SELECT semester, MAX(slot) AS max_slot FROM attendance_bit_slot GROUP BY semester
+                ) m USING (semester);
+
+                DELETE FROM attendance_bitmap;
+                WITH cells AS (
+                    SELECT a.student_id, a.semester, s.slot, bool_or(a.attended) AS attended
+                    FROM Attendance a
+                    JOIN attendance_bit_slot s ON s.schedule_id = a.schedule_id
+                    GROUP BY a.student_id, a.semester, s.slot
+                ), pairs AS (
+                    SELECT student_id, semester, MAX(slot) AS last_slot
+                    FROM cells
+                    GROUP BY student_id, semester
+                )
+                INSERT INTO attendance_bitmap (student_id, semester, recorded, attended)
+                SELECT p.student_id, p.semester,
+                       string_agg(CASE WHEN c.slot IS NULL THEN '0' ELSE '1' END, '' ORDER BY g.i)::VARBIT,
+                       string_agg(CASE WHEN c.attended THEN '1' ELSE '0' END, '' ORDER BY g.i)::VARBIT
+                FROM pairs p
+                CROSS JOIN LATERAL generate_series(0, p.last_slot) AS g(i)
+                LEFT JOIN cells c
+                       ON c.student_id = p.student_id AND c.semester = p.semester AND c.slot = g.i
+                GROUP BY p.student_id, p.semester;
+                GET DIAGNOSTICS n = ROW_COUNT;
+                RETURN n;
+                END;
+                $$;
+        """)
+        # Строки, загруженные до появления триггера, в картах не отражены. Полная
+        # пересборка блокирует запись в Attendance, поэтому только по запросу:
+        # REBUILD_ATTENDANCE_BITMAPS=1 python postgres.py
+        if REBUILD_ATTENDANCE_BITMAPS:
+            cur.execute("SELECT rebuild_attendance_bitmaps()")
+            print(f"Битовые карты посещаемости: {cur.fetchone()[0]}")
 
         conn.commit()
         print("Схема успешно создана и настроена на партиционирование!")
@@ -1,6 +1,7 @@
 import json
 import psycopg2
 import psycopg2.errors
+from psycopg2.extras import execute_values
 from datetime import datetime, timedelta
 import random
 import logging
@@ -104,6 +105,9 @@ def generate_students_and_attendance(cur, students_per_group=20):
         sched_ids = [s[0] for s in sessions]
         attend_counts = random.sample(range(1, total), students_per_group)
 
+        # строки посещаемости группы вставляются одним INSERT: триггер битовых
+        # карт Attendance (уровня оператора) срабатывает один раз на группу
+        attendance_rows = []
         for count in attend_counts:
             name = f"stud{random.randint(10000, 99999)}"
             age = random.randint(17, 24)
@@ -121,15 +125,14 @@ def generate_students_and_attendance(cur, students_per_group=20):
 
             visited = set(random.sample(sched_ids, k=count))
             for sid in sched_ids:
-                attended = sid in visited
-                sem = sid_to_sem[sid]
-                cur.execute(
-                    """
-                    INSERT INTO Attendance (student_id, schedule_id, attended, semester)
-                    VALUES (%s, %s, %s, %s)
-                    """,
-                    (student_id, sid, attended, sem)
-                )
+                attendance_rows.append((student_id, sid, sid in visited, sid_to_sem[sid]))
+
+        execute_values(
+            cur,
+            "INSERT INTO Attendance (student_id, schedule_id, attended, semester) VALUES %s",
+            attendance_rows,
+            page_size=len(attendance_rows) or 1
+        )
 
     logger.info("Генерация студентов и посещаемости завершена")
 
@@ -0,0 +1,243 @@
+"""
+Инкрементальная индексация lecture_materials в Elasticsearch по CDC-событиям.
+
+elastic_gen_sync.generate_and_sync_lecture_materials пересобирает индекс целиком
+(по одному es.index на лекцию). Этот consumer между полными прогонами
+переиндексирует только затронутые документы:
+  - postgres_server.public.lecture — сама лекция (и старый, и новый id);
+  - postgres_server.public.course_of_lecture — все лекции курса (course_name);
+  - postgres_server.public.material_of_lecture — лекции из before и after
+    (Material_of_lecture.course_of_lecture_id ссылается на Lecture; before
+    с этим полем есть и у удаления благодаря REPLICA IDENTITY FULL).
+Документы собираются тем же build_lecture_document одним запросом на пачку
+и уходят через bulk API: update с doc_as_upsert, delete для исчезнувших лекций.
+Пачка сбрасывается по числу затронутых лекций (BULK_MAX_ACTIONS) или через
+BULK_FLUSH_INTERVAL_S после первого события; запросы bulk дополнительно
+режутся по BULK_MAX_BYTES. Offset'ы коммитятся после записи и увеличения
+поколения кэша поиска.
+"""
+import json
+import logging
+import os
+import time
+
+import psycopg2
+import redis
+from elasticsearch import Elasticsearch
+from faker import Faker
+from kafka import KafkaConsumer
+
+from elastic_gen_sync import (
+    bump_index_generation, build_lecture_document, ensure_lecture_index,
+    fetch_lectures, write_lecture_file,
+)
+
+KAFKA_BOOTSTRAP_SERVERS = ['localhost:9092']
+LECTURE_TOPIC = 'postgres_server.public.lecture'
+COURSE_TOPIC = 'postgres_server.public.course_of_lecture'
+MATERIAL_TOPIC = 'postgres_server.public.material_of_lecture'
+GROUP_ID = 'elastic-lecture-cdc-consumer-group'
+
+PG_CONFIG = {
+    'dbname': "postgres_db",
+    'user': "postgres_user",
+    'password': "postgres_password",
+    'host': "localhost",
+    'port': "5430"
+}
+ES_CONFIG = {
+    'hosts': ["http://localhost:9200"],
+    'basic_auth': ("elastic", "secret"),
+    'verify_certs': False
+}
+REDIS_HOST = 'localhost'
+REDIS_PORT = 6379
+
+INDEX = "lecture_materials"
+MATERIALS_DIR = "./lecture_materials"
+
+# Лекций в пачке, после которых она сбрасывается, не дожидаясь таймера
+BULK_MAX_ACTIONS = 500
+# Предел тела одного запроса bulk (рекомендуемые 5-15 МБ)
+BULK_MAX_BYTES = 5 * 1024 * 1024
+BULK_FLUSH_INTERVAL_S = 1.0
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s %(levelname)s [%(name)s] %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+logger = logging.getLogger('kafka_elastic_lecture_sync')
+
+
+def _payload(value):
+    if not value:
+        return None
+    return value['payload'] if isinstance(value, dict) and 'payload' in value else value
+
+
+def bulk_chunks(operations, max_actions=BULK_MAX_ACTIONS, max_bytes=BULK_MAX_BYTES):
+    """
+    Делит [(action, source или None)] на тела запросов bulk не больше
+    max_actions действий и примерно max_bytes байт NDJSON.
+    """
+    chunk, size = [], 0
+    for action, source in operations:
+        lines = [action] if source is None else [action, source]
+        length = sum(len(json.dumps(line, ensure_ascii=False).encode('utf-8')) + 1 for line in lines)
+        if chunk and (len(chunk) >= max_actions or size + length > max_bytes):
+            yield chunk
+            chunk, size = [], 0
+        chunk.append(lines)
+        size += length
+    if chunk:
+        yield chunk
+
+
+class LectureIndexer:
+    def __init__(self, es, pg_conn, r=None, materials_dir=MATERIALS_DIR):
+        self.es = es
+        self.pg_conn = pg_conn
+        self.r = r
+        self.materials_dir = materials_dir
+        self.fake = Faker("ru_RU")
+        self.dirty_lectures = set()
+        self.dirty_courses = set()
+
+    def __len__(self):
+        return len(self.dirty_lectures) + len(self.dirty_courses)
+
+    def add(self, topic, payload):
+        op, before, after = payload.get('op'), payload.get('before'), payload.get('after')
+        images = [image for image in (before, after) if image]
+        if topic == LECTURE_TOPIC:
+            self.dirty_lectures.update(image['id'] for image in images if image.get('id') is not None)
+        elif topic == MATERIAL_TOPIC:
+            self.dirty_lectures.update(image['course_of_lecture_id'] for image in images
+                                       if image.get('course_of_lecture_id') is not None)
+        elif topic == COURSE_TOPIC:
+            # удаление курса приходит удалениями его лекций; у курса в документе только имя
+            if op == 'd' or not after or after.get('id') is None:
+                return
+            if before and 'name' in before and before['name'] == after.get('name'):
+                return
+            self.dirty_courses.add(after['id'])
+
+    def _lecture_ids(self, cur):
+        ids = set(self.dirty_lectures)
+        if self.dirty_courses:
+            cur.execute("SELECT id FROM Lecture WHERE course_of_lecture_id = ANY(%s)",
+                        (list(self.dirty_courses),))
+            ids.update(row[0] for row in cur.fetchall())
+        return ids
+
+    def operations(self):
+        """[(action, source)] для затронутых лекций: upsert существующих, delete исчезнувших."""
+        with self.pg_conn.cursor() as cur:
+            ids = self._lecture_ids(cur)
+            rows = fetch_lectures(cur, ids) if ids else []
+        self.pg_conn.commit()
+
+        operations, found = [], set()
+        for lecture_id, lecture_name, course_name, materials in rows:
+            doc = build_lecture_document(lecture_id, lecture_name, course_name,
+                                         materials, self.materials_dir, self.fake)
+            write_lecture_file(doc)
+            operations.append(({"update": {"_index": INDEX, "_id": lecture_id}},
+                               {"doc": doc, "doc_as_upsert": True}))
+            found.add(lecture_id)
+        for lecture_id in sorted(ids - found):
+            operations.append(({"delete": {"_index": INDEX, "_id": lecture_id}}, None))
+            path = os.path.join(self.materials_dir, f"lecture_{lecture_id}.txt")
+            if os.path.exists(path):
+                os.remove(path)
+        return operations
+
+    def _bulk(self, chunk):
+        # wait_for: к увеличению поколения кэша документы уже видны поиску
+        response = self.es.bulk(operations=[line for lines in chunk for line in lines], refresh="wait_for")
+        if not response.get('errors'):
+            return
+        failed = []
+        for item in response['items']:
+            action, result = next(iter(item.items()))
+            if 'error' not in result and result.get('status', 200) < 300:
+                continue
+            if action == 'delete' and result.get('status') == 404:
+                continue  # документа и не было
+            failed.append(f"{action} {result.get('_id')}: {result.get('error')}")
+        if failed:
+            raise RuntimeError(f"Bulk request failed for {len(failed)} actions: {failed[:5]}")
+
+    def flush(self):
+        """Записывает пачку; возвращает (действий, запросов bulk)."""
+        if not len(self):
+            return 0, 0
+        operations = self.operations()
+        requests = 0
+        for chunk in bulk_chunks(operations):
+            self._bulk(chunk)
+            requests += 1
+        if requests:
+            bump_index_generation(redis_conn=self.r)
+        self.dirty_lectures, self.dirty_courses = set(), set()
+        return len(operations), requests
+
+
+def consume(indexer, max_actions=BULK_MAX_ACTIONS, flush_interval=BULK_FLUSH_INTERVAL_S):
+    topics = [LECTURE_TOPIC, COURSE_TOPIC, MATERIAL_TOPIC]
+    logger.info(f"Starting Kafka consumer for topics: {topics}, group_id={GROUP_ID}")
+    consumer = KafkaConsumer(
+        *topics,
+        bootstrap_servers=KAFKA_BOOTSTRAP_SERVERS,
+        group_id=GROUP_ID,
+        auto_offset_reset='earliest',
+        enable_auto_commit=False,
+        max_poll_records=max_actions,
+        value_deserializer=lambda m: json.loads(m.decode('utf-8')) if m else None
+    )
+
+    events, opened = 0, None
+    try:
+        while True:
+            records = consumer.poll(timeout_ms=int(flush_interval * 1000))
+            for tp, msgs in records.items():
+                for msg in msgs:
+                    payload = _payload(msg.value)
+                    if not payload:
+                        continue
+                    indexer.add(tp.topic, payload)
+                    events += 1
+            if events and opened is None:
+                opened = time.monotonic()
+            if not events:
+                continue
+            if len(indexer) < max_actions and time.monotonic() - opened < flush_interval:
+                continue
+            t0 = time.monotonic()
+            actions, requests = indexer.flush()
+            consumer.commit()
+            logger.info(f"Indexed {events} events as {actions} bulk actions in {requests} requests, "
+                        f"{(time.monotonic() - t0) * 1000:.0f}ms")
+            events, opened = 0, None
+    finally:
+        consumer.close()
+        logger.info("Kafka consumer closed")
+
+
+def main():
+    os.makedirs(MATERIALS_DIR, exist_ok=True)
+    pg_conn = psycopg2.connect(**PG_CONFIG)
+    es = Elasticsearch(**ES_CONFIG)
+    r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT)
+    try:
+        ensure_lecture_index(es)
+        consume(LectureIndexer(es, pg_conn, r))
+    finally:
+        r.close()
+        es.close()
+        pg_conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,225 @@
 import os
 from elasticsearch import Elasticsearch
 import psycopg2
+import redis
 from faker import Faker
 from typing import Dict, List
 
+# Must match GENERATION_KEY in project_services/lab1_service/search_cache.py
+LECTURE_INDEX_GENERATION_KEY = "lecture_materials:generation"
+
+def bump_index_generation(redis_host: str = "localhost", redis_port: int = 6379, redis_conn=None) -> None:
+    """Invalidate cached lecture searches after the lecture_materials index changed."""
+    r = redis_conn if redis_conn is not None else redis.Redis(host=redis_host, port=redis_port)
+    try:
+        r.incr(LECTURE_INDEX_GENERATION_KEY)
+    except redis.RedisError as e:
+        print(f"Could not bump {LECTURE_INDEX_GENERATION_KEY}: {e}")
+    finally:
+        if redis_conn is None:
+            r.close()
+
+# Русские академические термины для более реалистичного содержания
+ACADEMIC_TERMS = [
+    # Fundamental concepts
+    "теория", "практика", "методология", "исследование",
+    "анализ", "синтез", "гипотеза", "эксперимент",
+    "формула", "уравнение", "концепция", "парадигма",
+    "алгоритм", "модель", "структура", "система",
+
+    # Scientific methods
+    "наблюдение", "верификация", "фальсификация", "индукция",
+    "дедукция", "абстракция", "аксиома", "постулат",
+    "корреляция", "регрессия", "статистика", "выборка",
+    "репрезентативность", "валидность", "репликация",
+
+    # Mathematics
+    "интеграл", "дифференциал", "матрица", "вектор",
+    "тензор", "топология", "граф", "множество",
+    "изоморфизм", "гомоморфизм", "биекция", "инъекция",
+    "сюръекция", "тождество", "константа", "переменная",
+
+    # Physics
+    "квант", "поле", "частица", "волна",
+    "энтропия", "энергия", "масса", "заряд",
+    "спин", "орбиталь", "валентность", "кристалл",
+    "дифракция", "интерференция", "поляризация", "резонанс",
+
+    # Computer Science
+    "программа", "компилятор", "интерпретатор", "байт",
+    "бит", "шифрование", "хеш", "автомат",
+    "нейронная сеть", "градиент", "оптимизация", "композиция",
+    "инкапсуляция", "наследование", "полиморфизм", "итерация",
+
+    # Biology/Chemistry
+    "клетка", "организм", "фермент", "катализатор",
+    "реакция", "соединение", "молекула", "атом",
+    "электрон", "протон", "нейтрон", "изотоп",
+    "полимер", "мономер", "липид", "белок",
+
+    # Humanities
+    "дискурс", "нарратив", "герменевтика", "феномен",
+    "ноумен", "гносеология", "онтология", "диалектика",
+    "семиотика", "синтагма", "парадигма", "интенция",
+
+    # Engineering
+    "конструкция", "механизм", "привод", "трансмиссия",
+    "устойчивость", "надежность", "прочность", "жесткость",
+    "деформация", "напряжение", "усталость", "трение",
+
+    # Advanced terms
+    "бифуркация", "аттрактор", "фрактал", "энтропия",
+    "эмерджентность", "рекурсия", "инвариант", "топос",
+    "морфизм", "функтор", "категорность", "гомология",
+
+    # Academic processes
+    "публикация", "рецензирование", "цитирование", "индексация",
+    "аппликация", "аппроксимация", "итерация", "конвергенция",
+    "дивергенция", "оптимизация", "максимизация", "минимизация"
+]
+
+
+def ensure_lecture_index(es) -> None:
+    """Создание индекса Elasticsearch с упрощенной поддержкой русского языка (если его ещё нет)."""
+    if not es.indices.exists(index="lecture_materials"):
+        es.indices.create(
+            index="lecture_materials",
+            settings={
+                "analysis": {
+                    "analyzer": {
+                        "russian": {
+                            "type": "custom",
+                            "tokenizer": "standard",
+                            "filter": [
+                                "lowercase",
+                                "stop",
+                                "snowball"
+                            ]
+                        }
+                    },
+                    "filter": {
+                        "russian_stop": {
+                            "type": "stop",
+                            "stopwords": "_russian_"
+                        },
+                        "russian_stemmer": {
+                            "type": "snowball",
+                            "language": "Russian"
+                        }
+                    }
+                }
+            },
+            mappings={
+                "properties": {
+                    "lecture_id": {"type": "integer"},
+                    "lecture_name": {
+                        "type": "text",
+                        "analyzer": "russian",
+                        "fields": {"keyword": {"type": "keyword"}}
+                    },
+                    "course_name": {
+                        "type": "text",
+                        "analyzer": "russian",
+                        "fields": {"keyword": {"type": "keyword"}}
+                    },
+                    "content": {
+                        "type": "text",
+                        "analyzer": "russian"
+                    },
+                    "keywords": {"type": "keyword"},
+                    "generated_content": {"type": "boolean"},
+                    "file_path": {"type": "keyword"},
+                    "materials": {"type": "text", "analyzer": "russian"}
+                }
+            }
+        )
+
+
+def build_lecture_document(lecture_id: int, lecture_name: str, course_name: str,
+                           materials: List[str], materials_dir: str, fake: Faker) -> Dict:
+    """
+    Документ lecture_materials для одной лекции. Общий для полной синхронизации
+    и CDC-индексатора (elastic_cdc_sync.py). Генератор пересевается по lecture_id,
+    поэтому содержимое лекции не зависит от того, каким путём и в каком порядке
+    она индексируется.
+    """
+    fake.seed_instance(lecture_id)
+    content = f"""
+    Лекция: {lecture_name}
+    Курс: {course_name}
+    Преподаватель: {fake.name()}
+
+    Основные понятия:
+    {fake.paragraph(nb_sentences=8, variable_nb_sentences=True)}
+
+    Теоретическая часть:
+    {fake.paragraph(nb_sentences=12, variable_nb_sentences=True)}
+
+    Практическое применение:
+    {fake.paragraph(nb_sentences=10, variable_nb_sentences=True)}
+
+    Рекомендуемая литература:
+    1. {fake.catch_phrase()} / {fake.name()}
+    2. {fake.catch_phrase()} / {fake.name()}
+    """
+
+    # Добавьте несколько академических терминов, чтобы сделать его более доступным для поиска.
+    for term in ACADEMIC_TERMS[:3]:
+        content = content.replace(". ", f" {term}. ", 1)
+    keywords = list(set([
+        *course_name.lower().split(),
+        *lecture_name.lower().split(),
+        *fake.words(nb=3),
+        *ACADEMIC_TERMS[:2]
+    ]))
+    return {
+        "lecture_id": lecture_id,
+        "lecture_name": lecture_name,
+        "course_name": course_name,
+        "content": content,
+        "keywords": keywords,
+        "materials": materials,
+        "generated_content": True,
+        "file_path": os.path.join(materials_dir, f"lecture_{lecture_id}.txt")
+    }
+
+
+def write_lecture_file(doc: Dict) -> None:
+    """Сохранить в файле текст лекции."""
+    with open(doc["file_path"], 'w', encoding='utf-8') as f:
+        f.write(doc["content"])
+
+
+def fetch_lectures(pg_cur, lecture_ids=None) -> List[tuple]:
+    """
+    (lecture_id, lecture_name, course_name, [названия материалов]) для всех лекций
+    или только для lecture_ids. Материалы собираются тем же запросом
+    (Material_of_lecture.course_of_lecture_id ссылается на Lecture).
+    """
+    where = "" if lecture_ids is None else "WHERE l.id = ANY(%s)"
+    pg_cur.execute(f"""
+        SELECT l.id, l.name, c.name as course_name,
+               COALESCE(array_agg(m.name ORDER BY m.id) FILTER (WHERE m.id IS NOT NULL), '{{}}')
+        FROM Lecture l
+        JOIN Course_of_lecture c ON l.course_of_lecture_id = c.id
+        LEFT JOIN Material_of_lecture m ON m.course_of_lecture_id = l.id
+        {where}
+        GROUP BY l.id, l.name, c.name
+    """, None if lecture_ids is None else (list(lecture_ids),))
+    return pg_cur.fetchall()
+
+
 def generate_and_sync_lecture_materials(
     es_host: str = "localhost",
     es_port: int = 9200,
     es_user: str = "elastic",
     es_password: str = "secret",
-    materials_dir: str = "./lecture_materials"
+    materials_dir: str = "./lecture_materials",
+    redis_host: str = "localhost",
+    redis_port: int = 6379,
+    pg_conn=None,
+    es=None,
+    redis_conn=None
 ) -> None:
     """
     Generate and sync synthetic lecture materials to Elasticsearch based on PostgreSQL lecture data.
@@ -22,6 +232,11 @@ def generate_and_sync_lecture_materials(
         es_user: Elasticsearch username
         es_password: Elasticsearch password
         materials_dir: Directory to store material text files
+        redis_host: Redis host holding the lecture search cache generation counter
+        redis_port: Redis port
+        pg_conn: Existing PostgreSQL connection to use (not closed here)
+        es: Existing Elasticsearch client to use (not closed here)
+        redis_conn: Existing Redis connection for the generation counter (not closed here)
     """
     fake = Faker("ru_RU")
     Faker.seed(42)
@@ -33,187 +248,34 @@ def generate_and_sync_lecture_materials(
     DB_HOST = "localhost"
     DB_PORT = "5430"
 
-    pg_conn = psycopg2.connect(
-        dbname=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD,
-        host=DB_HOST,
-        port=DB_PORT
-    )
+    owns_pg = pg_conn is None
+    owns_es = es is None
+    if owns_pg:
+        pg_conn = psycopg2.connect(
+            dbname=DB_NAME,
+            user=DB_USER,
+            password=DB_PASSWORD,
+            host=DB_HOST,
+            port=DB_PORT
+        )
     pg_cur = pg_conn.cursor()
-    es = Elasticsearch(
-        hosts=[f"http://{es_host}:{es_port}"],
-        basic_auth=(es_user, es_password),
-        verify_certs=False
-    )
+    if owns_es:
+        es = Elasticsearch(
+            hosts=[f"http://{es_host}:{es_port}"],
+            basic_auth=(es_user, es_password),
+            verify_certs=False
+        )
     
     try:
-        # Создайние индекса Elasticsearch с упрощенной поддержкой русского языка
-        if not es.indices.exists(index="lecture_materials"):
-            es.indices.create(
-                index="lecture_materials",
-                settings={
-                    "analysis": {
-                        "analyzer": {
-                            "russian": {
-                                "type": "custom",
-                                "tokenizer": "standard",
-                                "filter": [
-                                    "lowercase",
-                                    "stop",
-                                    "snowball"
-                                ]
-                            }
-                        },
-                        "filter": {
-                            "russian_stop": {
-                                "type": "stop",
-                                "stopwords": "_russian_"
-                            },
-                            "russian_stemmer": {
-                                "type": "snowball",
-                                "language": "Russian"
-                            }
-                        }
-                    }
-                },
-                mappings={
-                    "properties": {
-                        "lecture_id": {"type": "integer"},
-                        "lecture_name": {
-                            "type": "text",
-                            "analyzer": "russian",
-                            "fields": {"keyword": {"type": "keyword"}}
-                        },
-                        "course_name": {
-                            "type": "text",
-                            "analyzer": "russian",
-                            "fields": {"keyword": {"type": "keyword"}}
-                        },
-                        "content": {
-                            "type": "text",
-                            "analyzer": "russian"
-                        },
-                        "keywords": {"type": "keyword"},
-                        "generated_content": {"type": "boolean"},
-                        "file_path": {"type": "keyword"}
-                    }
-                }
-            )
-        
-        # Получение всех лекции из PostgreSQL с их курсами
-        pg_cur.execute("""
-            SELECT l.id, l.name, c.name as course_name
-            FROM Lecture l
-            JOIN Course_of_lecture c ON l.course_of_lecture_id = c.id
-        """)
-        lectures = pg_cur.fetchall()
+        ensure_lecture_index(es)
         
-        # Русские академические термины для более реалистичного содержания
-        academic_terms = [
-            # Fundamental concepts
-            "теория", "практика", "методология", "исследование",
-            "анализ", "синтез", "гипотеза", "эксперимент",
-            "формула", "уравнение", "концепция", "парадигма",
-            "алгоритм", "модель", "структура", "система",
-            
-            # Scientific methods
-            "наблюдение", "верификация", "фальсификация", "индукция",
-            "дедукция", "абстракция", "аксиома", "постулат",
-            "корреляция", "регрессия", "статистика", "выборка",
-            "репрезентативность", "валидность", "репликация",
-            
-            # Mathematics
-            "интеграл", "дифференциал", "матрица", "вектор",
-            "тензор", "топология", "граф", "множество",
-            "изоморфизм", "гомоморфизм", "биекция", "инъекция",
-            "сюръекция", "тождество", "константа", "переменная",
-            
-            # Physics
-            "квант", "поле", "частица", "волна",
-            "энтропия", "энергия", "масса", "заряд",
-            "спин", "орбиталь", "валентность", "кристалл",
-            "дифракция", "интерференция", "поляризация", "резонанс",
-            
-            # Computer Science
-            "программа", "компилятор", "интерпретатор", "байт",
-            "бит", "шифрование", "хеш", "автомат",
-            "нейронная сеть", "градиент", "оптимизация", "композиция",
-            "инкапсуляция", "наследование", "полиморфизм", "итерация",
-            
-            # Biology/Chemistry
-            "клетка", "организм", "фермент", "катализатор",
-            "реакция", "соединение", "молекула", "атом",
-            "электрон", "протон", "нейтрон", "изотоп",
-            "полимер", "мономер", "липид", "белок",
-            
-            # Humanities
-            "дискурс", "нарратив", "герменевтика", "феномен",
-            "ноумен", "гносеология", "онтология", "диалектика",
-            "семиотика", "синтагма", "парадигма", "интенция",
-            
-            # Engineering
-            "конструкция", "механизм", "привод", "трансмиссия",
-            "устойчивость", "надежность", "прочность", "жесткость",
-            "деформация", "напряжение", "усталость", "трение",
-            
-            # Advanced terms
-            "бифуркация", "аттрактор", "фрактал", "энтропия",
-            "эмерджентность", "рекурсия", "инвариант", "топос",
-            "морфизм", "функтор", "категорность", "гомология",
-            
-            # Academic processes
-            "публикация", "рецензирование", "цитирование", "индексация",
-            "аппликация", "аппроксимация", "итерация", "конвергенция",
-            "дивергенция", "оптимизация", "максимизация", "минимизация"
-        ]
+        # Получение всех лекции из PostgreSQL с их курсами и материалами
+        lectures = fetch_lectures(pg_cur)
         
-        for lecture_id, lecture_name, course_name in lectures:
-            content = f"""
-            Лекция: {lecture_name}
-            Курс: {course_name}
-            Преподаватель: {fake.name()}
-            
-            Основные понятия:
-            {fake.paragraph(nb_sentences=8, variable_nb_sentences=True)}
-            
-            Теоретическая часть:
-            {fake.paragraph(nb_sentences=12, variable_nb_sentences=True)}
-            
-            Практическое применение:
-            {fake.paragraph(nb_sentences=10, variable_nb_sentences=True)}
-            
-            Рекомендуемая литература:
-            1. {fake.catch_phrase()} / {fake.name()}
-            2. {fake.catch_phrase()} / {fake.name()}
-            """
-            
-            # Добавьте несколько академических терминов, чтобы сделать его более доступным для поиска.
-            for term in academic_terms[:3]:
-                content = content.replace(". ", f" {term}. ", 1)
-            keywords = list(set([
-                *course_name.lower().split(),
-                *lecture_name.lower().split(),
-                *fake.words(nb=3),
-                *academic_terms[:2]
-            ]))
-            
-            # Сохранить в файле текст
-            file_name = f"lecture_{lecture_id}.txt"
-            file_path = os.path.join(materials_dir, file_name)
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(content)
-            
-            doc = {
-                "lecture_id": lecture_id,
-                "lecture_name": lecture_name,
-                "course_name": course_name,
-                "content": content,
-                "keywords": keywords,
-                "generated_content": True,
-                "file_path": file_path
-            }
-            
+        for lecture_id, lecture_name, course_name, materials in lectures:
+            doc = build_lecture_document(lecture_id, lecture_name, course_name,
+                                         materials, materials_dir, fake)
+            write_lecture_file(doc)
             es.index(
                 index="lecture_materials",
                 id=lecture_id,
@@ -224,14 +286,17 @@ def generate_and_sync_lecture_materials(
         print(f"Text files stored in: {os.path.abspath(materials_dir)}")
         
         es.indices.refresh(index="lecture_materials")
+        bump_index_generation(redis_host, redis_port, redis_conn=redis_conn)
     
     except Exception as e:
         print(f"Error during synchronization: {e}")
         raise
     finally:
         pg_cur.close()
-        pg_conn.close()
-        es.close()
+        if owns_pg:
+            pg_conn.close()
+        if owns_es:
+            es.close()
 
 class LectureMaterialSearcher:
     def __init__(self, es_host="localhost", es_port=9200, es_user="elastic", es_password="secret"):
@@ -249,7 +314,7 @@ class LectureMaterialSearcher:
             query: Search query
             field: Specific field to search (None searches all text fields)
         """
-        search_fields = ["lecture_name^3", "course_name^2", "content", "keywords"] if field is None else [field]
+        search_fields = ["lecture_name^3", "course_name^2", "content", "keywords", "materials"] if field is None else [field]
         
         response = self.es.search(
             index="lecture_materials",
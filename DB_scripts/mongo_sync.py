@@ -2,7 +2,8 @@ import psycopg2
 from pymongo import MongoClient
 from collections import defaultdict
 
-def sync_postgres_to_mongo(mongo_uri='mongodb://localhost:27017/', db_name='university_db'):
+def sync_postgres_to_mongo(mongo_uri='mongodb://localhost:27017/', db_name='university_db',
+                           pg_conn=None, mongo_db=None):
     """
     Synchronize data from PostgreSQL to MongoDB with the specified schema
     
@@ -10,6 +11,8 @@ def sync_postgres_to_mongo(mongo_uri='mongodb://localhost:27017/', db_name='univ
         pg_conn_params (dict): PostgreSQL connection parameters
         mongo_uri (str): MongoDB connection URI
         db_name (str): Name of the MongoDB database
+        pg_conn: Existing PostgreSQL connection to use instead of connecting (not closed here)
+        mongo_db: Existing MongoDB database object to use instead of mongo_uri/db_name (not closed here)
     """
     DB_NAME = "postgres_db"
     DB_USER = "postgres_user"
@@ -17,19 +20,23 @@ def sync_postgres_to_mongo(mongo_uri='mongodb://localhost:27017/', db_name='univ
     DB_HOST = "localhost"
     DB_PORT = "5430"
 
-    pg_conn = psycopg2.connect(
-        dbname=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD,
-        host=DB_HOST,
-        port=DB_PORT
-    )
+    owns_pg = pg_conn is None
+    if owns_pg:
+        pg_conn = psycopg2.connect(
+            dbname=DB_NAME,
+            user=DB_USER,
+            password=DB_PASSWORD,
+            host=DB_HOST,
+            port=DB_PORT
+        )
 
 
     pg_cur = pg_conn.cursor()
     
-    mongo_client = MongoClient(mongo_uri,  username='admin', password='secret')
-    mongo_db = mongo_client[db_name]
+    mongo_client = None
+    if mongo_db is None:
+        mongo_client = MongoClient(mongo_uri,  username='admin', password='secret')
+        mongo_db = mongo_client[db_name]
     
     mongo_db.drop_collection('universities')
     mongo_db.create_collection('universities', validator={
@@ -122,8 +129,10 @@ def sync_postgres_to_mongo(mongo_uri='mongodb://localhost:27017/', db_name='univ
         print(f"Error during synchronization: {e}")
     finally:
         pg_cur.close()
-        pg_conn.close()
-        mongo_client.close()
+        if owns_pg:
+            pg_conn.close()
+        if mongo_client is not None:
+            mongo_client.close()
 
 if __name__ == "__main__":
     sync_postgres_to_mongo()
\ No newline at end of file
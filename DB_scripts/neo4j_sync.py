@@ -1,5 +1,10 @@
 from neo4j import GraphDatabase
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import date, timedelta
+import argparse
+import os
+import threading
+import time
 import psycopg2
 
 # PostgreSQL connection parameters
@@ -16,22 +21,165 @@ NEO4J_URI = "bolt://localhost:7687"
 NEO4J_USER = "neo4j"
 NEO4J_PASSWORD = "strongpassword"
 
+# Ограничения уникальности по id: каждый MERGE/MATCH по {id: ...} превращается
+# в поиск по индексу вместо сканирования всех узлов метки.
+# St_group, Course_of_lecture и Material_of_lecture — метки из neo4j_sink.json.
+UNIQUE_ID_LABELS = [
+    "University", "Institute", "Department", "Specialty",
+    "Group", "St_group", "Course", "Course_of_lecture",
+    "Lecture", "Material", "Material_of_lecture",
+    "Schedule", "Student",
+]
+
+# Диапазонные индексы: (метка, свойство)
+RANGE_INDEXES = [
+    ("Schedule", "date"),
+    ("Schedule", "day"),
+]
+
+# Инкрементальный режим: строки с updated_at позже watermark минус перекрытие.
+# Перекрытие ловит транзакции, которые начались до прошлого прогона
+# (updated_at = now() момента начала), а закоммитились после него;
+# повторный MERGE идемпотентен. Удаления watermark не видит — их доносит
+# CDC (neo4j_sink.json) или полный прогон.
+WATERMARK_TARGET = "neo4j"
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+# Параллельные шаги sync_all: у каждого свой курсор Postgres и свои сессии Neo4j
+SYNC_WORKERS = int(os.getenv("SYNC_WORKERS", 4))
+
+# Запросы, по которым проверяется использование индексов
+INDEX_PROBE_QUERIES = {
+    "merge_student": "MERGE (s:Student {id: 1}) RETURN s",
+    "match_group": "MATCH (g:Group {id: 1}) RETURN g",
+    "lab1_roster": (
+        "UNWIND [1, 2] AS lid "
+        "MATCH (l:Lecture {id: lid})-[:SCHEDULED_AT]->(e:Schedule) "
+        "MATCH (g:Group)<-[:FOR_GROUP]-(e) "
+        "MATCH (st:Student)<-[:HAS_STUDENT]-(g) "
+        "RETURN DISTINCT st.id"
+    ),
+    "schedule_range": (
+        "MATCH (sch:Schedule) "
+        "WHERE sch.day >= date('2025-09-01') AND sch.day <= date('2025-12-31') "
+        "RETURN count(sch)"
+    ),
+}
+
 class SyncService:
-    def __init__(self):
-        self.pg_conn = psycopg2.connect(**PG_CONFIG)
+    def __init__(self, pg_conn=None, neo4j_driver=None):
+        # Соединения можно передать снаружи (benchmarks/bench_sync.py) —
+        # тогда close() их не закрывает.
+        self._owns_pg = pg_conn is None
+        self._owns_neo4j = neo4j_driver is None
+        self.pg_conn = pg_conn if pg_conn is not None else psycopg2.connect(**PG_CONFIG)
         self.pg_cur = self.pg_conn.cursor()
-        self.neo4j_driver = GraphDatabase.driver(
+        self.neo4j_driver = neo4j_driver if neo4j_driver is not None else GraphDatabase.driver(
             NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD)
         )
+        self.incremental = False
+        self._watermarks = {}   # таблица -> updated_at, до которого данные уже в Neo4j
+        self._pending = {}      # таблица -> max(updated_at) прочитанных строк
+        self._watermark_lock = threading.Lock()
 
     def close(self):
         self.pg_cur.close()
-        self.pg_conn.close()
-        self.neo4j_driver.close()
+        if self._owns_pg:
+            self.pg_conn.close()
+        if self._owns_neo4j:
+            self.neo4j_driver.close()
+
+    def ensure_schema(self):
+        """Создаёт ограничения уникальности и индексы (идемпотентно)."""
+        with self.neo4j_driver.session() as session:
+            for label in UNIQUE_ID_LABELS:
+                session.run(
+                    f"CREATE CONSTRAINT {label.lower()}_id_unique IF NOT EXISTS "
+                    f"FOR (n:{label}) REQUIRE n.id IS UNIQUE"
+                )
+            for label, prop in RANGE_INDEXES:
+                session.run(
+                    f"CREATE RANGE INDEX {label.lower()}_{prop}_range IF NOT EXISTS "
+                    f"FOR (n:{label}) ON (n.{prop})"
+                )
+            session.run("CALL db.awaitIndexes(300)")
+            # sch.day для узлов, созданных до его появления; из Kafka (neo4j_sink.json)
+            # sch.date приходит числом микросекунд от эпохи (MicroTimestamp)
+            session.run(
+                "MATCH (sch:Schedule) WHERE sch.day IS NULL AND sch.date IS NOT NULL "
+                "SET sch.day = CASE WHEN sch.date IS :: INTEGER "
+                "THEN date(datetime({epochMillis: sch.date / 1000})) "
+                "ELSE date(sch.date) END"
+            )
+
+    def explain_index_usage(self):
+        """
+        Возвращает для каждого проверочного запроса список индексных операторов
+        плана (NodeUniqueIndexSeek, NodeIndexSeekByRange, ...). Пустой список
+        означает, что запрос выполняется сканированием метки.
+        """
+        def collect(plan, found):
+            operator = plan.get("operatorType", "")
+            if "Index" in operator:
+                details = plan.get("args", {}).get("Details", "")
+                found.append(f"{operator.split('@')[0]} {details}".strip())
+            for child in plan.get("children", []):
+                collect(child, found)
+            return found
+
+        report = {}
+        with self.neo4j_driver.session() as session:
+            for name, query in INDEX_PROBE_QUERIES.items():
+                summary = session.run(f"EXPLAIN {query}").consume()
+                report[name] = collect(summary.plan, [])
+        return report
+
+    def _fetch(self, table, columns):
+        """
+        Строки таблицы для синхронизации. В инкрементальном режиме — только
+        изменённые после watermark; max(updated_at) запоминается и
+        сохраняется _save_watermark() после успешного шага.
+        """
+        # отдельный курсор: шаги sync_all идут в разных потоках
+        with self.pg_conn.cursor() as cur:
+            if self.incremental and table in self._watermarks:
+                cur.execute(
+                    f"SELECT {columns}, updated_at FROM {table} WHERE updated_at > %s",
+                    (self._watermarks[table] - WATERMARK_OVERLAP,)
+                )
+            else:
+                cur.execute(f"SELECT {columns}, updated_at FROM {table}")
+            rows = cur.fetchall()
+        if rows:
+            self._pending[table] = max(row[-1] for row in rows)
+        return [row[:-1] for row in rows]
+
+    def _load_watermarks(self):
+        self.pg_cur.execute(
+            "SELECT table_name, watermark FROM sync_watermark WHERE target = %s",
+            (WATERMARK_TARGET,)
+        )
+        self._watermarks = dict(self.pg_cur.fetchall())
+        self.pg_conn.commit()
+
+    def _save_watermark(self, table):
+        watermark = self._pending.pop(table, None)
+        if watermark is None:
+            return
+        with self._watermark_lock, self.pg_conn.cursor() as cur:
+            cur.execute(
+                "INSERT INTO sync_watermark (target, table_name, watermark, synced_at) "
+                "VALUES (%s, %s, %s, now()) "
+                "ON CONFLICT (target, table_name) DO UPDATE "
+                "SET watermark = GREATEST(sync_watermark.watermark, EXCLUDED.watermark), "
+                "synced_at = EXCLUDED.synced_at",
+                (WATERMARK_TARGET, table, watermark)
+            )
+            self.pg_conn.commit()
+            self._watermarks[table] = max(watermark, self._watermarks.get(table, watermark))
 
     def sync_universities(self):
-        self.pg_cur.execute("SELECT id, name, location FROM University")
-        for id, name, location in self.pg_cur.fetchall():
+        for id, name, location in self._fetch("University", "id, name, location"):
             with self.neo4j_driver.session() as session:
                 session.run(
                     "MERGE (u:University {id: $id}) "
@@ -40,8 +188,7 @@ class SyncService:
                 )
 
     def sync_institutes(self):
-        self.pg_cur.execute("SELECT id, name, university_id FROM Institute")
-        for id, name, university_id in self.pg_cur.fetchall():
+        for id, name, university_id in self._fetch("Institute", "id, name, university_id"):
             with self.neo4j_driver.session() as session:
                 session.run(
                     "MATCH (u:University {id: $uid})"
@@ -52,8 +199,7 @@ class SyncService:
                 )
 
     def sync_departments(self):
-        self.pg_cur.execute("SELECT id, name, institute_id FROM Department")
-        for id, name, institute_id in self.pg_cur.fetchall():
+        for id, name, institute_id in self._fetch("Department", "id, name, institute_id"):
             with self.neo4j_driver.session() as session:
                 session.run(
                     "MATCH (i:Institute {id: $iid})"
@@ -64,8 +210,7 @@ class SyncService:
                 )
 
     def sync_specialties(self):
-        self.pg_cur.execute("SELECT id, name, department_id FROM Specialty")
-        for id, name, department_id in self.pg_cur.fetchall():
+        for id, name, department_id in self._fetch("Specialty", "id, name, department_id"):
             with self.neo4j_driver.session() as session:
                 session.run(
                     "MATCH (d:Department {id: $did})"
@@ -76,8 +221,7 @@ class SyncService:
                 )
 
     def sync_groups(self):
-        self.pg_cur.execute("SELECT id, name, speciality_id FROM St_group")
-        for id, name, speciality_id in self.pg_cur.fetchall():
+        for id, name, speciality_id in self._fetch("St_group", "id, name, speciality_id"):
             with self.neo4j_driver.session() as session:
                 session.run(
                     "MATCH (s:Specialty {id: $sid})"
@@ -88,10 +232,7 @@ class SyncService:
                 )
 
     def sync_courses(self):
-        self.pg_cur.execute(
-            "SELECT id, name, department_id, specialty_id FROM Course_of_lecture"
-        )
-        for id, name, dept_id, spec_id in self.pg_cur.fetchall():
+        for id, name, dept_id, spec_id in self._fetch("Course_of_lecture", "id, name, department_id, specialty_id"):
             with self.neo4j_driver.session() as session:
                 session.run(
                     "MATCH (d:Department {id: $did}), (s:Specialty {id: $sid})"
@@ -103,8 +244,7 @@ class SyncService:
                 )
 
     def sync_lectures(self):
-        self.pg_cur.execute("SELECT id, name, course_of_lecture_id FROM Lecture")
-        for id, name, course_id in self.pg_cur.fetchall():
+        for id, name, course_id in self._fetch("Lecture", "id, name, course_of_lecture_id"):
             with self.neo4j_driver.session() as session:
                 session.run(
                     "MATCH (c:Course {id: $cid})"
@@ -115,10 +255,7 @@ class SyncService:
                 )
 
     def sync_materials(self):
-        self.pg_cur.execute(
-            "SELECT id, name, course_of_lecture_id FROM Material_of_lecture"
-        )
-        for id, name, lecture_id in self.pg_cur.fetchall():
+        for id, name, lecture_id in self._fetch("Material_of_lecture", "id, name, course_of_lecture_id"):
             with self.neo4j_driver.session() as session:
                 session.run(
                     "MATCH (l:Lecture {id: $lid})"
@@ -129,26 +266,22 @@ class SyncService:
                 )
 
     def sync_schedules(self):
-        self.pg_cur.execute(
-            "SELECT id, date, lecture_id, group_id FROM Schedule"
-        )
-        for id, date, lecture_id, group_id in self.pg_cur.fetchall():
+        for id, date, lecture_id, group_id in self._fetch("Schedule", "id, date, lecture_id, group_id"):
             with self.neo4j_driver.session() as session:
+                # sch.day — дата занятия типа Date: по ней работает диапазонный индекс
+                # schedule_day_range (sch.date — LocalDateTime, с date($start) не сравнивается)
                 session.run(
                     "MATCH (l:Lecture {id: $lid}), (g:Group {id: $gid})"
                     " MERGE (sch:Schedule {id: $id}) "
-                    "SET sch.date = $date "
+                    "SET sch.date = $date, sch.day = $day "
                     "MERGE (l)-[:SCHEDULED_AT]->(sch) "
                     "MERGE (sch)-[:FOR_GROUP]->(g)",
                     lid=lecture_id, gid=group_id,
-                    id=id, date=date
+                    id=id, date=date, day=date.date()
                 )
 
     def sync_students(self):
-        self.pg_cur.execute(
-            "SELECT id, name, age, mail, group_id FROM Students"
-        )
-        for id, name, age, mail, group_id in self.pg_cur.fetchall():
+        for id, name, age, mail, group_id in self._fetch("Students", "id, name, age, mail, group_id"):
             with self.neo4j_driver.session() as session:
                 session.run(
                     "MATCH (g:Group {id: $gid})"
@@ -158,15 +291,106 @@ class SyncService:
                     gid=group_id, id=id, name=name, age=age, mail=mail
                 )
 
-    def sync_all(self):
-        self.sync_universities()
-        self.sync_institutes()
-        self.sync_departments()
-        self.sync_specialties()
-        self.sync_groups()
-        self.sync_courses()
-        self.sync_lectures()
-        self.sync_materials()
-        self.sync_schedules()
-        self.sync_students()
-        print("Successfully synchronized all tables and relations in Neo4j")
\ No newline at end of file
+    def sync_steps(self):
+        """
+        Граф шагов синхронизации: таблица Postgres -> (метод, таблицы, узлы
+        которых шаг находит через MATCH). Шаг запускается, когда готовы все
+        его родители; независимые шаги идут параллельно.
+        """
+        return {
+            "University": (self.sync_universities, ()),
+            "Institute": (self.sync_institutes, ("University",)),
+            "Department": (self.sync_departments, ("Institute",)),
+            "Specialty": (self.sync_specialties, ("Department",)),
+            "St_group": (self.sync_groups, ("Specialty",)),
+            "Course_of_lecture": (self.sync_courses, ("Department", "Specialty")),
+            "Lecture": (self.sync_lectures, ("Course_of_lecture",)),
+            "Material_of_lecture": (self.sync_materials, ("Lecture",)),
+            "Schedule": (self.sync_schedules, ("Lecture", "St_group")),
+            "Students": (self.sync_students, ("St_group",)),
+        }
+
+    def _run_steps(self, steps, workers):
+        """
+        Выполняет граф шагов на пуле из workers потоков. Возвращает
+        {таблица: (начало, конец)} в секундах от старта. При ошибке шага
+        новые шаги не запускаются, исключение пробрасывается.
+        """
+        timings, running = {}, {}
+        started = time.perf_counter()
+
+        def run(table):
+            t0 = time.perf_counter() - started
+            steps[table][0]()
+            self._save_watermark(table)
+            return t0, time.perf_counter() - started
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while len(timings) < len(steps):
+                for table, (_, deps) in steps.items():
+                    if table not in timings and table not in running.values() \
+                            and all(dep in timings for dep in deps):
+                        running[pool.submit(run, table)] = table
+                if not running:
+                    raise ValueError(f"Цикл в графе шагов: {sorted(set(steps) - set(timings))}")
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    timings[running.pop(future)] = future.result()
+        return timings
+
+    @staticmethod
+    def critical_path(steps, timings):
+        """
+        Цепочка шагов, определившая общее время: от последнего завершившегося
+        шага назад через родителя, который закончился позже остальных.
+        """
+        table = max(timings, key=lambda t: timings[t][1])
+        path = [table]
+        while steps[table][1]:
+            table = max(steps[table][1], key=lambda t: timings[t][1])
+            path.append(table)
+        return path[::-1]
+
+    def sync_all(self, incremental=False, workers=SYNC_WORKERS):
+        """
+        Полный прогон (по умолчанию) или инкрементальный: только строки,
+        изменённые после watermark из sync_watermark. Watermark каждой
+        таблицы записывается после её шага, так что упавший прогон
+        повторяет только незавершённые таблицы.
+        Возвращает {таблица: (начало, конец)} и печатает разбивку по времени
+        с критическим путём.
+        """
+        self.ensure_schema()
+        self.incremental = incremental
+        self._pending = {}
+        self._load_watermarks()
+        steps = self.sync_steps()
+        timings = self._run_steps(steps, workers)
+
+        wall = max(end for _, end in timings.values())
+        path = self.critical_path(steps, timings)
+        for table, (start, end) in sorted(timings.items(), key=lambda kv: kv[1]):
+            marker = "*" if table in path else " "
+            print(f"{marker} {table:20s} start={start:8.3f}s duration={end - start:8.3f}s")
+        print(f"Critical path: {' -> '.join(path)} "
+              f"({sum(timings[t][1] - timings[t][0] for t in path):.3f}s of {wall:.3f}s wall)")
+        print("Successfully synchronized all tables and relations in Neo4j")
+        return timings
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sync", choices=("full", "incremental"),
+                        help="синхронизировать; без ключа — проверить использование индексов")
+    parser.add_argument("--workers", type=int, default=SYNC_WORKERS,
+                        help="параллельных шагов синхронизации (1 — последовательно)")
+    args = parser.parse_args()
+    service = SyncService()
+    try:
+        if args.sync:
+            service.sync_all(incremental=args.sync == "incremental", workers=args.workers)
+        else:
+            service.ensure_schema()
+            for name, indexes in service.explain_index_usage().items():
+                print(f"{name}: {', '.join(indexes) if indexes else 'NO INDEX (label scan)'}")
+    finally:
+        service.close()
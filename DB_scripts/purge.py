@@ -1,9 +1,12 @@
 import psycopg2
+from psycopg2 import sql
 from pymongo import MongoClient
 from neo4j import GraphDatabase
 from elasticsearch import Elasticsearch
 import redis
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 # logging setup
 logging.basicConfig(
@@ -12,6 +15,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Строк (связей или узлов) на одну транзакцию при пакетной очистке Neo4j
+NEO4J_DELETE_BATCH_SIZE = 10000
+
 class DatabaseCleaner:
     def __init__(self, config):
         """Инициализация подключений ко всем базам данных"""
@@ -105,7 +111,7 @@ class DatabaseCleaner:
             return False
 
     def clean_postgres(self):
-        """Очистка всех таблиц и сброс последовательностей ID в PostgreSQL"""
+        """Очистка всех таблиц и сброс последовательностей ID в PostgreSQL одним TRUNCATE"""
         try:
             with self.connections['postgres'].cursor() as cursor:
                 cursor.execute("""
@@ -120,28 +126,13 @@ class DatabaseCleaner:
                     logger.info("PostgreSQL: Нет таблиц для очистки")
                     return True
                 
-                cursor.execute("SET session_replication_role = 'replica';")
-                
-                for table in tables:
-                    cursor.execute(f'TRUNCATE TABLE "{table}" CASCADE')
-                
-                cursor.execute("""
-                    SELECT sequence_name 
-                    FROM information_schema.sequences 
-                    WHERE sequence_schema = 'public'
-                """)
-                sequences = [row[0] for row in cursor.fetchall()]
-                
-                for sequence in sequences:
-                    try:
-                        cursor.execute(f'ALTER SEQUENCE "{sequence}" RESTART WITH 1;')
-                    except Exception as seq_error:
-                        logger.warning(f"Не удалось сбросить последовательность {sequence}: {seq_error}")
-                
-                cursor.execute("SET session_replication_role = 'origin';")
+                # одна команда на все таблицы: одна блокировка и один проход вместо цикла
+                cursor.execute(sql.SQL("TRUNCATE TABLE {} RESTART IDENTITY CASCADE").format(
+                    sql.SQL(', ').join(sql.Identifier(table) for table in tables)
+                ))
                 
                 self.connections['postgres'].commit()
-                logger.info(f"PostgreSQL: Очищено {len(tables)} таблиц и сброшено {len(sequences)} последовательностей")
+                logger.info(f"PostgreSQL: Очищено {len(tables)} таблиц, последовательности сброшены")
                 return True
                 
         except Exception as e:
@@ -150,17 +141,31 @@ class DatabaseCleaner:
             return False
 
     def clean_mongodb(self):
-        """Очистка всех коллекций в MongoDB"""
+        """
+        Очистка всех коллекций в MongoDB: drop вместо delete_many({}) (без удаления
+        документов по одному), затем коллекция создаётся заново с прежними
+        опциями (validator и т.п.) и индексами.
+        """
         try:
             db = self.connections['mongo']
-            collections = db.list_collection_names()
+            collections = [name for name in db.list_collection_names() if not name.startswith('system.')]
             
             if not collections:
                 logger.info("MongoDB: Нет коллекций для очистки")
                 return True
                 
             for collection in collections:
-                db[collection].delete_many({})
+                options = db[collection].options()
+                indexes = [
+                    (info.pop('key'), info) for name, info in db[collection].index_information().items()
+                    if name != '_id_'
+                ]
+                db.drop_collection(collection)
+                db.create_collection(collection, **options)
+                for keys, info in indexes:
+                    info.pop('v', None)
+                    info.pop('ns', None)
+                    db[collection].create_index(keys, **info)
             
             logger.info(f"MongoDB: Очищено {len(collections)} коллекций")
             return True
@@ -169,20 +174,69 @@ class DatabaseCleaner:
             logger.error(f"Ошибка очистки MongoDB: {str(e)}", exc_info=True)
             return False
 
+    def _recreate_neo4j_database(self, database):
+        """
+        Быстрый путь: пересоздать базу целиком (CREATE OR REPLACE DATABASE).
+        Доступно только в Neo4j Enterprise; вместе с данными удаляются индексы
+        и ограничения (их заново создаёт neo4j_sync.SyncService.ensure_schema).
+        """
+        try:
+            with self.connections['neo4j'].session(database="system") as session:
+                session.run(f"CREATE OR REPLACE DATABASE `{database}` WAIT").consume()
+            logger.info(f"Neo4j: База {database} пересоздана")
+            return True
+        except Exception as e:
+            logger.warning(f"Neo4j: Не удалось пересоздать базу {database} ({e}), удаляем данные пакетами")
+            return False
+
     def clean_neo4j(self):
-        """Очистка всех данных в Neo4j"""
+        """
+        Очистка всех данных в Neo4j пакетами CALL { ... } IN TRANSACTIONS:
+        по меткам, сначала связи, затем узлы. Каждая транзакция ограничена
+        batch_size строками, поэтому очистка большого графа не упирается в heap.
+        """
+        neo4j_config = self.config['neo4j']
+        database = neo4j_config.get('database', 'neo4j')
+        batch_size = int(neo4j_config.get('batch_size', NEO4J_DELETE_BATCH_SIZE))
         try:
-            with self.connections['neo4j'].session() as session:
+            with self.connections['neo4j'].session(database=database) as session:
                 result = session.run("MATCH (n) RETURN count(n) AS count")
                 count = result.single()['count']
                 
                 if count == 0:
                     logger.info("Neo4j: Нет данных для очистки")
                     return True
-                    
-                session.run("MATCH (n) DETACH DELETE n")
+
+            if neo4j_config.get('recreate_database') and self._recreate_neo4j_database(database):
                 logger.info(f"Neo4j: Удалено {count} узлов")
                 return True
+
+            with self.connections['neo4j'].session(database=database) as session:
+                labels = [record['label'] for record in session.run("CALL db.labels() YIELD label RETURN label")]
+                nodes_deleted = relationships_deleted = 0
+                # узлы без меток удаляются последним проходом
+                for i, label in enumerate(labels + [None], 1):
+                    started = time.time()
+                    match = f"MATCH (n:`{label}`)" if label else "MATCH (n)"
+                    # IN TRANSACTIONS работает только в неявной (auto-commit) транзакции — session.run
+                    rels = session.run(
+                        f"{match}-[r]->() CALL {{ WITH r DELETE r }} IN TRANSACTIONS OF {batch_size} ROWS"
+                    ).consume().counters
+                    nodes = session.run(
+                        f"{match} CALL {{ WITH n DETACH DELETE n }} IN TRANSACTIONS OF {batch_size} ROWS"
+                    ).consume().counters
+                    label_relationships = rels.relationships_deleted + nodes.relationships_deleted
+                    nodes_deleted += nodes.nodes_deleted
+                    relationships_deleted += label_relationships
+                    logger.info(
+                        f"Neo4j: [{i}/{len(labels) + 1}] {label or '(без меток)'}: "
+                        f"{label_relationships} связей, "
+                        f"{nodes.nodes_deleted} узлов за {time.time() - started:.1f}с "
+                        f"(всего узлов {nodes_deleted}/{count})"
+                    )
+
+                logger.info(f"Neo4j: Удалено {nodes_deleted} узлов и {relationships_deleted} связей")
+                return True
                 
         except Exception as e:
             logger.error(f"Ошибка очистки Neo4j: {str(e)}", exc_info=True)
@@ -198,8 +252,9 @@ class DatabaseCleaner:
                 logger.info("ElasticSearch: Нет индексов для очистки")
                 return True
                 
-            for index in user_indices:
-                self.connections['elastic'].indices.delete(index=index)
+            # один запрос на все индексы; имена перечисляются явно, т.к. удаление
+            # по шаблону запрещено по умолчанию (action.destructive_requires_name)
+            self.connections['elastic'].indices.delete(index=','.join(user_indices))
             
             logger.info(f"ElasticSearch: Удалено {len(user_indices)} индексов")
             return True
@@ -216,7 +271,8 @@ class DatabaseCleaner:
                 logger.info("Redis: Нет данных для очистки")
                 return True
                 
-            self.connections['redis'].flushdb()
+            # FLUSHDB ASYNC: ключи освобождаются в фоновом потоке Redis
+            self.connections['redis'].flushdb(asynchronous=True)
             logger.info(f"Redis: Очищено {db_size} ключей")
             return True
             
@@ -225,20 +281,37 @@ class DatabaseCleaner:
             return False
 
     def clean_all_databases(self):
-        """Очистка всех баз данных"""
+        """Очистка всех баз данных параллельно, с отчётом о времени по каждой"""
         if not self.connect_all():
             return False
         
-        results = {
-            'postgres': self.clean_postgres(),
-            'mongo': self.clean_mongodb(),
-            'neo4j': self.clean_neo4j(),
-            'elastic': self.clean_elasticsearch(),
-            'redis': self.clean_redis()
+        cleaners = {
+            'postgres': self.clean_postgres,
+            'mongo': self.clean_mongodb,
+            'neo4j': self.clean_neo4j,
+            'elastic': self.clean_elasticsearch,
+            'redis': self.clean_redis
         }
         
+        def timed(cleaner):
+            started = time.time()
+            return cleaner(), time.time() - started
+        
+        # хранилища независимы, у каждого своё соединение — чистим параллельно
+        started = time.time()
+        with ThreadPoolExecutor(max_workers=len(cleaners)) as pool:
+            futures = {name: pool.submit(timed, cleaner) for name, cleaner in cleaners.items()}
+        outcomes = {name: future.result() for name, future in futures.items()}
+        elapsed = time.time() - started
+        
         self.close_all_connections()
         
+        for name, (success, seconds) in sorted(outcomes.items(), key=lambda item: -item[1][1]):
+            logger.info(f"{name:10s} {seconds:8.2f}с  {'ok' if success else 'ОШИБКА'}")
+        logger.info(f"Очистка заняла {elapsed:.2f}с (последовательно было бы "
+                    f"{sum(seconds for _, seconds in outcomes.values()):.2f}с)")
+        results = {name: success for name, (success, _) in outcomes.items()}
+        
         if all(results.values()):
             logger.info("Все базы данных успешно очищены!")
             return True
@@ -289,7 +362,11 @@ if __name__ == "__main__":
         'neo4j': {
             'uri': 'bolt://localhost:7687',
             'user': 'neo4j',
-            'password': 'strongpassword'
+            'password': 'strongpassword',
+            'database': 'neo4j',
+            'batch_size': NEO4J_DELETE_BATCH_SIZE,
+            # CREATE OR REPLACE DATABASE — только Enterprise; в Community откат на пакетное удаление
+            'recreate_database': False
         },
         'elastic': {
             'host': 'localhost:9200',
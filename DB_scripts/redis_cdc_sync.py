@@ -0,0 +1,248 @@
+"""
+Инкрементальное обновление Redis-индексов поиска студентов по CDC-событиям.
+
+redis_sink.json пишет только хэш student:{id}; индексы index:student:* строит
+полная синхронизация redis_sync.sync_students_to_redis. Этот consumer держит
+их актуальными между полными прогонами:
+  - postgres_server.public.students — ключи старой версии строки (before,
+    Students имеет REPLICA IDENTITY FULL; иначе — текущий хэш в Redis)
+    сравниваются с ключами новой, и выполняются только SREM/SADD разницы;
+  - postgres_server.public.st_group — переименование группы перевешивает её
+    студентов на новые ключи group/search.
+Все изменения пачки событий уходят одним pipeline, offset'ы коммитятся после него.
+
+С --layout compact так же поддерживается раскладка redis_compact.py (корзины
+students:{id // 1000} и словари терминов) в её базе redis_compact.COMPACT_DB:
+ZREM/ZADD вместо SREM/SADD.
+"""
+import argparse
+import json
+import logging
+
+import psycopg2
+import redis
+from kafka import KafkaConsumer
+
+import redis_compact
+from redis_sync import LAYOUTS, student_index_keys
+
+KAFKA_BOOTSTRAP_SERVERS = ['localhost:9092']
+STUDENTS_TOPIC = 'postgres_server.public.students'
+GROUPS_TOPIC = 'postgres_server.public.st_group'
+GROUP_ID = 'redis-index-cdc-consumer-group'
+
+PG_CONFIG = {
+    'dbname': "postgres_db",
+    'user': "postgres_user",
+    'password': "postgres_password",
+    'host': "localhost",
+    'port': "5430"
+}
+REDIS_HOST = 'localhost'
+REDIS_PORT = 6379
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s %(levelname)s [%(name)s] %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+logger = logging.getLogger('kafka_redis_index_sync')
+
+
+def _payload(value):
+    if not value:
+        return None
+    return value['payload'] if isinstance(value, dict) and 'payload' in value else value
+
+
+class StudentIndexUpdater:
+    def __init__(self, r, pg_conn, layout="hashes"):
+        self.r = r
+        self.pg_conn = pg_conn
+        self.compact = layout == "compact"
+        # число корзин словарей; перечитывается после каждой пачки — его меняет полная синхронизация
+        self.buckets = redis_compact.read_buckets(r) if self.compact else None
+        self.group_names = {}
+        # последняя записанная в этой пачке версия студента: (name, mail, group)
+        self._state = {}
+        self.pipe = r.pipeline(transaction=False)
+
+    def load_group_names(self):
+        with self.pg_conn.cursor() as cur:
+            cur.execute("SELECT id, name FROM St_group")
+            self.group_names = dict(cur.fetchall())
+        self.pg_conn.commit()
+
+    def group_name(self, group_id):
+        if group_id is None:
+            return None
+        if group_id not in self.group_names:
+            self.load_group_names()
+        return self.group_names.get(group_id)
+
+    def _old_version(self, student_id, op, before):
+        """Старая версия строки: из этой же пачки, из before или из хэша в Redis."""
+        if student_id in self._state:
+            return self._state[student_id]
+        if op in ('c', 'r'):
+            # новая строка (или снимок): удалять нечего, SADD идемпотентен
+            return None
+        if before and 'name' in before:
+            return before['name'], before.get('mail'), self.group_name(before.get('group_id'))
+        return self._stored(student_id)
+
+    def _stored(self, student_id):
+        if self.compact:
+            record = redis_compact.fetch_records(self.r, [student_id]).get(int(student_id))
+            return (record['name'], record['mail'], record['group']) if record else None
+        stored = self.r.hgetall(f"student:{student_id}")
+        if stored:
+            return stored.get('name'), stored.get('mail'), stored.get('group')
+        return None
+
+    def _diff(self, student_id, old, new):
+        if self.compact:
+            redis_compact.update_index(self.pipe, student_id, old if old and old[0] else None, new, self.buckets)
+            return
+        old_keys = student_index_keys(*old) if old and old[0] else set()
+        new_keys = student_index_keys(*new) if new else set()
+        for key in old_keys - new_keys:
+            self.pipe.srem(key, student_id)
+        for key in new_keys - old_keys:
+            self.pipe.sadd(key, student_id)
+
+    def apply_student(self, op, before, after):
+        data = before if op == 'd' else after
+        if not data or data.get('id') is None:
+            return
+        student_id = data['id']
+        old = self._old_version(student_id, op, before)
+        if op == 'd':
+            self._diff(student_id, old, None)
+            if self.compact:
+                redis_compact.delete_record(self.pipe, student_id)
+            else:
+                self.pipe.delete(f"student:{student_id}")
+            self._state[student_id] = None
+            return
+        new = (after['name'], after.get('mail'), self.group_name(after.get('group_id')))
+        self._diff(student_id, old, new)
+        if self.compact:
+            redis_compact.write_record(self.pipe, student_id, new[0], after.get('age'), new[1], new[2])
+        else:
+            self.pipe.hset(f"student:{student_id}", mapping={
+                'id': student_id,
+                'name': new[0],
+                'age': after.get('age') if after.get('age') is not None else '',
+                'mail': new[1] or '',
+                'group': new[2] or ''
+            })
+        self._state[student_id] = new
+
+    def apply_group(self, op, before, after):
+        data = before if op == 'd' else after
+        if not data or data.get('id') is None:
+            return
+        group_id = data['id']
+        old_name = self.group_names.get(group_id)
+        if op == 'd':
+            self.group_names.pop(group_id, None)
+            return
+        self.group_names[group_id] = after['name']
+        if old_name is None or old_name == after['name']:
+            return
+        # переименование: студенты группы переезжают на новые ключи group/search
+        self.flush()
+        if self.compact:
+            self._move_group_compact(group_id, old_name, after['name'])
+            return
+        members = list(self.r.smembers(f"index:student:group:{old_name.lower()}"))
+        reader = self.r.pipeline(transaction=False)
+        for student_id in members:
+            reader.hgetall(f"student:{student_id}")
+        for student_id, stored in zip(members, reader.execute()):
+            if not stored:
+                continue
+            self._diff(student_id, (stored.get('name'), stored.get('mail'), old_name),
+                       (stored.get('name'), stored.get('mail'), after['name']))
+            self.pipe.hset(f"student:{student_id}", 'group', after['name'])
+        logger.info(f"Group {group_id} renamed: moved {len(members)} students to '{after['name']}'")
+
+    def _move_group_compact(self, group_id, old_name, new_name):
+        member_ids = redis_compact.exact_term_ids(self.r, 'group', old_name.lower(), self.buckets)
+        records = redis_compact.fetch_records(self.r, member_ids)
+        for student_id, record in records.items():
+            self._diff(student_id, (record['name'], record['mail'], old_name),
+                       (record['name'], record['mail'], new_name))
+            redis_compact.write_record(self.pipe, student_id, record['name'], record['age'],
+                                       record['mail'], new_name)
+        logger.info(f"Group {group_id} renamed: moved {len(records)} students to '{new_name}'")
+
+    def flush(self):
+        commands = len(self.pipe)
+        if commands:
+            self.pipe.execute()
+        self._state = {}
+        if self.compact:
+            self.buckets = redis_compact.read_buckets(self.r)
+        return commands
+
+
+def consume(updater, batch_timeout=1000):
+    logger.info(f"Starting Kafka consumer for topics: {[STUDENTS_TOPIC, GROUPS_TOPIC]}, group_id={GROUP_ID}")
+    consumer = KafkaConsumer(
+        GROUPS_TOPIC, STUDENTS_TOPIC,
+        bootstrap_servers=KAFKA_BOOTSTRAP_SERVERS,
+        group_id=GROUP_ID,
+        auto_offset_reset='earliest',
+        enable_auto_commit=False,
+        max_poll_records=500,
+        value_deserializer=lambda m: json.loads(m.decode('utf-8')) if m else None
+    )
+    try:
+        while True:
+            records = consumer.poll(timeout_ms=batch_timeout)
+            events = 0
+            # группы раньше студентов: имя новой группы нужно для ключей её студентов
+            for tp in sorted(records, key=lambda tp: tp.topic != GROUPS_TOPIC):
+                for msg in records[tp]:
+                    payload = _payload(msg.value)
+                    if not payload:
+                        continue
+                    op, before, after = payload.get('op'), payload.get('before'), payload.get('after')
+                    if tp.topic == GROUPS_TOPIC:
+                        updater.apply_group(op, before, after)
+                    else:
+                        updater.apply_student(op, before, after)
+                    events += 1
+            if not events:
+                continue
+            commands = updater.flush()
+            consumer.commit()
+            logger.info(f"Applied {events} events with {commands} Redis commands")
+    finally:
+        consumer.close()
+        logger.info("Kafka consumer closed")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--layout", choices=LAYOUTS, default="hashes",
+                        help="раскладка студентов в Redis, которую поддерживает consumer")
+    args = parser.parse_args()
+
+    pg_conn = psycopg2.connect(**PG_CONFIG)
+    # значения компактной раскладки — msgpack, ответы не декодируются
+    r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=(args.layout == "hashes"),
+                    db=redis_compact.COMPACT_DB if args.layout == "compact" else 0)
+    try:
+        updater = StudentIndexUpdater(r, pg_conn, layout=args.layout)
+        updater.load_group_names()
+        consume(updater)
+    finally:
+        r.close()
+        pg_conn.close()
+
+
+if __name__ == "__main__":
+    main()
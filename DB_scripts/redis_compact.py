@@ -0,0 +1,310 @@
+"""
+Компактная раскладка студентов в Redis — альтернатива хэшам student:{id}
+и множествам index:student:* (redis_sync.sync_students_to_redis).
+
+Ключи:
+  students:{id // 1000}          хэш корзины: поле — id, значение — msgpack [name, age, mail, group]
+  students:meta                  хэш: число корзин словаря каждого поля
+  students:dict:{поле}:{n}       sorted set, score 0, элементы «термин\\0id»;
+                                 n = crc32(термин) % число корзин поля
+  students:terms:{поле}          множество частых терминов поля
+  students:set:{поле}:{термин}   id студентов частого термина
+
+Поля индекса те же, что у index:student:* (name, email, group, search).
+Почти все имена и адреса уникальны, и на каждый такой термин в старой раскладке
+приходился отдельный ключ с одним элементом. Здесь редкие термины лежат
+в корзинах-словарях, а собственное множество получает только термин не реже
+FREQUENT_TERM_MEMBERS студентов: там id хранятся без повторения термина.
+Частые термины выбирает полная синхронизация; CDC-обновления
+(redis_cdc_sync.py) добавляют всё в словари, а удаляют из обоих мест,
+поэтому поиск объединяет словарь и множество термина.
+
+Корзины и словари компактны, пока Redis хранит их в listpack: нужны
+hash-max-listpack-entries >= BUCKET_SIZE и zset-max-listpack-entries
+с запасом к DICT_BUCKET_TARGET (LISTPACK_CONFIG, redis в docker-compose.yml).
+
+Раскладка экспериментальная: её читают только CompactStudentSearch и
+benchmarks/bench_redis_memory.py. Сервисы (Lab1, Lab3) и Redis sink connector
+работают с student:{id} в базе 0, поэтому компактная раскладка живёт в
+отдельной логической базе COMPACT_DB. write_students держит там только её
+и удаляет оставшиеся ключи student:* и index:student:*.
+
+Значения — msgpack, поэтому клиент Redis создаётся без decode_responses.
+"""
+import math
+import zlib
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import msgpack
+import redis
+
+# Логическая база Redis компактной раскладки (сервисы читают базу 0)
+COMPACT_DB = 1
+BUCKET_SIZE = 1000
+# Элементов в корзине словаря при полной синхронизации
+DICT_BUCKET_TARGET = 512
+# Начиная с этого числа студентов термин хранится отдельным множеством:
+# его id не повторяют текст термина, а ключ окупает свои накладные расходы
+FREQUENT_TERM_MEMBERS = 8
+FIELDS = ("name", "email", "group", "search")
+META_KEY = "students:meta"
+LISTPACK_CONFIG = {
+    "hash-max-listpack-entries": 1024,
+    "hash-max-listpack-value": 128,
+    "zset-max-listpack-entries": 1024,
+}
+
+SEPARATOR = "\0"
+_GLOB_SPECIAL = "\\*?[]"
+
+
+def record_key(student_id: int) -> str:
+    return f"students:{int(student_id) // BUCKET_SIZE}"
+
+
+def dictionary_bucket_key(field: str, bucket: int) -> str:
+    return f"students:dict:{field}:{bucket}"
+
+
+def dictionary_key(field: str, term: str, buckets: int) -> str:
+    return dictionary_bucket_key(field, zlib.crc32(term.encode('utf-8')) % buckets)
+
+
+def frequent_terms_key(field: str) -> str:
+    return f"students:terms:{field}"
+
+
+def frequent_set_key(field: str, term: str) -> str:
+    return f"students:set:{field}:{term}"
+
+
+def dictionary_member(term: str, student_id: int) -> str:
+    return f"{term}{SEPARATOR}{student_id}"
+
+
+def dictionary_buckets(entries: int) -> int:
+    return max(1, math.ceil(entries / DICT_BUCKET_TARGET))
+
+
+def _text(value):
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+def student_terms(name: str, mail: Optional[str], group_name: Optional[str]) -> Dict[str, Set[str]]:
+    """Термины студента по полям индекса; index:student:* строятся из них же."""
+    return {
+        "name": {name.lower()},
+        "email": {mail.lower()} if mail else set(),
+        "group": {group_name.lower()} if group_name else set(),
+        "search": set(f"{name} {mail or ''} {group_name or ''}".lower().split()),
+    }
+
+
+def pack_student(name, age, mail, group_name) -> bytes:
+    return msgpack.packb([name, age, mail, group_name], use_bin_type=True)
+
+
+def unpack_student(student_id, raw) -> Dict:
+    name, age, mail, group_name = msgpack.unpackb(raw, raw=False)
+    return {"id": int(student_id), "name": name, "age": age, "mail": mail, "group": group_name}
+
+
+def read_buckets(r) -> Dict[str, int]:
+    """Число корзин словарей; до первой полной синхронизации — по одной."""
+    meta = {_text(k): int(v) for k, v in r.hgetall(META_KEY).items()}
+    return {field: meta.get(field, 1) for field in FIELDS}
+
+
+def update_index(pipe, student_id: int, old: Optional[Tuple], new: Optional[Tuple],
+                 buckets: Dict[str, int]) -> None:
+    """
+    Команды для перехода индекса студента от old к new ((name, mail, group) или None).
+    Новые термины идут в словари; ушедшие удаляются и из словаря, и из множества
+    частого термина (SREM по несуществующему ключу ничего не делает).
+    """
+    old_terms = student_terms(*old) if old else {field: set() for field in FIELDS}
+    new_terms = student_terms(*new) if new else {field: set() for field in FIELDS}
+    for field in FIELDS:
+        for term in old_terms[field] - new_terms[field]:
+            pipe.zrem(dictionary_key(field, term, buckets[field]), dictionary_member(term, student_id))
+            pipe.srem(frequent_set_key(field, term), student_id)
+        for term in new_terms[field] - old_terms[field]:
+            pipe.zadd(dictionary_key(field, term, buckets[field]), {dictionary_member(term, student_id): 0})
+
+
+def write_record(pipe, student_id: int, name, age, mail, group_name) -> None:
+    pipe.hset(record_key(student_id), str(student_id), pack_student(name, age, mail, group_name))
+
+
+def delete_record(pipe, student_id: int) -> None:
+    pipe.hdel(record_key(student_id), str(student_id))
+
+
+def fetch_records(r, student_ids: Iterable) -> Dict[int, Dict]:
+    """{id: запись} одним pipeline HMGET по корзинам; отсутствующие id пропускаются."""
+    by_bucket = {}
+    for student_id in {int(sid) for sid in student_ids}:
+        by_bucket.setdefault(record_key(student_id), []).append(student_id)
+    pipe = r.pipeline(transaction=False)
+    for key, ids in by_bucket.items():
+        pipe.hmget(key, [str(sid) for sid in ids])
+    records = {}
+    for ids, values in zip(by_bucket.values(), pipe.execute()):
+        for student_id, raw in zip(ids, values):
+            if raw is not None:
+                records[student_id] = unpack_student(student_id, raw)
+    return records
+
+
+def exact_term_ids(r, field: str, term: str, buckets: Dict[str, int]) -> Set[int]:
+    """id студентов с термином term: множество частого термина и диапазон словаря."""
+    pipe = r.pipeline(transaction=False)
+    pipe.smembers(frequent_set_key(field, term))
+    pipe.zrangebylex(dictionary_key(field, term, buckets[field]),
+                     f"[{term}{SEPARATOR}", f"({term}\x01")
+    members, entries = pipe.execute()
+    ids = {int(sid) for sid in members}
+    ids.update(int(_text(entry).rsplit(SEPARATOR, 1)[1]) for entry in entries)
+    return ids
+
+
+def write_students(r, students: List[Tuple], batch_size: int = 10000) -> Dict[str, int]:
+    """
+    Полная перезапись раскладки из строк (id, name, age, mail, group_name).
+    Сначала считаются термины: по их числу выбираются частые термины и число
+    корзин словарей; затем записи и индексы пишутся пачками по batch_size
+    студентов — по одной команде на ключ в пачке.
+    """
+    counts = {field: {} for field in FIELDS}
+    for _, name, _, mail, group_name in students:
+        for field, terms in student_terms(name, mail, group_name).items():
+            field_counts = counts[field]
+            for term in terms:
+                field_counts[term] = field_counts.get(term, 0) + 1
+    frequent = {field: {term for term, n in counts[field].items() if n >= FREQUENT_TERM_MEMBERS}
+                for field in FIELDS}
+    buckets = {field: dictionary_buckets(sum(n for term, n in counts[field].items()
+                                             if term not in frequent[field]))
+               for field in FIELDS}
+
+    # в базе раскладки не остаётся ни старой её версии, ни ключей раскладки hashes
+    stale = [key for pattern in ("students:*", "student:*", "index:student:*")
+             for key in r.scan_iter(match=pattern, count=1000)]
+    pipe = r.pipeline(transaction=False)
+    for i in range(0, len(stale), 1000):
+        pipe.unlink(*stale[i:i + 1000])
+    pipe.hset(META_KEY, mapping=buckets)
+    for field in FIELDS:
+        terms = sorted(frequent[field])
+        for i in range(0, len(terms), 1000):
+            pipe.sadd(frequent_terms_key(field), *terms[i:i + 1000])
+    pipe.execute()
+
+    for start in range(0, len(students), batch_size):
+        records, dictionaries, sets = {}, {}, {}
+        for student_id, name, age, mail, group_name in students[start:start + batch_size]:
+            records.setdefault(record_key(student_id), {})[str(student_id)] = \
+                pack_student(name, age, mail, group_name)
+            for field, terms in student_terms(name, mail, group_name).items():
+                for term in terms:
+                    if term in frequent[field]:
+                        sets.setdefault(frequent_set_key(field, term), []).append(student_id)
+                    else:
+                        key = dictionary_key(field, term, buckets[field])
+                        dictionaries.setdefault(key, {})[dictionary_member(term, student_id)] = 0
+        for key, mapping in records.items():
+            pipe.hset(key, mapping=mapping)
+        for key, mapping in dictionaries.items():
+            pipe.zadd(key, mapping)
+        for key, ids in sets.items():
+            pipe.sadd(key, *ids)
+        pipe.execute()
+    return buckets
+
+
+def _glob_escape(text: str) -> str:
+    return "".join("\\" + ch if ch in _GLOB_SPECIAL else ch for ch in text)
+
+
+class CompactStudentSearch:
+    """Поиск по компактной раскладке; те же запросы, что у StudentSearch (подстрока термина)."""
+
+    def __init__(self, redis_host='localhost', redis_port=6379, redis_conn=None):
+        self.r = redis_conn if redis_conn is not None else \
+            redis.Redis(host=redis_host, port=redis_port, db=COMPACT_DB)
+
+    def _scan_pipelined(self, commands):
+        """
+        Выполняет [(команда, ключ, pattern)] ZSCAN/SSCAN одним pipeline на проход:
+        маленькие (listpack) ключи отдаются за один вызов, по остальным
+        следующий проход продолжает с курсора.
+        """
+        found = []
+        pending = [(command, key, pattern, 0) for command, key, pattern in commands]
+        while pending:
+            pipe = self.r.pipeline(transaction=False)
+            for command, key, pattern, cursor in pending:
+                getattr(pipe, command)(key, cursor=cursor, match=pattern, count=1000)
+            next_pending = []
+            for (command, key, pattern, _), (cursor, items) in zip(pending, pipe.execute()):
+                found.extend(item[0] if command == "zscan" else item for item in items)
+                if int(cursor):
+                    next_pending.append((command, key, pattern, int(cursor)))
+            pending = next_pending
+        return found
+
+    def _matching_ids(self, field: str, fragment: str) -> Set[int]:
+        """id студентов, у которых термин поля field содержит fragment."""
+        fragment = _glob_escape(fragment.lower())
+        buckets = read_buckets(self.r)[field]
+        # * после \0 — вхождение ищется в термине, а не в id
+        commands = [("zscan", dictionary_bucket_key(field, n), f"*{fragment}*{SEPARATOR}*")
+                    for n in range(buckets)]
+        commands.append(("sscan", frequent_terms_key(field), f"*{fragment}*"))
+        ids, terms = set(), []
+        for item in self._scan_pipelined(commands):
+            item = _text(item)
+            if SEPARATOR in item:
+                ids.add(int(item.rsplit(SEPARATOR, 1)[1]))
+            else:
+                terms.append(item)
+        if terms:
+            pipe = self.r.pipeline(transaction=False)
+            for term in terms:
+                pipe.smembers(frequent_set_key(field, term))
+            for members in pipe.execute():
+                ids.update(int(sid) for sid in members)
+        return ids
+
+    def _records(self, student_ids) -> List[Dict]:
+        records = fetch_records(self.r, student_ids)
+        return [records[sid] for sid in sorted(records)]
+
+    def get_by_id(self, student_id: int) -> Dict:
+        return fetch_records(self.r, [student_id]).get(int(student_id), {})
+
+    def get_student_full(self, student_id: int) -> Dict:
+        student = self.get_by_id(student_id)
+        if not student:
+            raise ValueError(f"Student with id {student_id} not found in Redis.")
+        return student
+
+    def search_by_name(self, name: str) -> List[Dict]:
+        return self._records(self._matching_ids("name", name))
+
+    def search_by_email(self, email: str) -> List[Dict]:
+        return self._records(self._matching_ids("email", email))
+
+    def search_by_group(self, group_name: str) -> List[Dict]:
+        return self._records(self._matching_ids("group", group_name))
+
+    def full_text_search(self, query: str) -> List[Dict]:
+        terms = query.lower().split()
+        if not terms:
+            return []
+        student_ids = self._matching_ids("search", terms[0])
+        for term in terms[1:]:
+            if not student_ids:
+                break
+            student_ids &= self._matching_ids("search", term)
+        return self._records(student_ids)
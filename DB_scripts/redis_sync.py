@@ -1,8 +1,29 @@
+import argparse
+
 import psycopg2
 import redis
-from typing import Dict, List
+from typing import Dict, List, Optional, Set
+
+import redis_compact
+
+# hashes — student:{id} и index:student:* (их читают сервисы), compact — раскладка
+# redis_compact в отдельной базе redis_compact.COMPACT_DB, только для сравнения
+LAYOUTS = ("hashes", "compact")
+
+
+def student_index_keys(name: str, mail: Optional[str], group_name: Optional[str]) -> Set[str]:
+    """
+    Ключи индексов index:student:*, в которые входит студент. Общие для полной
+    синхронизации и CDC-обновлений (redis_cdc_sync.py): разница множеств ключей
+    старой и новой версии строки — это ровно те SREM/SADD, которые нужно сделать.
+    """
+    return {f"index:student:{field}:{term}"
+            for field, terms in redis_compact.student_terms(name, mail, group_name).items()
+            for term in terms}
+
 
-def sync_students_to_redis(redis_host: str = 'localhost', redis_port: int = 6379) -> None:
+def sync_students_to_redis(redis_host: str = 'localhost', redis_port: int = 6379,
+                           pg_conn=None, redis_conn=None, layout: str = "hashes") -> None:
 
     DB_NAME = "postgres_db"
     DB_USER = "postgres_user"
@@ -10,28 +31,48 @@ def sync_students_to_redis(redis_host: str = 'localhost', redis_port: int = 6379
     DB_HOST = "localhost"
     DB_PORT = "5430"
 
-    pg_conn = psycopg2.connect(
-        dbname=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD,
-        host=DB_HOST,
-        port=DB_PORT
-    )
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown Redis layout: {layout}")
+    # компактная синхронизация удаляет student:* своей базы — базу сервисов трогать нельзя
+    if layout == "compact" and redis_conn is not None and \
+            redis_conn.connection_pool.connection_kwargs.get("db", 0) != redis_compact.COMPACT_DB:
+        raise ValueError(f"Compact layout must be written to Redis db {redis_compact.COMPACT_DB}")
+
+    # pg_conn / redis_conn передаются снаружи в benchmarks/bench_sync.py
+    owns_pg = pg_conn is None
+    owns_redis = redis_conn is None
+    if owns_pg:
+        pg_conn = psycopg2.connect(
+            dbname=DB_NAME,
+            user=DB_USER,
+            password=DB_PASSWORD,
+            host=DB_HOST,
+            port=DB_PORT
+        )
     pg_cur = pg_conn.cursor()
-    r = redis.Redis(host=redis_host, port=redis_port, decode_responses=True)
+    # значения компактной раскладки — msgpack, ответы не декодируются
+    r = redis.Redis(host=redis_host, port=redis_port, decode_responses=(layout == "hashes"),
+                    db=redis_compact.COMPACT_DB if layout == "compact" else 0) \
+        if owns_redis else redis_conn
     
     try:
-        for key in r.scan_iter("student:*"):
-            r.delete(key)
-        for key in r.scan_iter("index:student:*"):
-            r.delete(key)
-        
         pg_cur.execute("""
             SELECT s.id, s.name, s.age, s.mail, g.name as group_name
             FROM Students s
             JOIN St_group g ON s.group_id = g.id
         """)
         students = pg_cur.fetchall()
+
+        if layout == "compact":
+            buckets = redis_compact.write_students(r, students)
+            print(f"Successfully synchronized {len(students)} students to Redis (compact layout, "
+                  f"dictionary buckets: {buckets})")
+            return
+
+        for key in r.scan_iter("student:*"):
+            r.delete(key)
+        for key in r.scan_iter("index:student:*"):
+            r.delete(key)
         
         for student_id, name, age, mail, group_name in students:
             student_key = f"student:{student_id}"
@@ -43,16 +84,8 @@ def sync_students_to_redis(redis_host: str = 'localhost', redis_port: int = 6379
                 'group': group_name
             })
             
-            r.sadd(f"index:student:name:{name.lower()}", student_id)
-            
-            if mail:
-                r.sadd(f"index:student:email:{mail.lower()}", student_id)
-            
-            r.sadd(f"index:student:group:{group_name.lower()}", student_id)
-            
-            search_terms = f"{name} {mail} {group_name}".lower().split()
-            for term in search_terms:
-                r.sadd(f"index:student:search:{term}", student_id)
+            for key in student_index_keys(name, mail, group_name):
+                r.sadd(key, student_id)
         
         print(f"Successfully synchronized {len(students)} students to Redis")
         
@@ -61,8 +94,10 @@ def sync_students_to_redis(redis_host: str = 'localhost', redis_port: int = 6379
         raise
     finally:
         pg_cur.close()
-        pg_conn.close()
-        r.close()
+        if owns_pg:
+            pg_conn.close()
+        if owns_redis:
+            r.close()
 
 # Example search functions that can be used after syncing
 class StudentSearch:
@@ -132,7 +167,11 @@ class StudentSearch:
         return [self.r.hgetall(f"student:{id}") for id in student_ids]
 
 if __name__ == "__main__":
-    sync_students_to_redis()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--layout", choices=LAYOUTS, default="hashes",
+                        help="раскладка студентов в Redis (compact — redis_compact.py)")
+    args = parser.parse_args()
+    sync_students_to_redis(layout=args.layout)
     searcher = StudentSearch()
     
     #print("Students named 'Иванов':")
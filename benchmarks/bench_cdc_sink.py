@@ -0,0 +1,267 @@
+"""
+Throughput of the two Neo4j CDC paths on the same recorded Debezium events:
+
+  connector - the config/neo4j_sink.json templates (one apoc.do.case per event) run the way
+              the Neo4j Kafka Connect sink runs them: `UNWIND $events AS event <template>`,
+              one transaction per topic batch of --batch-size events
+  python    - neo4j_cdc_sink.py: events collapsed per key, one static UNWIND statement per
+              table and operation, one transaction per micro-batch
+
+Both paths write into a live Neo4j with APOC. Use a scratch instance: --reset removes
+every node with a sink label before each path.
+
+Events come from a JSON-lines recording ({"topic", "value"} per line). The recording is
+either captured from Kafka or generated from a benchmark dataset (creates for every row,
+then updates and deletes for a share of the students and schedules, as a bulk import
+followed by corrections would produce).
+
+Usage:
+    python benchmarks/bench_cdc_sink.py generate --scale 5
+    python benchmarks/bench_cdc_sink.py record            # everything currently in the topics
+    python benchmarks/bench_cdc_sink.py run --reset --paths connector python
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timezone
+
+from datasets import REPO_ROOT, build_dataset
+
+sys.path.insert(0, REPO_ROOT)
+
+import neo4j_cdc_sink
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_RECORDING = os.path.join(BENCH_DIR, "recordings", "cdc_events.jsonl")
+SINK_CONFIG = os.path.join(REPO_ROOT, "config", "neo4j_sink.json")
+SINK_LABELS = sorted({spec[0] for spec in neo4j_cdc_sink.GRAPH.values()})
+
+
+def _event(table, op, row):
+    key = "before" if op == "d" else "after"
+    return {"topic": neo4j_cdc_sink.TOPIC_PREFIX + table,
+            "value": {"payload": {"op": op, key: row, "source": {"table": table}}}}
+
+
+def _micros(day):
+    return int(datetime(day.year, day.month, day.day, 10, tzinfo=timezone.utc).timestamp() * 1_000_000)
+
+
+def generate_events(scale, seed, update_share, delete_share):
+    with open(os.path.join(REPO_ROOT, "config", "data_config.json"), "r", encoding="utf-8") as f:
+        config = json.load(f)
+    ds = build_dataset(scale, seed)
+    rng = random.Random(seed)
+    events = []
+    for i, u in enumerate(config["universities"], 1):
+        events.append(_event("university", "c", {"id": i, **u}))
+    for i, inst in enumerate(config["institutes"], 1):
+        events.append(_event("institute", "c", {"id": i, **inst}))
+    for i, d in enumerate(config["departments"], 1):
+        events.append(_event("department", "c", {"id": i, **d}))
+    for sid, s in ds.specialties.items():
+        events.append(_event("specialty", "c", {"id": sid, **s}))
+    for gid, g in ds.groups.items():
+        events.append(_event("st_group", "c", {"id": gid, "name": g["name"], "speciality_id": g["specialty_id"]}))
+    for cid, c in ds.courses.items():
+        events.append(_event("course_of_lecture", "c", {"id": cid, **c}))
+    for lid, lec in ds.lectures.items():
+        events.append(_event("lecture", "c", {"id": lid, "name": lec["name"], "course_of_lecture_id": lec["course_id"]}))
+    for mid, m in ds.materials.items():
+        events.append(_event("material_of_lecture", "c", {"id": mid, "name": m["name"],
+                                                           "course_of_lecture_id": m["course_id"]}))
+
+    def schedule_row(sid, sch):
+        return {"id": sid, "date": _micros(sch["date"]), "lecture_id": sch["lecture_id"],
+                "group_id": sch["group_id"], "semester": sch["semester"]}
+
+    for sid, sch in ds.schedules.items():
+        events.append(_event("schedule", "c", schedule_row(sid, sch)))
+    for sid, st in ds.students.items():
+        events.append(_event("students", "c", {"id": sid, **st}))
+
+    group_ids = list(ds.groups)
+    for sid, st in ds.students.items():
+        if rng.random() < update_share:
+            events.append(_event("students", "u", {"id": sid, **st, "group_id": rng.choice(group_ids)}))
+    for sid, sch in ds.schedules.items():
+        if rng.random() < update_share:
+            events.append(_event("schedule", "u", schedule_row(sid, {**sch, "group_id": rng.choice(group_ids)})))
+    for sid, st in ds.students.items():
+        if rng.random() < delete_share:
+            events.append(_event("students", "d", {"id": sid}))
+    return events
+
+
+def save_events(events, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for event in events:
+            f.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+
+def load_events(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def cmd_generate(args):
+    events = generate_events(args.scale, args.seed, args.update_share, args.delete_share)
+    save_events(events, args.recording)
+    print(f"Generated {len(events)} events into {args.recording}")
+    return 0
+
+
+def cmd_record(args):
+    from kafka import KafkaConsumer
+    consumer = KafkaConsumer(
+        *neo4j_cdc_sink.TOPICS,
+        bootstrap_servers=args.bootstrap_servers,
+        group_id=None,
+        auto_offset_reset="earliest",
+        enable_auto_commit=False,
+        consumer_timeout_ms=args.idle_ms,
+        value_deserializer=lambda m: json.loads(m.decode("utf-8")) if m else None,
+    )
+    try:
+        events = [{"topic": msg.topic, "value": msg.value} for msg in consumer]
+    finally:
+        consumer.close()
+    save_events(events, args.recording)
+    print(f"Recorded {len(events)} events into {args.recording}")
+    return 0
+
+
+def run_connector(driver, events, batch_size):
+    """Emulates the Kafka Connect sink: per topic, UNWIND a batch of events into its template."""
+    with open(SINK_CONFIG, "r", encoding="utf-8") as f:
+        config = json.load(f)["config"]
+    prefix = "neo4j.topic.cypher."
+    templates = {key[len(prefix):]: value for key, value in config.items() if key.startswith(prefix)}
+    transactions = 0
+    pending, topic = [], None
+
+    def flush():
+        nonlocal transactions
+        if not pending:
+            return
+        query = f"UNWIND $events AS event {templates[topic]}"
+        with driver.session() as session:
+            session.execute_write(lambda tx: tx.run(query, events=list(pending)).consume())
+        transactions += 1
+        pending.clear()
+
+    for event in events:
+        value = event["value"]
+        payload = value["payload"] if isinstance(value, dict) and "payload" in value else value
+        if not payload or event["topic"] not in templates:
+            continue
+        # the connector flushes a batch when the topic changes or the batch is full
+        if event["topic"] != topic or len(pending) >= batch_size:
+            flush()
+            topic = event["topic"]
+        pending.append(payload)
+    flush()
+    return {"transactions": transactions, "statements": transactions}
+
+
+def run_python(driver, events, batch_size):
+    transactions = statements = 0
+    batch = neo4j_cdc_sink.MicroBatch()
+    for event in events:
+        parsed = neo4j_cdc_sink.parse_event(event["topic"], event["value"])
+        if parsed:
+            batch.add(parsed)
+        if batch.received >= batch_size:
+            statements += neo4j_cdc_sink.apply_batch(driver, batch)
+            transactions += 1
+            batch = neo4j_cdc_sink.MicroBatch()
+    if batch.received:
+        statements += neo4j_cdc_sink.apply_batch(driver, batch)
+        transactions += 1
+    return {"transactions": transactions, "statements": statements}
+
+
+PATHS = {"connector": run_connector, "python": run_python}
+
+
+def reset_graph(driver):
+    with driver.session() as session:
+        for label in SINK_LABELS:
+            session.run(f"MATCH (n:{label}) CALL {{ WITH n DETACH DELETE n }} IN TRANSACTIONS OF 10000 ROWS").consume()
+
+
+def graph_fingerprint(driver):
+    with driver.session() as session:
+        nodes = session.run("MATCH (n) RETURN count(n) AS c").single()["c"]
+        rels = session.run("MATCH ()-[r]->() RETURN count(r) AS c").single()["c"]
+    return nodes, rels
+
+
+def cmd_run(args):
+    from neo4j import GraphDatabase
+    events = load_events(args.recording)
+    driver = GraphDatabase.driver(args.neo4j_uri, auth=(args.neo4j_user, args.neo4j_password))
+    results = {}
+    try:
+        for name in args.paths:
+            if args.reset:
+                reset_graph(driver)
+            t0 = time.perf_counter()
+            stats = PATHS[name](driver, events, args.batch_size)
+            elapsed = time.perf_counter() - t0
+            nodes, rels = graph_fingerprint(driver)
+            results[name] = {**stats, "events": len(events), "seconds": round(elapsed, 3),
+                             "events_per_s": round(len(events) / elapsed, 1), "nodes": nodes, "relationships": rels}
+            print(f"{name:10s} {results[name]['events_per_s']:10.1f} events/s  {elapsed:8.2f}s  "
+                  f"transactions={stats['transactions']} statements={stats['statements']}  "
+                  f"graph: {nodes} nodes, {rels} relationships")
+    finally:
+        driver.close()
+    if "connector" in results and "python" in results:
+        print(f"speedup: {results['python']['events_per_s'] / results['connector']['events_per_s']:.1f}x")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    generate = sub.add_parser("generate", help="generate Debezium events from a benchmark dataset")
+    generate.add_argument("--scale", type=int, default=1)
+    generate.add_argument("--seed", type=int, default=42)
+    generate.add_argument("--update-share", type=float, default=0.2)
+    generate.add_argument("--delete-share", type=float, default=0.02)
+    generate.add_argument("--recording", default=DEFAULT_RECORDING)
+    generate.set_defaults(func=cmd_generate)
+
+    record = sub.add_parser("record", help="copy the events currently in the CDC topics")
+    record.add_argument("--bootstrap-servers", nargs="+", default=neo4j_cdc_sink.KAFKA_BOOTSTRAP_SERVERS)
+    record.add_argument("--idle-ms", type=int, default=5000)
+    record.add_argument("--recording", default=DEFAULT_RECORDING)
+    record.set_defaults(func=cmd_record)
+
+    run = sub.add_parser("run", help="replay the recording through both paths")
+    run.add_argument("--paths", nargs="+", choices=sorted(PATHS), default=["connector", "python"])
+    run.add_argument("--recording", default=DEFAULT_RECORDING)
+    run.add_argument("--batch-size", type=int, default=1000,
+                     help="events per transaction (neo4j.batch.size of the connector)")
+    run.add_argument("--reset", action="store_true", help="delete sink-labelled nodes before each path")
+    run.add_argument("--neo4j-uri", default=neo4j_cdc_sink.NEO4J_URI)
+    run.add_argument("--neo4j-user", default=neo4j_cdc_sink.NEO4J_USER)
+    run.add_argument("--neo4j-password", default=neo4j_cdc_sink.NEO4J_PASSWORD)
+    run.add_argument("--output", help="write the results as JSON")
+    run.set_defaults(func=cmd_run)
+
+    args = parser.parse_args()
+    sys.exit(args.func(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+Redis memory used by the two student layouts for the same synthetic students:
+
+  hashes  - redis_sync.sync_students_to_redis: a student:{id} hash per student and an
+            index:student:{name|email|group|search}:{term} set per distinct term
+  compact - redis_compact.write_students: msgpack records in students:{id // 1000} hashes,
+            rare terms in bucketed sorted-set dictionaries, frequent terms as sets
+
+Students are drawn the way DB_scripts/attendance_generator.py creates them
+(stud<5 digits> names, <name>@university.example mails, groups from config/data_config.json).
+Each layout is written into an empty database, then measured two ways:
+
+  used_memory - INFO memory delta against the empty database
+  sampled     - MEMORY USAGE of up to --samples random keys per key family, multiplied
+                by the family's key count; OBJECT ENCODING of the same keys shows whether
+                buckets and dictionaries stayed in listpack
+
+The compact layout needs the listpack thresholds from redis_compact.LISTPACK_CONFIG
+(docker-compose.yml starts redis with them); --configure applies them with CONFIG SET.
+Use a scratch database: --flush clears it before each layout.
+
+Usage:
+    python benchmarks/bench_redis_memory.py --students 1000000 --db 15 --flush --configure
+    python benchmarks/bench_redis_memory.py --students 100000 --layouts compact --db 15 --flush
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+
+from datasets import CONFIG_PATH, REPO_ROOT
+
+sys.path.insert(0, os.path.join(REPO_ROOT, "DB_scripts"))
+
+import redis_compact
+from redis_sync import student_index_keys
+
+BATCH_SIZE = 10000
+FAMILY_PATTERNS = [
+    (re.compile(r"^student:\d+$"), "student:<id>"),
+    (re.compile(r"^index:student:(\w+):"), "index:student:%s:*"),
+    (re.compile(r"^students:\d+$"), "students:<bucket>"),
+    (re.compile(r"^students:dict:(\w+):"), "students:dict:%s:*"),
+    (re.compile(r"^students:set:(\w+):"), "students:set:%s:*"),
+    (re.compile(r"^students:terms:(\w+)$"), "students:terms:%s"),
+    (re.compile(r"^students:meta$"), "students:meta"),
+]
+
+
+def generate_students(count, seed):
+    with open(CONFIG_PATH, "r", encoding="utf-8") as f:
+        groups = [g["name"] for g in json.load(f)["groups"]]
+    rng = random.Random(seed)
+    students = []
+    for student_id in range(1, count + 1):
+        name = f"stud{rng.randint(10000, 99999)}"
+        students.append((student_id, name, rng.randint(17, 24), f"{name}@university.example",
+                         rng.choice(groups)))
+    return students
+
+
+def write_hashes(r, students):
+    """The keys sync_students_to_redis writes, pipelined so that 1M students load in minutes."""
+    pipe = r.pipeline(transaction=False)
+    for start in range(0, len(students), BATCH_SIZE):
+        for student_id, name, age, mail, group_name in students[start:start + BATCH_SIZE]:
+            pipe.hset(f"student:{student_id}", mapping={
+                'id': student_id, 'name': name, 'age': age, 'mail': mail, 'group': group_name
+            })
+            for key in student_index_keys(name, mail, group_name):
+                pipe.sadd(key, student_id)
+        pipe.execute()
+
+
+LAYOUTS = {"hashes": write_hashes, "compact": redis_compact.write_students}
+
+
+def family_of(key):
+    for pattern, family in FAMILY_PATTERNS:
+        match = pattern.match(key)
+        if match:
+            return family % match.groups()
+    return "other"
+
+
+def sample_keys(r, samples, seed):
+    """{family: (key count, reservoir sample of keys)} from one SCAN pass."""
+    rng = random.Random(seed)
+    families = {}
+    for key in r.scan_iter(count=1000):
+        key = key.decode("utf-8") if isinstance(key, bytes) else key
+        family = family_of(key)
+        count, sample = families.get(family, (0, []))
+        count += 1
+        if len(sample) < samples:
+            sample.append(key)
+        else:
+            slot = rng.randrange(count)
+            if slot < samples:
+                sample[slot] = key
+        families[family] = (count, sample)
+    return families
+
+
+def measure_families(r, families, nested_samples):
+    report = {}
+    for family, (count, sample) in sorted(families.items()):
+        pipe = r.pipeline(transaction=False)
+        for key in sample:
+            pipe.memory_usage(key, samples=nested_samples)
+            pipe.object("encoding", key)
+        replies = pipe.execute()
+        sizes = [size or 0 for size in replies[0::2]]
+        encodings = {}
+        for encoding in replies[1::2]:
+            encoding = encoding.decode() if isinstance(encoding, bytes) else str(encoding)
+            encodings[encoding] = encodings.get(encoding, 0) + 1
+        mean = sum(sizes) / len(sizes) if sizes else 0
+        report[family] = {"keys": count, "sampled": len(sample), "mean_bytes": round(mean, 1),
+                          "estimated_bytes": round(mean * count), "encodings": encodings}
+    return report
+
+
+def run_layout(r, name, students, args):
+    if args.flush:
+        # SYNC: the memory must be freed before measuring, even with lazyfree-lazy-user-flush
+        r.execute_command("FLUSHDB", "SYNC")
+    if r.dbsize():
+        raise SystemExit(f"database {args.db} is not empty; pass --flush to clear it (scratch databases only)")
+    before = r.info("memory")["used_memory"]
+    t0 = time.perf_counter()
+    LAYOUTS[name](r, students)
+    elapsed = time.perf_counter() - t0
+    used = r.info("memory")["used_memory"] - before
+    families = measure_families(r, sample_keys(r, args.samples, args.seed), args.nested_samples)
+    estimated = sum(f["estimated_bytes"] for f in families.values())
+    return {"students": len(students), "keys": r.dbsize(), "write_seconds": round(elapsed, 1),
+            "used_memory_bytes": used, "sampled_bytes": estimated,
+            "bytes_per_student": round(used / len(students), 1), "families": families}
+
+
+def print_report(results):
+    print(f"{'layout':8s} {'keys':>10s} {'used_memory':>12s} {'sampled':>12s} {'B/student':>10s} {'write':>8s}")
+    for name, res in results.items():
+        print(f"{name:8s} {res['keys']:10d} {res['used_memory_bytes'] / 2 ** 20:10.1f}MB "
+              f"{res['sampled_bytes'] / 2 ** 20:10.1f}MB {res['bytes_per_student']:10.1f} {res['write_seconds']:7.1f}s")
+        for family, f in res["families"].items():
+            encodings = ", ".join(f"{enc} {n}" for enc, n in sorted(f["encodings"].items()))
+            print(f"    {family:28s} {f['keys']:10d} keys  {f['mean_bytes']:10.1f} B/key  "
+                  f"{f['estimated_bytes'] / 2 ** 20:9.1f}MB  [{encodings}]")
+    if "hashes" in results and "compact" in results:
+        ratio = results["hashes"]["used_memory_bytes"] / max(results["compact"]["used_memory_bytes"], 1)
+        print(f"compact layout uses {ratio:.1f}x less memory")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=1000000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--layouts", nargs="+", choices=sorted(LAYOUTS), default=["hashes", "compact"])
+    parser.add_argument("--samples", type=int, default=2000, help="keys sampled per key family")
+    parser.add_argument("--nested-samples", type=int, default=5,
+                        help="MEMORY USAGE SAMPLES for large sets and zsets (0 = every element)")
+    parser.add_argument("--redis-host", default="localhost")
+    parser.add_argument("--redis-port", type=int, default=6379)
+    parser.add_argument("--db", type=int, default=15)
+    parser.add_argument("--flush", action="store_true", help="FLUSHDB before each layout")
+    parser.add_argument("--configure", action="store_true",
+                        help="CONFIG SET the listpack thresholds the compact layout needs")
+    parser.add_argument("--output", help="write the results as JSON")
+    args = parser.parse_args()
+
+    import redis
+    r = redis.Redis(host=args.redis_host, port=args.redis_port, db=args.db)
+    try:
+        if args.configure:
+            for option, value in redis_compact.LISTPACK_CONFIG.items():
+                r.config_set(option, value)
+        config = {}
+        for option in redis_compact.LISTPACK_CONFIG:
+            config.update(r.config_get(option))
+        print("listpack thresholds: " + ", ".join(
+            f"{option.decode()}={value.decode()}" for option, value in config.items()))
+        students = generate_students(args.students, args.seed)
+        results = {name: run_layout(r, name, students, args) for name in args.layouts}
+        if args.flush:
+            r.execute_command("FLUSHDB", "SYNC")
+    finally:
+        r.close()
+    print_report(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
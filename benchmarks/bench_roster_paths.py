@@ -0,0 +1,70 @@
+"""
+Compare the two AttendanceFinder execution paths against live databases:
+
+  neo4j    - roster from Neo4j, then Schedule and Attendance queries in Postgres
+  postgres - Schedule -> Students -> Attendance joined in a single Postgres query
+
+Usage:
+    python benchmarks/bench_roster_paths.py --lectures 1 2 3 --runs 50
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "project_services", "lab1_service"))
+
+from Lab1 import AttendanceFinder, ROSTER_SOURCES
+
+
+def time_path(finder, lecture_ids, runs, top_n, start_date, end_date):
+    timings = []
+    result = None
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        result = finder.find_worst_attendees(lecture_ids, top_n=top_n,
+                                             start_date=start_date, end_date=end_date)
+        timings.append((time.perf_counter() - t0) * 1000)
+    return timings, result
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lectures", type=int, nargs="+", required=True)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--top-n", type=int, default=10)
+    parser.add_argument("--start-date", default=None)
+    parser.add_argument("--end-date", default=None)
+    parser.add_argument("--neo4j-uri", default="bolt://localhost:7687")
+    parser.add_argument("--pg-dsn", default="dbname=postgres_db user=postgres_user "
+                                            "password=postgres_password host=localhost port=5430")
+    args = parser.parse_args()
+
+    results = {}
+    for source in ROSTER_SOURCES:
+        finder = AttendanceFinder(neo4j_uri=args.neo4j_uri, pg_dsn=args.pg_dsn, roster_source=source)
+        try:
+            # warm up connections and plan caches
+            finder.find_worst_attendees(args.lectures, top_n=args.top_n,
+                                        start_date=args.start_date, end_date=args.end_date)
+            timings, result = time_path(finder, args.lectures, args.runs, args.top_n,
+                                        args.start_date, args.end_date)
+        finally:
+            finder.close()
+        results[source] = result
+        print(f"{source:9s} mean={statistics.mean(timings):8.2f}ms "
+              f"p50={percentile(timings, 50):8.2f}ms p95={percentile(timings, 95):8.2f}ms")
+
+    ids = {source: [r["studentId"] for r in result] for source, result in results.items()}
+    if len({tuple(v) for v in ids.values()}) > 1:
+        print("WARNING: paths returned different students:", ids)
+
+
+if __name__ == "__main__":
+    main()
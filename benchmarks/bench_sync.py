@@ -0,0 +1,255 @@
+"""
+Microbenchmarks for the DB_scripts sync jobs without the docker-compose stack:
+
+  neo4j   - neo4j_sync.SyncService.sync_all
+  redis   - redis_sync.sync_students_to_redis
+  mongo   - mongo_sync.sync_postgres_to_mongo
+  elastic - elastic_gen_sync.generate_and_sync_lecture_materials
+
+Each job reads Postgres result sets recorded once from a seeded database and writes to
+the in-memory sinks in benchmarks/sinks.py. The report shows the time per run, the rows
+read per second and the round trips per store. Round trips are deterministic, so any
+increase against the baseline fails the run: that is how lost batching or pipelining
+is caught.
+
+`smoke` needs no recording: it runs neo4j_sync.SyncService.sync_all sequentially and on
+the worker pool against the in-memory Neo4j sink, with Postgres rows from a benchmark
+dataset, and fails unless every table is synchronized. `run` does the same check first.
+
+Usage:
+    python benchmarks/bench_sync.py record          # once, against a seeded database
+    python benchmarks/bench_sync.py run --runs 5 --save-baseline
+    python benchmarks/bench_sync.py run --runs 5    # exits 1 on regression
+    python benchmarks/bench_sync.py smoke
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, time as day_time
+
+from datasets import CONFIG_PATH, REPO_ROOT, build_dataset
+from sinks import (
+    CountingRedis, DatasetPgConnection, MemoryElasticsearch, MemoryMongoDatabase, MemoryNeo4jDriver,
+    RecordingPgConnection, ReplayPgConnection, RoundTrips, load_recording, save_recording,
+)
+
+sys.path.insert(0, os.path.join(REPO_ROOT, "DB_scripts"))
+
+import elastic_gen_sync
+import mongo_sync
+import neo4j_sync
+import redis_sync
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_RECORDING = os.path.join(BENCH_DIR, "recordings", "sync_pg.json")
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "sync_baseline.json")
+
+
+def run_neo4j(pg_conn, trips):
+    service = neo4j_sync.SyncService(pg_conn=pg_conn, neo4j_driver=MemoryNeo4jDriver(trips))
+    try:
+        service.sync_all()
+    finally:
+        service.close()
+
+
+def run_redis(pg_conn, trips):
+    redis_sync.sync_students_to_redis(pg_conn=pg_conn, redis_conn=CountingRedis(trips))
+
+
+def run_mongo(pg_conn, trips):
+    mongo_sync.sync_postgres_to_mongo(pg_conn=pg_conn, mongo_db=MemoryMongoDatabase(trips))
+
+
+def run_elastic(pg_conn, trips):
+    with tempfile.TemporaryDirectory() as materials_dir:
+        elastic_gen_sync.generate_and_sync_lecture_materials(
+            materials_dir=materials_dir, pg_conn=pg_conn,
+            es=MemoryElasticsearch(trips), redis_conn=CountingRedis(trips)
+        )
+
+
+SYNCS = {
+    "neo4j": run_neo4j,
+    "redis": run_redis,
+    "mongo": run_mongo,
+    "elastic": run_elastic,
+}
+
+
+def dataset_tables(scale=1, seed=42):
+    """Rows of the tables SyncService reads, in its column order, plus updated_at."""
+    with open(CONFIG_PATH, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    ds = build_dataset(scale, seed)
+    now = datetime.now()
+    return {
+        "University": [(i, u["name"], u["location"], now) for i, u in enumerate(config["universities"], 1)],
+        "Institute": [(i, x["name"], x["university_id"], now) for i, x in enumerate(config["institutes"], 1)],
+        "Department": [(i, d["name"], d["institute_id"], now) for i, d in enumerate(config["departments"], 1)],
+        "Specialty": [(i, s["name"], s["department_id"], now) for i, s in ds.specialties.items()],
+        "St_group": [(i, g["name"], g["specialty_id"], now) for i, g in ds.groups.items()],
+        "Course_of_lecture": [(i, c["name"], c["department_id"], c["specialty_id"], now)
+                              for i, c in ds.courses.items()],
+        "Lecture": [(i, lec["name"], lec["course_id"], now) for i, lec in ds.lectures.items()],
+        "Material_of_lecture": [(i, m["name"], m["course_id"], now) for i, m in ds.materials.items()],
+        "Schedule": [(i, datetime.combine(s["date"], day_time(10)), s["lecture_id"], s["group_id"], now)
+                     for i, s in ds.schedules.items()],
+        "Students": [(i, s["name"], s["age"], s["mail"], s["group_id"], now) for i, s in ds.students.items()],
+    }
+
+
+def smoke_neo4j(workers=(1, neo4j_sync.SYNC_WORKERS)):
+    """Problems found by running sync_all against the in-memory sinks; empty if none."""
+    tables = dataset_tables()
+    problems = []
+    for n in workers:
+        trips = RoundTrips()
+        driver = MemoryNeo4jDriver(trips)
+        service = neo4j_sync.SyncService(pg_conn=DatasetPgConnection(tables, trips), neo4j_driver=driver)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                timings = service.sync_all(workers=n)
+            missing = sorted(set(service.sync_steps()) - set(timings))
+            merges = sum(1 for query in driver.statements if "MERGE" in query)
+            rows = sum(len(rows) for rows in tables.values())
+            if missing:
+                problems.append(f"workers={n}: steps not run: {missing}")
+            if merges != rows:
+                problems.append(f"workers={n}: {merges} MERGE statements for {rows} rows")
+        except Exception as e:
+            problems.append(f"workers={n}: {type(e).__name__}: {e}")
+        finally:
+            service.close()
+    return problems
+
+
+def cmd_smoke(args):
+    problems = smoke_neo4j()
+    for line in problems:
+        print("SMOKE FAILED", line)
+    if not problems:
+        print("smoke: neo4j sync_all ok")
+    return 1 if problems else 0
+
+
+def cmd_record(args):
+    import psycopg2
+    recordings = {}
+    conn = psycopg2.connect(args.pg_dsn)
+    try:
+        for name in args.syncs:
+            pg = RecordingPgConnection(conn)
+            with contextlib.redirect_stdout(io.StringIO()):
+                SYNCS[name](pg, RoundTrips())
+            recordings[name] = pg.recording
+            print(f"{name:8s} recorded {len(pg.recording)} result sets")
+    finally:
+        conn.rollback()
+        conn.close()
+    os.makedirs(os.path.dirname(args.recording), exist_ok=True)
+    save_recording(recordings, args.recording)
+    print(f"Saved to {args.recording}")
+    return 0
+
+
+def bench(name, recording, runs):
+    timings, trips = [], None
+    for _ in range(runs):
+        trips = RoundTrips()
+        pg = ReplayPgConnection(recording, trips)
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            SYNCS[name](pg, trips)
+        timings.append(time.perf_counter() - t0)
+    mean = statistics.mean(timings)
+    return {
+        "mean_ms": round(mean * 1000, 2),
+        "min_ms": round(min(timings) * 1000, 2),
+        "rows": trips.rows_read,
+        "rows_per_s": round(trips.rows_read / mean, 1) if mean else 0.0,
+        "round_trips": trips.as_dict(),
+    }
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, cur in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        for store, count in cur["round_trips"].items():
+            if count > base["round_trips"].get(store, 0):
+                regressions.append(f"{name}: {store} round trips {base['round_trips'].get(store, 0)} -> {count}")
+        if cur["rows_per_s"] < base["rows_per_s"] * (1 - tolerance):
+            regressions.append(f"{name}: rows/s {base['rows_per_s']} -> {cur['rows_per_s']}")
+    return regressions
+
+
+def cmd_run(args):
+    if cmd_smoke(args):
+        return 1
+    recordings = load_recording(args.recording)
+    results = {}
+    for name in args.syncs:
+        if name not in recordings:
+            print(f"{name:8s} skipped: not in {args.recording}")
+            continue
+        stats = bench(name, recordings[name], args.runs)
+        results[name] = stats
+        trips = " ".join(f"{store}={n}" for store, n in sorted(stats["round_trips"].items()))
+        print(f"{name:8s} mean={stats['mean_ms']:9.2f}ms min={stats['min_ms']:9.2f}ms "
+              f"rows={stats['rows']:7d} rows/s={stats['rows_per_s']:11.1f}  round trips: {trips}")
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    if args.save_baseline:
+        baseline.update(results)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    for line in regressions:
+        print("REGRESSION", line)
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    record = sub.add_parser("record", help="record Postgres result sets from a live database")
+    record.add_argument("--syncs", nargs="+", choices=sorted(SYNCS), default=sorted(SYNCS))
+    record.add_argument("--recording", default=DEFAULT_RECORDING)
+    record.add_argument("--pg-dsn", default="dbname=postgres_db user=postgres_user "
+                                            "password=postgres_password host=localhost port=5430")
+    record.set_defaults(func=cmd_record)
+
+    run = sub.add_parser("run", help="replay the recording through in-memory sinks")
+    run.add_argument("--syncs", nargs="+", choices=sorted(SYNCS), default=sorted(SYNCS))
+    run.add_argument("--recording", default=DEFAULT_RECORDING)
+    run.add_argument("--runs", type=int, default=5)
+    run.add_argument("--baseline", default=DEFAULT_BASELINE)
+    run.add_argument("--save-baseline", action="store_true")
+    run.add_argument("--tolerance", type=float, default=0.2)
+    run.set_defaults(func=cmd_run)
+
+    smoke = sub.add_parser("smoke", help="run neo4j sync_all against the in-memory sinks, no recording needed")
+    smoke.set_defaults(func=cmd_smoke)
+
+    args = parser.parse_args()
+    sys.exit(args.func(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Deterministic datasets for load-test runs.
+
+The hierarchy (departments, specialties, groups, courses, lectures) comes from
+config/data_config.json, like DB_scripts/attendance_generator.py does; schedules,
+students and attendance are drawn from the seed and grow with the scale factor:
+    students_per_group = 20 * scale, schedules = 200 * scale.
+The same (scale, seed) always produces the same dataset.
+"""
+import json
+import os
+import random
+from datetime import date, timedelta
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+CONFIG_PATH = os.path.join(REPO_ROOT, "config", "data_config.json")
+
+SCALE_FACTORS = (1, 2, 5, 10)
+SCHEDULE_START = date(2023, 9, 1)
+SCHEDULE_DAYS = 365
+
+
+def semester_of(day: date) -> str:
+    """Attendance partition key, computed the way attendance_generator does."""
+    return f"{day.year}_spring" if day.month <= 6 else f"{day.year}_fall"
+
+
+class Dataset:
+    def __init__(self, scale: int, seed: int):
+        self.scale = scale
+        self.seed = seed
+        self.departments = {}   # id -> {name}
+        self.specialties = {}   # id -> {name, department_id}
+        self.groups = {}        # id -> {name, specialty_id}
+        self.courses = {}       # id -> {name, department_id, specialty_id}
+        self.lectures = {}      # id -> {name, course_id}
+        self.materials = {}     # id -> {name, course_id}
+        self.schedules = {}     # id -> {date, lecture_id, group_id, semester}
+        self.students = {}      # id -> {name, age, mail, group_id}
+        self.attendance = {}    # (student_id, schedule_id) -> attended
+        self.group_students = {}  # group_id -> [student_id]
+
+    def group_department(self, group_id):
+        return self.specialties[self.groups[group_id]["specialty_id"]]["department_id"]
+
+    def students_of(self, group_id):
+        return self.group_students.get(group_id, [])
+
+    def summary(self):
+        return {
+            "scale": self.scale,
+            "seed": self.seed,
+            "groups": len(self.groups),
+            "lectures": len(self.lectures),
+            "schedules": len(self.schedules),
+            "students": len(self.students),
+            "attendance": len(self.attendance),
+        }
+
+
+def build_dataset(scale: int = 1, seed: int = 42, config_path: str = CONFIG_PATH) -> Dataset:
+    rng = random.Random(seed)
+    with open(config_path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+
+    ds = Dataset(scale, seed)
+    for i, d in enumerate(config["departments"], 1):
+        ds.departments[i] = {"name": d["name"]}
+    for i, s in enumerate(config["specialties"], 1):
+        ds.specialties[i] = {"name": s["name"], "department_id": s["department_id"]}
+    for i, g in enumerate(config["groups"], 1):
+        ds.groups[i] = {"name": g["name"], "specialty_id": g["specialty_id"]}
+    for i, c in enumerate(config["courses"], 1):
+        ds.courses[i] = {"name": c["name"], "department_id": c["department_id"],
+                         "specialty_id": c["specialty_id"]}
+    for i, l in enumerate(config["lectures"], 1):
+        ds.lectures[i] = {"name": l["name"], "course_id": l["course_id"]}
+    for i, m in enumerate(config["materials"], 1):
+        ds.materials[i] = {"name": m["name"], "course_id": m["course_id"]}
+
+    lecture_ids = list(ds.lectures)
+    group_ids = list(ds.groups)
+    for sid in range(1, 200 * scale + 1):
+        day = SCHEDULE_START + timedelta(days=rng.randint(0, SCHEDULE_DAYS))
+        ds.schedules[sid] = {"date": day, "lecture_id": rng.choice(lecture_ids),
+                             "group_id": rng.choice(group_ids), "semester": semester_of(day)}
+
+    by_group = {}
+    for sid, sch in ds.schedules.items():
+        by_group.setdefault(sch["group_id"], []).append(sid)
+
+    next_student = 1
+    for group_id in group_ids:
+        sessions = by_group.get(group_id, [])
+        if not sessions:
+            continue
+        for _ in range(20 * scale):
+            name = f"stud{rng.randint(10000, 99999)}"
+            ds.students[next_student] = {"name": name, "age": rng.randint(17, 24),
+                                         "mail": f"{name}@university.example", "group_id": group_id}
+            ds.group_students.setdefault(group_id, []).append(next_student)
+            rate = rng.random()
+            for sch_id in sessions:
+                ds.attendance[(next_student, sch_id)] = rng.random() < rate
+            next_student += 1
+    return ds
@@ -0,0 +1,291 @@
+"""
+Load test for the report endpoints:
+
+  lab1 - POST /api/lab1/report
+  lab2 - POST /api/lab2/audience_report
+  lab3 - POST /api/lab3/group_report
+
+Targets:
+  compose   - HTTP through the gateway of a running docker-compose stack (JWT login as user/user)
+  inprocess - the Flask apps of lab1-3 via test_client, with ES/Neo4j/Postgres replaced by
+              benchmarks/stubs.py and Redis by fakeredis; no containers needed (CI-style runs)
+
+Records throughput and p50/p95/p99 per endpoint and compares them with a stored baseline.
+
+Usage:
+    # deterministic data for the compose stack (run against a freshly purged stack)
+    python benchmarks/loadtest.py seed --scale 2 --seed 42
+
+    python benchmarks/loadtest.py run --target compose --scale 2 --concurrency 8 --requests 400
+    python benchmarks/loadtest.py run --target inprocess --scale 1 5 --save-baseline
+    python benchmarks/loadtest.py run --target inprocess --scale 1 5   # exits 1 on regression
+"""
+import argparse
+import importlib
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from datasets import REPO_ROOT, SCALE_FACTORS, build_dataset
+
+SERVICES_DIR = os.path.join(REPO_ROOT, "project_services")
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+ENDPOINTS = {
+    "lab1": ("lab1_service", "/api/lab1/report"),
+    "lab2": ("lab2_service", "/api/lab2/audience_report"),
+    "lab3": ("lab3_service", "/api/lab3/group_report"),
+}
+# module names shared by several service directories
+SERVICE_MODULES = ("app", "Lab1", "neo4j_sync", "search_cache", "instrumentation", "tracing", "pools",
+                   "attendance_bitmap")
+TERMS = ("алгебра", "механика", "генетика", "химия", "право", "макроэкономика")
+
+
+def make_payloads(endpoint, count, seed, dataset=None):
+    rng = random.Random(f"{seed}:{endpoint}")
+    payloads = []
+    for _ in range(count):
+        if endpoint == "lab1":
+            start_month = rng.choice((9, 2))
+            year = 2023 if start_month == 9 else 2024
+            payloads.append({
+                "term": rng.choice(TERMS),
+                "start_date": f"{year}-{start_month:02d}-01",
+                "end_date": f"{year}-{start_month + 3:02d}-30",
+            })
+        elif endpoint == "lab2":
+            payloads.append({"year": 2023 if rng.random() < 0.5 else 2024, "semester": rng.choice((1, 2))})
+        else:
+            group_ids = sorted(dataset.group_students) if dataset else range(1, 33)
+            payloads.append({"group_id": rng.choice(list(group_ids))})
+    return payloads
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def drive(send, payloads, concurrency):
+    """Send payloads from `concurrency` threads; send(payload) returns the HTTP status."""
+    latencies, errors = [], 0
+    lock = threading.Lock()
+
+    def one(payload):
+        nonlocal errors
+        t0 = time.perf_counter()
+        try:
+            ok = send(payload) < 500
+        except Exception:
+            ok = False
+        elapsed = (time.perf_counter() - t0) * 1000
+        with lock:
+            latencies.append(elapsed)
+            if not ok:
+                errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, payloads))
+    duration = time.perf_counter() - started
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "duration_s": round(duration, 3),
+        "throughput_rps": round(len(latencies) / duration, 2),
+        "mean_ms": round(statistics.mean(latencies), 2),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+    }
+
+
+class ComposeTarget:
+    def __init__(self, gateway_url, username="user", password="user"):
+        import requests
+        self.requests = requests
+        self.gateway_url = gateway_url.rstrip("/")
+        resp = requests.post(f"{self.gateway_url}/auth/login",
+                             json={"username": username, "password": password})
+        resp.raise_for_status()
+        self.headers = {"Authorization": f"Bearer {resp.json()['access_token']}"}
+        self._local = threading.local()
+
+    def sender(self, endpoint):
+        path = ENDPOINTS[endpoint][1]
+
+        def send(payload):
+            session = getattr(self._local, "session", None)
+            if session is None:
+                session = self._local.session = self.requests.Session()
+            return session.post(f"{self.gateway_url}{path}", json=payload, headers=self.headers).status_code
+        return send
+
+    def close(self):
+        pass
+
+
+class InProcessTarget:
+    def __init__(self, dataset):
+        from stubs import stand_ins
+        self._stand_ins = stand_ins(dataset)
+        self._stand_ins.__enter__()
+        self.apps = {}
+
+    def _load_app(self, service_dir):
+        for name in SERVICE_MODULES:
+            sys.modules.pop(name, None)
+        path = os.path.join(SERVICES_DIR, service_dir)
+        sys.path.insert(0, path)
+        try:
+            return importlib.import_module("app").app
+        finally:
+            sys.path.remove(path)
+
+    def sender(self, endpoint):
+        service_dir, path = ENDPOINTS[endpoint]
+        if endpoint not in self.apps:
+            self.apps[endpoint] = self._load_app(service_dir)
+        app = self.apps[endpoint]
+        local = threading.local()
+
+        def send(payload):
+            client = getattr(local, "client", None)
+            if client is None:
+                client = local.client = app.test_client()
+            return client.post(path, json=payload).status_code
+        return send
+
+    def close(self):
+        self._stand_ins.__exit__(None, None, None)
+
+
+def compare(results, baseline, tolerance):
+    """A regression is p95 rising or throughput falling by more than `tolerance`."""
+    regressions = []
+    for key, cur in results.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        if cur["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{key}: p95 {base['p95_ms']}ms -> {cur['p95_ms']}ms")
+        if cur["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{key}: throughput {base['throughput_rps']} -> {cur['throughput_rps']} req/s")
+        if cur["errors"] > base["errors"]:
+            regressions.append(f"{key}: errors {base['errors']} -> {cur['errors']}")
+    return regressions
+
+
+def cmd_run(args):
+    results = {}
+    for scale in args.scale:
+        dataset = build_dataset(scale, args.seed) if args.target == "inprocess" else None
+        target = (InProcessTarget(dataset) if args.target == "inprocess"
+                  else ComposeTarget(args.gateway_url))
+        try:
+            for endpoint in args.endpoints:
+                send = target.sender(endpoint)
+                # warm up connections, caches and plan caches
+                drive(send, make_payloads(endpoint, args.warmup, args.seed + 1, dataset), args.concurrency)
+                stats = drive(send, make_payloads(endpoint, args.requests, args.seed, dataset), args.concurrency)
+                key = f"{args.target}:{endpoint}:scale{scale}:c{args.concurrency}"
+                results[key] = stats
+                print(f"{key:32s} {stats['throughput_rps']:8.2f} req/s  p50={stats['p50_ms']:8.2f}ms "
+                      f"p95={stats['p95_ms']:8.2f}ms p99={stats['p99_ms']:8.2f}ms errors={stats['errors']}")
+        finally:
+            target.close()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    if args.save_baseline:
+        baseline.update(results)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    for line in regressions:
+        print("REGRESSION", line)
+    return 1 if regressions else 0
+
+
+def cmd_seed(args):
+    # same steps as DB_scripts/total_generator.py, with a fixed seed and size
+    sys.path.insert(0, os.path.join(REPO_ROOT, "DB_scripts"))
+    os.chdir(REPO_ROOT)  # attendance_generator reads config/ via a relative path
+    import psycopg2
+    from faker import Faker
+    import attendance_generator
+    import elastic_gen_sync
+    import mongo_sync
+    import neo4j_sync
+    import redis_sync
+
+    random.seed(args.seed)
+    Faker.seed(args.seed)
+    conn = psycopg2.connect(args.pg_dsn)
+    try:
+        with conn.cursor() as cur:
+            attendance_generator.generate_students_and_attendance(cur, students_per_group=20 * args.scale)
+        conn.commit()
+    finally:
+        conn.close()
+    service = neo4j_sync.SyncService()
+    try:
+        service.sync_all()
+    finally:
+        service.close()
+    mongo_sync.sync_postgres_to_mongo()
+    redis_sync.sync_students_to_redis()
+    elastic_gen_sync.generate_and_sync_lecture_materials()
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    seed = sub.add_parser("seed", help="generate deterministic data in the docker-compose stack")
+    seed.add_argument("--scale", type=int, default=1)
+    seed.add_argument("--seed", type=int, default=42)
+    seed.add_argument("--pg-dsn", default="dbname=postgres_db user=postgres_user "
+                                          "password=postgres_password host=localhost port=5430")
+    seed.set_defaults(func=cmd_seed)
+
+    run = sub.add_parser("run", help="drive the report endpoints")
+    run.add_argument("--target", choices=("compose", "inprocess"), default="inprocess")
+    run.add_argument("--endpoints", nargs="+", choices=sorted(ENDPOINTS), default=sorted(ENDPOINTS))
+    run.add_argument("--scale", type=int, nargs="+", default=[1],
+                     help=f"scale factors, e.g. {' '.join(map(str, SCALE_FACTORS))}; for compose it only "
+                          "labels the results and must match what `seed` loaded")
+    run.add_argument("--seed", type=int, default=42)
+    run.add_argument("--concurrency", type=int, default=4)
+    run.add_argument("--requests", type=int, default=200)
+    run.add_argument("--warmup", type=int, default=20)
+    run.add_argument("--gateway-url", default="http://localhost:1337")
+    run.add_argument("--baseline", default=DEFAULT_BASELINE)
+    run.add_argument("--save-baseline", action="store_true")
+    run.add_argument("--tolerance", type=float, default=0.15)
+    run.add_argument("--output", help="write this run's results as JSON")
+    run.set_defaults(func=cmd_run)
+
+    args = parser.parse_args()
+    sys.exit(args.func(args))
+
+
+if __name__ == "__main__":
+    main()
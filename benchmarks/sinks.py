@@ -0,0 +1,434 @@
+"""
+In-memory sinks and recorded Postgres result sets for benchmarks/bench_sync.py.
+
+Every store counts its round trips in a shared RoundTrips counter:
+  - one per Postgres execute/executemany;
+  - one per Neo4j session.run / tx.run;
+  - one per Redis command, and one per pipeline execute() no matter how many commands it queues;
+  - one per Mongo collection call;
+  - one per ES API call (index, bulk, indices.*).
+So a change that batches or pipelines shows up as fewer round trips for the same rows.
+
+A recording is a JSON file mapping (SQL, params) to the rows Postgres returned.
+It is made once against a live database (RecordingPgConnection) and replayed offline
+(ReplayPgConnection). DatasetPgConnection needs no recording: it answers the table reads
+of neo4j_sync.SyncService from in-memory rows, for smoke checks.
+"""
+import json
+import re
+from collections import Counter
+from datetime import date, datetime
+from decimal import Decimal
+
+
+class RoundTrips:
+    def __init__(self):
+        self.calls = Counter()
+        self.rows_read = 0
+
+    def hit(self, store, n=1):
+        self.calls[store] += n
+
+    def as_dict(self):
+        return dict(self.calls)
+
+
+# --- Postgres: record / replay ---------------------------------------------------------
+
+def _normalize_sql(sql):
+    return re.sub(r"\s+", " ", sql).strip()
+
+
+def _key(sql, params):
+    return _normalize_sql(sql) + " -- " + json.dumps(_encode(params), sort_keys=True, ensure_ascii=False)
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    if isinstance(value, date):
+        return {"__date__": value.isoformat()}
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (list, tuple)):
+        return [_encode(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _encode(v) for k, v in value.items()}
+    return value
+
+
+def _decode(value):
+    if isinstance(value, dict):
+        if "__datetime__" in value:
+            return datetime.fromisoformat(value["__datetime__"])
+        if "__date__" in value:
+            return date.fromisoformat(value["__date__"])
+        return {k: _decode(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+    return value
+
+
+class _BufferedCursor:
+    def __init__(self):
+        self._rows = []
+        self.rowcount = -1
+        self.description = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def __iter__(self):
+        while self._rows:
+            yield self._rows.pop(0)
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    def fetchone(self):
+        return self._rows.pop(0) if self._rows else None
+
+    def fetchmany(self, size=None):
+        size = size or 1
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        return rows
+
+    def close(self):
+        pass
+
+
+class RecordingCursor(_BufferedCursor):
+    def __init__(self, cursor, recording):
+        super().__init__()
+        self._cur = cursor
+        self._recording = recording
+
+    def execute(self, sql, params=None):
+        self._cur.execute(sql, params)
+        self.description = self._cur.description
+        self.rowcount = self._cur.rowcount
+        self._rows = [tuple(r) for r in self._cur.fetchall()] if self._cur.description else []
+        self._recording[_key(sql, params)] = [_encode(list(r)) for r in self._rows]
+
+    def executemany(self, sql, seq):
+        self._cur.executemany(sql, seq)
+        self._rows = []
+
+    def close(self):
+        self._cur.close()
+
+
+class RecordingPgConnection:
+    """Proxies a live psycopg2 connection and stores every result set it returns."""
+
+    def __init__(self, conn):
+        self._conn = conn
+        self.recording = {}
+
+    def cursor(self, *args, **kwargs):
+        return RecordingCursor(self._conn.cursor(), self.recording)
+
+    def commit(self):
+        # recording must not change anything in the live database
+        self._conn.rollback()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        pass
+
+
+class ReplayCursor(_BufferedCursor):
+    def __init__(self, recording, trips):
+        super().__init__()
+        self._recording = recording
+        self._trips = trips
+
+    def execute(self, sql, params=None):
+        self._trips.hit("postgres")
+        key = _key(sql, params)
+        if key not in self._recording:
+            raise KeyError(f"query not in recording (re-record after changing SQL): {key[:300]}")
+        self._rows = [tuple(_decode(r)) for r in self._recording[key]]
+        self.rowcount = len(self._rows)
+        self._trips.rows_read += len(self._rows)
+
+    def executemany(self, sql, seq):
+        self._trips.hit("postgres")
+        self._rows = []
+
+
+class ReplayPgConnection:
+    def __init__(self, recording, trips):
+        self._recording = recording
+        self._trips = trips
+        self.autocommit = False
+
+    def cursor(self, *args, **kwargs):
+        return ReplayCursor(self._recording, self._trips)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class DatasetCursor(_BufferedCursor):
+    _TABLE_READ = re.compile(r"^SELECT (.+), updated_at FROM (\w+)(?: WHERE updated_at > %s)?$")
+
+    def __init__(self, tables, trips):
+        super().__init__()
+        self._tables = tables
+        self._trips = trips
+
+    def execute(self, sql, params=None):
+        self._trips.hit("postgres")
+        sql = _normalize_sql(sql)
+        match = self._TABLE_READ.match(sql)
+        if match:
+            self._rows = list(self._tables[match.group(2)])
+        elif sql.startswith("SELECT table_name, watermark FROM sync_watermark"):
+            self._rows = []
+        elif sql.startswith("INSERT INTO sync_watermark"):
+            self._rows = []
+        else:
+            raise NotImplementedError(f"query not served by DatasetPgConnection: {sql[:300]}")
+        self.rowcount = len(self._rows)
+        self._trips.rows_read += len(self._rows)
+
+
+class DatasetPgConnection(ReplayPgConnection):
+    """tables: {table: [row + (updated_at,)]}, in the column order SyncService selects."""
+
+    def __init__(self, tables, trips):
+        super().__init__(None, trips)
+        self._tables = tables
+
+    def cursor(self, *args, **kwargs):
+        return DatasetCursor(self._tables, self._trips)
+
+
+def save_recording(recording, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(recording, f, ensure_ascii=False)
+
+
+def load_recording(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+# --- Neo4j --------------------------------------------------------------------------------
+
+class _EmptyResult:
+    def __iter__(self):
+        return iter(())
+
+    def single(self):
+        return None
+
+    def data(self):
+        return []
+
+    def consume(self):
+        return None
+
+
+class MemoryNeo4jTx:
+    def __init__(self, driver):
+        self._driver = driver
+
+    def run(self, query, parameters=None, **params):
+        self._driver.trips.hit("neo4j")
+        self._driver.statements.append(query)
+        return _EmptyResult()
+
+
+class MemoryNeo4jSession(MemoryNeo4jTx):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute_write(self, fn, *args, **kwargs):
+        return fn(MemoryNeo4jTx(self._driver), *args, **kwargs)
+
+    execute_read = execute_write
+
+    def close(self):
+        pass
+
+
+class MemoryNeo4jDriver:
+    def __init__(self, trips):
+        self.trips = trips
+        self.statements = []
+
+    def session(self, **kwargs):
+        return MemoryNeo4jSession(self)
+
+    def close(self):
+        pass
+
+
+# --- Redis ----------------------------------------------------------------------------------
+
+class _CountingPipeline:
+    def __init__(self, pipe, trips):
+        self._pipe = pipe
+        self._trips = trips
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        return getattr(self._pipe, name)
+
+    def execute(self, *args, **kwargs):
+        self._trips.hit("redis")
+        return self._pipe.execute(*args, **kwargs)
+
+
+class CountingRedis:
+    """fakeredis behind a proxy that counts one round trip per command / pipeline."""
+
+    def __init__(self, trips, decode_responses=True):
+        import fakeredis
+        self._client = fakeredis.FakeRedis(decode_responses=decode_responses)
+        self._trips = trips
+
+    def pipeline(self, *args, **kwargs):
+        return _CountingPipeline(self._client.pipeline(*args, **kwargs), self._trips)
+
+    def scan_iter(self, *args, **kwargs):
+        self._trips.hit("redis")
+        return self._client.scan_iter(*args, **kwargs)
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            self._trips.hit("redis")
+            return attr(*args, **kwargs)
+        return call
+
+    def close(self):
+        pass
+
+
+# --- MongoDB --------------------------------------------------------------------------------
+
+class MemoryMongoCollection:
+    def __init__(self, trips):
+        self._trips = trips
+        self.documents = []
+
+    def insert_one(self, doc):
+        self._trips.hit("mongo")
+        self.documents.append(doc)
+
+    def insert_many(self, docs, ordered=True):
+        self._trips.hit("mongo")
+        self.documents.extend(docs)
+
+    def create_index(self, *args, **kwargs):
+        self._trips.hit("mongo")
+
+    def delete_many(self, flt):
+        self._trips.hit("mongo")
+        self.documents = []
+
+
+class MemoryMongoDatabase:
+    def __init__(self, trips):
+        self._trips = trips
+        self.collections = {}
+
+    def __getitem__(self, name):
+        return self.collections.setdefault(name, MemoryMongoCollection(self._trips))
+
+    def drop_collection(self, name):
+        self._trips.hit("mongo")
+        self.collections.pop(name, None)
+
+    def create_collection(self, name, **kwargs):
+        self._trips.hit("mongo")
+        return self[name]
+
+    def command(self, *args, **kwargs):
+        self._trips.hit("mongo")
+        return {"ok": 1}
+
+
+# --- Elasticsearch ------------------------------------------------------------------------
+
+class _MemoryIndices:
+    def __init__(self, es):
+        self._es = es
+
+    def exists(self, index):
+        self._es.trips.hit("elasticsearch")
+        return index in self._es.indexes
+
+    def create(self, index, **kwargs):
+        self._es.trips.hit("elasticsearch")
+        self._es.indexes.setdefault(index, {})
+
+    def delete(self, index, **kwargs):
+        self._es.trips.hit("elasticsearch")
+        for name in str(index).split(","):
+            self._es.indexes.pop(name, None)
+
+    def refresh(self, index=None, **kwargs):
+        self._es.trips.hit("elasticsearch")
+
+    def put_settings(self, *args, **kwargs):
+        self._es.trips.hit("elasticsearch")
+
+
+class MemoryElasticsearch:
+    def __init__(self, trips):
+        self.trips = trips
+        self.indexes = {}
+        self.indices = _MemoryIndices(self)
+
+    def options(self, **kwargs):
+        return self
+
+    def index(self, index, id=None, document=None, **kwargs):
+        self.trips.hit("elasticsearch")
+        self.indexes.setdefault(index, {})[id] = document
+
+    def bulk(self, operations=None, index=None, **kwargs):
+        self.trips.hit("elasticsearch")
+        items = []
+        ops = list(operations or [])
+        i = 0
+        while i < len(ops):
+            action, meta = next(iter(ops[i].items()))
+            target = meta.get("_index", index)
+            doc = None if action == "delete" else ops[i + 1]
+            if action != "delete":
+                self.indexes.setdefault(target, {})[meta.get("_id")] = doc
+            items.append({action: {"_id": meta.get("_id"), "status": 200}})
+            i += 1 if action == "delete" else 2
+        return {"errors": False, "items": items}
+
+    def close(self):
+        pass
@@ -0,0 +1,299 @@
+"""
+In-process stand-ins for Elasticsearch, Neo4j and Postgres, backed by a Dataset
+(see datasets.py). Redis is replaced by fakeredis. The stubs answer only the
+queries the report endpoints actually send. They recognise each query by a
+fragment of its text, so an unknown query raises NotImplementedError. That keeps
+the benchmark in step with the service code.
+
+Used by `loadtest.py run --target inprocess` for CI-style runs without docker-compose.
+"""
+from contextlib import ExitStack, contextmanager
+from datetime import date, datetime
+from types import SimpleNamespace
+from unittest import mock
+
+
+def _to_date(value):
+    if value is None or isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def _in_range(day, start, end):
+    start, end = _to_date(start), _to_date(end)
+    return (start is None or day >= start) and (end is None or day <= end)
+
+
+class FakeRecord(dict):
+    def data(self):
+        return dict(self)
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self._rows = [FakeRecord(r) for r in rows]
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def single(self):
+        return self._rows[0] if self._rows else None
+
+    def data(self):
+        return [r.data() for r in self._rows]
+
+
+class FakeNeo4jSession:
+    def __init__(self, ds):
+        self.ds = ds
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def close(self):
+        pass
+
+    def run(self, query, parameters=None, **params):
+        params = {**(parameters or {}), **params}
+        ds = self.ds
+        if "UNWIND $lecture_ids" in query and "HAS_STUDENT" in query:
+            lecture_ids = set(params["lecture_ids"])
+            groups = {sch["group_id"] for sch in ds.schedules.values() if sch["lecture_id"] in lecture_ids}
+            return FakeResult(
+                {"student_id": sid, "student_name": st["name"]}
+                for sid, st in ds.students.items() if st["group_id"] in groups
+            )
+        if "total_students" in query:
+            rows = []
+            for sch in ds.schedules.values():
+                if not _in_range(sch["date"], params["start"], params["end"]):
+                    continue
+                total = len(ds.students_of(sch["group_id"]))
+                if not total:
+                    continue
+                lecture = ds.lectures[sch["lecture_id"]]
+                rows.append({
+                    "course_name": ds.courses[lecture["course_id"]]["name"],
+                    "lecture_name": lecture["name"],
+                    "tech_requirements": sorted({m["name"] for m in ds.materials.values()
+                                                 if m["course_id"] == lecture["course_id"]}),
+                    "total_students": total,
+                })
+            rows.sort(key=lambda r: (r["course_name"], r["lecture_name"]))
+            return FakeResult(rows)
+        if "dept_id" in query and "$gid" in query:
+            group = ds.groups.get(params["gid"])
+            if group is None:
+                return FakeResult([])
+            dept_id = ds.group_department(params["gid"])
+            return FakeResult([{"id": params["gid"], "name": group["name"],
+                                "dept_id": dept_id, "dept_name": ds.departments[dept_id]["name"]}])
+        if "OFFERS" in query:
+            rows = []
+            for sid, sch in ds.schedules.items():
+                course_id = ds.lectures[sch["lecture_id"]]["course_id"]
+                if ds.courses[course_id]["department_id"] == params["did"]:
+                    rows.append({"schedule_id": sid, "course_id": course_id,
+                                 "course_name": ds.courses[course_id]["name"], "date": sch["date"]})
+            return FakeResult(rows)
+        if "HAS_STUDENT" in query and "$gid" in query:
+            return FakeResult({"student_id": sid, "student_name": ds.students[sid]["name"]}
+                              for sid in ds.students_of(params["gid"]))
+        raise NotImplementedError(f"Neo4j stub does not know this query:\n{query}")
+
+
+class FakeNeo4jDriver:
+    def __init__(self, ds):
+        self.ds = ds
+
+    def session(self, **kwargs):
+        return FakeNeo4jSession(self.ds)
+
+    def verify_connectivity(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeCursor:
+    def __init__(self, ds, snapshots):
+        self.ds = ds
+        self.snapshots = snapshots
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def close(self):
+        pass
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    def fetchone(self):
+        return self._rows.pop(0) if self._rows else None
+
+    def _stats(self, pairs):
+        acc = {}
+        for student_id, schedule_id in pairs:
+            attended = self.ds.attendance.get((student_id, schedule_id))
+            if attended is None:
+                continue
+            a, t = acc.get(student_id, (0, 0))
+            acc[student_id] = (a + int(attended), t + 1)
+        return {sid: (a, t, round(100.0 * a / t, 2)) for sid, (a, t) in acc.items()}
+
+    def execute(self, sql, params=None):
+        ds = self.ds
+        params = list(params or [])
+        if "FROM audience_report_snapshot" in sql:
+            year, semester = (int(p) for p in params)
+            snapshot = self.snapshots.get((year, semester))
+            self._rows = [snapshot] if snapshot else []
+        elif "INSERT INTO audience_report_snapshot" in sql:
+            year, semester, report = params
+            self.snapshots[(int(year), int(semester))] = (report.adapted, datetime.now())
+            self._rows = []
+        elif "JOIN Students st" in sql:
+            lecture_ids, start, _, end, _, limit = params
+            schedules = [sid for sid, sch in ds.schedules.items()
+                         if sch["lecture_id"] in set(lecture_ids) and _in_range(sch["date"], start, end)]
+            pairs = [(st_id, sch_id) for sch_id in schedules
+                     for st_id in ds.students_of(ds.schedules[sch_id]["group_id"])]
+            rows = [(sid, ds.students[sid]["name"], *vals) for sid, vals in self._stats(pairs).items()]
+            if "attendance_percent, st.id" in sql:
+                rows.sort(key=lambda r: (r[4], r[0]))
+            else:
+                rows.sort(key=lambda r: r[1])
+            self._rows = rows[:limit] if limit else rows
+        elif "AS schedule_id" in sql and "FROM Schedule" in sql:
+            lecture_ids, start, _, end, _ = params
+            self._rows = [(sid, sch["semester"]) for sid, sch in ds.schedules.items()
+                          if sch["lecture_id"] in set(lecture_ids) and _in_range(sch["date"], start, end)]
+        elif "attendance_percent" in sql and "FROM Attendance" in sql:
+            student_ids, schedule_ids, semesters = params[:3]
+            semesters = set(semesters)
+            pairs = [(st, sch) for st in student_ids for sch in schedule_ids
+                     if ds.schedules[sch]["semester"] in semesters]
+            rows = [(sid, *vals) for sid, vals in self._stats(pairs).items()]
+            if "LIMIT" in sql:
+                rows.sort(key=lambda r: (r[3], r[0]))
+                if params[3]:
+                    rows = rows[:params[3]]
+            self._rows = rows
+        elif "LEFT JOIN St_group" in sql:
+            self._rows = [(sid, ds.students[sid]["name"], ds.students[sid]["age"], ds.students[sid]["mail"],
+                           ds.groups[ds.students[sid]["group_id"]]["name"])
+                          for sid in params[0] if sid in ds.students]
+        elif "attended_hours" in sql:
+            student_ids, schedule_ids = params[:2]
+            self._rows = [(st, sch, 2 * int(ds.attendance[(st, sch)]))
+                          for st in student_ids for sch in schedule_ids if (st, sch) in ds.attendance]
+        else:
+            raise NotImplementedError(f"Postgres stub does not know this query:\n{sql}")
+
+
+class FakePgConnection:
+    def __init__(self, ds, snapshots):
+        self.ds = ds
+        self.snapshots = snapshots
+        self.autocommit = False
+        self.closed = 0
+        # psycopg2.pool checks the transaction status on putconn (0 = idle)
+        self.info = SimpleNamespace(transaction_status=0)
+
+    def cursor(self, *args, **kwargs):
+        return FakeCursor(self.ds, self.snapshots)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = 1
+
+
+class FakeElasticsearch:
+    """Enough for LectureMaterialSearcher: PIT + search_after over the lecture_id docvalue."""
+
+    def __init__(self, ds):
+        self.ds = ds
+
+    def _matches(self, text):
+        # crude stand-in for fuzziness=AUTO: match on the word stem (first 5 letters)
+        stems = [token[:5] for token in text.lower().split() if token]
+        hits = []
+        for lid, lecture in self.ds.lectures.items():
+            haystack = f"{lecture['name']} {self.ds.courses[lecture['course_id']]['name']}".lower()
+            score = sum(haystack.count(stem) for stem in stems)
+            if score:
+                hits.append((float(score), lid))
+        hits.sort(key=lambda h: (-h[0], h[1]))
+        return hits
+
+    def open_point_in_time(self, index, keep_alive):
+        return {"id": "stub-pit"}
+
+    def close_point_in_time(self, id):
+        return {"succeeded": True}
+
+    def search(self, query=None, size=10, search_after=None, **kwargs):
+        hits = self._matches(query["multi_match"]["query"])
+        if search_after is not None:
+            hits = [h for h in hits if (-h[0], h[1]) > (-search_after[0], search_after[1])]
+        page = hits[:size]
+        return {
+            "pit_id": "stub-pit",
+            "hits": {"hits": [{"fields": {"lecture_id": [lid]}, "sort": [score, lid]} for score, lid in page]},
+        }
+
+    def close(self):
+        pass
+
+
+def seed_redis(client, ds):
+    pipe = client.pipeline(transaction=False)
+    for sid, st in ds.students.items():
+        pipe.hset(f"student:{sid}", mapping={
+            "id": sid, "name": st["name"], "age": st["age"], "mail": st["mail"],
+            "group": ds.groups[st["group_id"]]["name"],
+        })
+    pipe.execute()
+
+
+@contextmanager
+def stand_ins(ds):
+    """Swap storage clients for the duration of a run; import the services inside the block."""
+    import elasticsearch
+    import fakeredis
+    import neo4j
+    import psycopg2
+    import redis
+
+    server = fakeredis.FakeServer()
+    snapshots = {}  # audience_report_snapshot rows: (year, semester) -> (report, built_at)
+
+    def make_redis(*args, **kwargs):
+        # ServicePools.redis() passes only connection_pool; its options live in connection_kwargs
+        pool = kwargs.get("connection_pool")
+        options = pool.connection_kwargs if pool is not None else kwargs
+        return fakeredis.FakeRedis(server=server, decode_responses=options.get("decode_responses", False))
+
+    seed_redis(make_redis(decode_responses=True), ds)
+    with ExitStack() as stack:
+        stack.enter_context(mock.patch.object(psycopg2, "connect", lambda *a, **kw: FakePgConnection(ds, snapshots)))
+        stack.enter_context(mock.patch.object(neo4j.GraphDatabase, "driver", lambda *a, **kw: FakeNeo4jDriver(ds)))
+        stack.enter_context(mock.patch.object(elasticsearch, "Elasticsearch", lambda *a, **kw: FakeElasticsearch(ds)))
+        stack.enter_context(mock.patch.object(redis, "Redis", make_redis))
+        yield
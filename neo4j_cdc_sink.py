@@ -0,0 +1,220 @@
+import json
+import time
+import logging
+
+from kafka import KafkaConsumer
+from neo4j import GraphDatabase
+
+# Константы подключения
+KAFKA_BOOTSTRAP_SERVERS = ['localhost:9092']
+TOPIC_PREFIX = 'postgres_server.public.'
+GROUP_ID = 'neo4j-cdc-sink-consumer-group'
+
+NEO4J_URI = 'bolt://localhost:7687'
+NEO4J_USER = 'neo4j'
+NEO4J_PASSWORD = 'strongpassword'
+
+# Размер микропакета (событий после схлопывания по ключу) и максимальная
+# задержка применения пакета
+BATCH_SIZE = 2000
+BATCH_MAX_WAIT_MS = 500
+
+# Граф та же, что строят шаблоны config/neo4j_sink.json:
+# таблица -> (метка, {свойство: выражение от row}, [(связь, направление, метка родителя, колонка)])
+# направление 'out': (n)-[:REL]->(parent), 'in': (parent)-[:REL]->(n).
+# Таблицы перечислены от родителей к детям: в этом порядке применяются upsert'ы.
+GRAPH = {
+    'university': ('University', {'name': 'row.name', 'location': 'row.location'}, []),
+    'institute': ('Institute', {'name': 'row.name'},
+                  [('BELONGS_TO', 'out', 'University', 'university_id')]),
+    'department': ('Department', {'name': 'row.name'},
+                   [('BELONGS_TO', 'out', 'Institute', 'institute_id')]),
+    'specialty': ('Specialty', {'name': 'row.name'},
+                  [('BELONGS_TO', 'out', 'Department', 'department_id')]),
+    'st_group': ('St_group', {'name': 'row.name'},
+                 [('BELONGS_TO', 'out', 'Specialty', 'speciality_id')]),
+    'course_of_lecture': ('Course_of_lecture', {'name': 'row.name'},
+                          [('IS_TAUGHT_BY', 'out', 'Department', 'department_id'),
+                           ('FOR_SPECIALTY', 'out', 'Specialty', 'specialty_id')]),
+    'lecture': ('Lecture', {'name': 'row.name'},
+                [('PART_OF', 'out', 'Course_of_lecture', 'course_of_lecture_id')]),
+    'material_of_lecture': ('Material_of_lecture', {'name': 'row.name'},
+                            [('BELONGS_TO', 'out', 'Lecture', 'course_of_lecture_id')]),
+    'students': ('Student', {'name': 'row.name', 'age': 'row.age', 'mail': 'row.mail'},
+                 [('MEMBER_OF', 'out', 'St_group', 'group_id')]),
+    # date приходит микросекундами от эпохи (MicroTimestamp); day — Date для индекса schedule_day_range
+    'schedule': ('Schedule', {'date': 'row.date',
+                              'day': 'date(datetime({epochMillis: row.date / 1000}))'},
+                 [('FOR_GROUP', 'out', 'St_group', 'group_id'),
+                  ('SCHEDULED_AT', 'in', 'Lecture', 'lecture_id')]),
+}
+TOPICS = [TOPIC_PREFIX + table for table in GRAPH]
+
+# Настройка логирования
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s %(levelname)s [%(name)s] %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+logger = logging.getLogger('kafka_neo4j_sink')
+
+
+def _upsert_statement(label, props, relations):
+    """
+    Один статический UNWIND-запрос на пакет upsert'ов таблицы: MERGE узла,
+    SET свойств, перевешивание связей на актуальных родителей (как ветка 'u'
+    шаблона apoc.do.case). Текст не зависит от данных, план кэшируется.
+    """
+    lines = [
+        'UNWIND $rows AS row',
+        f'MERGE (n:{label} {{id: row.id}})',
+        'SET ' + ', '.join(f'n.{prop} = {expr}' for prop, expr in props.items()),
+    ]
+    for i, (rel, direction, parent, column) in enumerate(relations):
+        pattern = f'(n)-[r{i}:{rel}]->(p{i}:{parent})' if direction == 'out' \
+            else f'(n)<-[r{i}:{rel}]-(p{i}:{parent})'
+        merge = f'(n)-[:{rel}]->(p{i})' if direction == 'out' else f'(n)<-[:{rel}]-(p{i})'
+        lines += [
+            'WITH n, row',
+            f'OPTIONAL MATCH {pattern}',
+            f'WHERE row.{column} IS NULL OR p{i}.id <> row.{column}',
+            f'DELETE r{i}',
+            'WITH DISTINCT n, row',
+            'CALL {',
+            '  WITH n, row',
+            f'  WITH n, row WHERE row.{column} IS NOT NULL',
+            f'  MERGE (p{i}:{parent} {{id: row.{column}}})',
+            f'  MERGE {merge}',
+            '}',
+        ]
+    return '\n'.join(lines)
+
+
+def _delete_statement(label):
+    return f'UNWIND $ids AS id MATCH (n:{label} {{id: id}}) DETACH DELETE n'
+
+
+UPSERT_STATEMENTS = {table: _upsert_statement(*spec) for table, spec in GRAPH.items()}
+DELETE_STATEMENTS = {table: _delete_statement(spec[0]) for table, spec in GRAPH.items()}
+
+
+def parse_event(topic, value):
+    """
+    (таблица, id, op, строка) для CDC-события Debezium или None
+    (tombstone, чужой топик, событие без id). op: 'upsert' для c/r/u, 'delete' для d.
+    """
+    if not value:
+        return None
+    payload = value['payload'] if isinstance(value, dict) and 'payload' in value else value
+    table = topic[len(TOPIC_PREFIX):] if topic.startswith(TOPIC_PREFIX) else None
+    if table not in GRAPH:
+        return None
+    op = payload.get('op')
+    data = payload.get('before') if op == 'd' else payload.get('after')
+    if not data or data.get('id') is None:
+        return None
+    return table, data['id'], 'delete' if op == 'd' else 'upsert', data
+
+
+class MicroBatch:
+    """
+    Накопитель событий пакета. По каждому ключу (таблица, id) хранится только
+    последнее событие: Kafka упорядочивает события ключа внутри партиции, поэтому
+    последнее событие и есть итоговое состояние строки, а промежуточные
+    можно не применять.
+    """
+
+    def __init__(self):
+        self.events = {}
+        self.received = 0
+
+    def __len__(self):
+        return len(self.events)
+
+    def add(self, event):
+        table, key, op, data = event
+        self.events[(table, key)] = (op, data)
+        self.received += 1
+
+    def statements(self):
+        """[(запрос, параметры)]: upsert'ы от родителей к детям, затем удаления в обратном порядке."""
+        upserts = {table: [] for table in GRAPH}
+        deletes = {table: [] for table in GRAPH}
+        for (table, key), (op, data) in self.events.items():
+            if op == 'upsert':
+                upserts[table].append(data)
+            else:
+                deletes[table].append(key)
+        plan = [(UPSERT_STATEMENTS[t], {'rows': rows}) for t, rows in upserts.items() if rows]
+        plan += [(DELETE_STATEMENTS[t], {'ids': ids}) for t, ids in reversed(list(deletes.items())) if ids]
+        return plan
+
+
+def apply_batch(driver, batch):
+    """Применяет пакет одной транзакцией Neo4j; возвращает число запросов."""
+    plan = batch.statements()
+
+    def work(tx):
+        for query, params in plan:
+            tx.run(query, params).consume()
+
+    with driver.session() as session:
+        session.execute_write(work)
+    return len(plan)
+
+
+def consume(driver, batch_size=BATCH_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS):
+    """
+    Читает CDC-события и применяет их микропакетами. Offset'ы коммитятся только
+    после успешной транзакции Neo4j: при падении пакет будет прочитан заново,
+    а MERGE/DETACH DELETE идемпотентны.
+    """
+    logger.info(f"Starting Kafka consumer for topics: {TOPICS}, group_id={GROUP_ID}")
+    consumer = KafkaConsumer(
+        *TOPICS,
+        bootstrap_servers=KAFKA_BOOTSTRAP_SERVERS,
+        group_id=GROUP_ID,
+        auto_offset_reset='earliest',
+        enable_auto_commit=False,
+        max_poll_records=batch_size,
+        value_deserializer=lambda m: json.loads(m.decode('utf-8')) if m else None
+    )
+
+    batch, opened = MicroBatch(), None
+    try:
+        while True:
+            records = consumer.poll(timeout_ms=max_wait_ms, max_records=batch_size)
+            for tp, msgs in records.items():
+                for msg in msgs:
+                    event = parse_event(tp.topic, msg.value)
+                    if event:
+                        batch.add(event)
+            if batch.received and opened is None:
+                opened = time.time()
+            if not batch.received:
+                continue
+            if len(batch) < batch_size and (time.time() - opened) * 1000 < max_wait_ms:
+                continue
+            t0 = time.time()
+            statements = apply_batch(driver, batch)
+            consumer.commit()
+            logger.info(f"Applied {batch.received} events ({len(batch)} keys) in {statements} statements, "
+                        f"{(time.time() - t0) * 1000:.0f}ms")
+            batch, opened = MicroBatch(), None
+    finally:
+        consumer.close()
+        logger.info("Kafka consumer closed")
+
+
+def main():
+    logger.info("Starting Neo4j CDC sink")
+    driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+    try:
+        consume(driver)
+    finally:
+        driver.close()
+        logger.info("Neo4j driver closed")
+
+
+if __name__ == '__main__':
+    main()
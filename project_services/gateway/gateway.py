@@ -5,13 +5,23 @@ from flask_jwt_extended import (
 )
 import os
 import requests
+from instrumentation import instrument_app, track
+from tracing import inject, trace_app
 
 app = Flask(__name__)
 app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'super-secret-key')
 jwt = JWTManager(app)
+instrument_app(app, "gateway")
+trace_app(app, "gateway")
 
 HARDCODED_USER = {'username': 'user', 'password': 'user'}
 
+# keep-alive соединения к lab-сервисам, по пулу на воркер (создаётся после fork)
+upstream = requests.Session()
+upstream.mount('http://', requests.adapters.HTTPAdapter(
+    pool_maxsize=int(os.getenv('GUNICORN_THREADS', 4))
+))
+
 @app.route('/auth/login', methods=['POST'])
 def login():
     data = request.get_json(force=True)
@@ -22,11 +32,12 @@ def login():
 
 def forward_request(lab_number):
     base_url = os.getenv(f'LAB{lab_number}_URL')
-    resp = requests.post(
-        f"{base_url}/api/lab{lab_number}/{ 'report' if lab_number == 1 else lab_number == 2 and 'audience_report' or 'group_report' }",
-        json=request.get_json(force=True),
-        headers={'Content-Type': 'application/json'}
-    )
+    with track("upstream", f"lab{lab_number}"):
+        resp = upstream.post(
+            f"{base_url}/api/lab{lab_number}/{ 'report' if lab_number == 1 else lab_number == 2 and 'audience_report' or 'group_report' }",
+            json=request.get_json(force=True),
+            headers=inject({'Content-Type': 'application/json'})
+        )
     return jsonify(resp.json()), resp.status_code
 
 @app.route('/api/lab1/report', methods=['POST'])
@@ -1,32 +1,125 @@
+import heapq
 import random
 import redis
 import psycopg2
 from elasticsearch import Elasticsearch
 from neo4j import GraphDatabase
-from typing import List, Dict, Optional
+from typing import List, Dict, Iterable, Iterator, Optional
+from search_cache import SearchCache
+from instrumentation import track
+from attendance_bitmap import AttendanceBitmaps, BACKENDS
 
 class LectureMaterialSearcher:
+    SEARCH_FIELDS = ["lecture_name^3", "course_name^2", "content", "keywords", "materials"]
+    FUZZINESS = "AUTO"
+
     def __init__(self, es_host: str = "elasticsearch", es_port: int = 9200,
-                 es_user: str = "elastic", es_password: str = "secret"):
-        self.es = Elasticsearch(
+                 es_user: str = "elastic", es_password: str = "secret",
+                 cache: Optional[SearchCache] = None, es: Optional[Elasticsearch] = None):
+        # es — общий клиент воркера (pools.ServicePools); его close() не закрывает
+        self._owns_es = es is None
+        self.es = es if es is not None else Elasticsearch(
             hosts=[f"http://{es_host}:{es_port}"],
             basic_auth=(es_user, es_password),
             verify_certs=False
         )
+        self.cache = cache
 
-    def search(self, query: str) -> List[int]:
-        resp = self.es.search(
-            index="lecture_materials",
-            query={
-                "multi_match": {
-                    "query": query,
-                    "fields": ["lecture_name^3", "course_name^2", "content", "keywords"],
-                    "type": "best_fields",
-                    "fuzziness": "AUTO"
-                }
+    def _query(self, query: str) -> Dict:
+        return {
+            "multi_match": {
+                "query": query,
+                "fields": self.SEARCH_FIELDS,
+                "type": "best_fields",
+                "fuzziness": self.FUZZINESS
             }
-        )
-        return [hit["_source"]["lecture_id"] for hit in resp["hits"]["hits"]]
+        }
+
+    def iter_lecture_ids(self, query: str, page_size: int = 500,
+                         max_hits: Optional[int] = None) -> Iterator[int]:
+        """
+        Все lecture_id, подходящие под запрос, в порядке релевантности.
+        Страницы читаются через point-in-time + search_after; из документа
+        берётся только docvalue lecture_id, _source (с полем content) не передаётся.
+        """
+        with track("elasticsearch", "open_pit"):
+            pit_id = self.es.open_point_in_time(index="lecture_materials", keep_alive="1m")["id"]
+        search_after = None
+        returned = 0
+        try:
+            while True:
+                page = {"search_after": search_after} if search_after is not None else {}
+                with track("elasticsearch", "search_page"):
+                    resp = self.es.search(
+                        query=self._query(query),
+                        pit={"id": pit_id, "keep_alive": "1m"},
+                        sort=[{"_score": "desc"}, {"_shard_doc": "asc"}],
+                        size=page_size,
+                        source=False,
+                        docvalue_fields=["lecture_id"],
+                        track_total_hits=False,
+                        **page
+                    )
+                pit_id = resp.get("pit_id", pit_id)
+                hits = resp["hits"]["hits"]
+                for hit in hits:
+                    yield hit["fields"]["lecture_id"][0]
+                    returned += 1
+                    if max_hits is not None and returned >= max_hits:
+                        return
+                if len(hits) < page_size:
+                    return
+                search_after = hits[-1]["sort"]
+        finally:
+            with track("elasticsearch", "close_pit"):
+                self.es.close_point_in_time(id=pit_id)
+
+    def iter_lecture_id_chunks(self, query: str, chunk_size: int = 1000,
+                               max_hits: Optional[int] = None) -> Iterator[List[int]]:
+        """
+        То же, что iter_lecture_ids, но порциями по chunk_size для AttendanceFinder.
+        С cache ключ тот же, что у search: найденный список отдаётся порциями,
+        а прочитанный из ES кладётся в кэш, когда поток дочитан до конца.
+        """
+        key = None
+        if self.cache is not None:
+            key = self.cache.make_key(query, self.SEARCH_FIELDS, self.FUZZINESS, max_hits)
+            cached = self.cache.get(key)
+            if cached is not None:
+                for i in range(0, len(cached), chunk_size):
+                    yield cached[i:i + chunk_size]
+                return
+        lecture_ids = []
+        chunk = []
+        for lecture_id in self.iter_lecture_ids(query, page_size=min(chunk_size, 10000), max_hits=max_hits):
+            chunk.append(lecture_id)
+            if len(chunk) >= chunk_size:
+                if key is not None:
+                    lecture_ids.extend(chunk)
+                yield chunk
+                chunk = []
+        if chunk:
+            if key is not None:
+                lecture_ids.extend(chunk)
+            yield chunk
+        if key is not None:
+            self.cache.set(key, lecture_ids)
+
+    def search(self, query: str, max_hits: Optional[int] = None) -> List[int]:
+        if self.cache is None:
+            return list(self.iter_lecture_ids(query, max_hits=max_hits))
+        key = self.cache.make_key(query, self.SEARCH_FIELDS, self.FUZZINESS, max_hits)
+        lecture_ids = self.cache.get(key)
+        if lecture_ids is None:
+            lecture_ids = list(self.iter_lecture_ids(query, max_hits=max_hits))
+            self.cache.set(key, lecture_ids)
+        return lecture_ids
+
+    def close(self):
+        if self._owns_es:
+            self.es.close()
+
+ROSTER_SOURCES = ("neo4j", "postgres")
 
 class AttendanceFinder:
     def __init__(
@@ -34,17 +127,78 @@ class AttendanceFinder:
         neo4j_uri: str = 'bolt://neo4j:7687',
         neo4j_user: str = 'neo4j',
         neo4j_password: str = 'strongpassword',
-        pg_dsn: str = "dbname=postgres_db user=postgres_user password=postgres_password host=postgres port=5432"
+        pg_dsn: str = "dbname=postgres_db user=postgres_user password=postgres_password host=postgres port=5432",
+        roster_source: str = "neo4j",
+        driver=None,
+        pg_conn=None,
+        attendance_backend: str = "postgres",
+        bitmaps: Optional[AttendanceBitmaps] = None
     ):
+        # roster_source: "neo4j" — список студентов берётся из графа,
+        # "postgres" — Schedule → Students → Attendance соединяются одним SQL-запросом
+        if roster_source not in ROSTER_SOURCES:
+            raise ValueError(f"roster_source must be one of {ROSTER_SOURCES}, got {roster_source!r}")
+        # attendance_backend: "redis" — счётчики посещаемости по битовым картам
+        # (attendance_bitmap.py) для пути с составом из Neo4j; пока карты не
+        # загружены, и для roster_source="postgres" остаётся Postgres
+        if attendance_backend not in BACKENDS:
+            raise ValueError(f"attendance_backend must be one of {BACKENDS}, got {attendance_backend!r}")
+        self.roster_source = roster_source
+        self.attendance_backend = attendance_backend
+        self.bitmaps = bitmaps
+        # driver / pg_conn можно передать из пулов воркера — тогда close() их не закрывает
+        self._owns_driver = driver is None
+        self._owns_pg_conn = pg_conn is None
         # Neo4j driver
-        self.driver = GraphDatabase.driver(neo4j_uri, auth=(neo4j_user, neo4j_password))
+        self.driver = driver if driver is not None else GraphDatabase.driver(neo4j_uri, auth=(neo4j_user, neo4j_password))
         # Postgres connection
-        self.pg_conn = psycopg2.connect(pg_dsn)
+        self.pg_conn = pg_conn if pg_conn is not None else psycopg2.connect(pg_dsn)
         self.pg_conn.autocommit = True
 
     def close(self):
-        self.driver.close()
-        self.pg_conn.close()
+        if self._owns_driver:
+            self.driver.close()
+        if self._owns_pg_conn:
+            self.pg_conn.close()
+
+    def get_student_info(self, redis_conn, student_ids: List[int]) -> Dict[int, Dict]:
+        """
+        Данные студентов для отчёта за один round trip в Redis (pipeline HGETALL).
+        Студенты, которых нет в Redis, добираются одним запросом в Postgres.
+        Возвращает {student_id: {'name', 'age', 'mail', 'group'}}.
+        """
+        if not student_ids:
+            return {}
+        pipe = redis_conn.pipeline(transaction=False)
+        for sid in student_ids:
+            pipe.hgetall(f"student:{sid}")
+        with track("redis", "student_info"):
+            hashes = pipe.execute()
+        info = {sid: data for sid, data in zip(student_ids, hashes) if data}
+
+        missing = [sid for sid in student_ids if sid not in info]
+        if missing:
+            with self.pg_conn.cursor() as cur, track("postgres", "student_info_fallback"):
+                cur.execute("""
+                    SELECT s.id, s.name, s.age, s.mail, g.name
+                      FROM Students s
+                      LEFT JOIN St_group g ON g.id = s.group_id
+                     WHERE s.id = ANY(%s)
+                """, (missing,))
+                for sid, name, age, mail, group_name in cur.fetchall():
+                    # приводим к строкам, как это возвращает Redis (decode_responses=True)
+                    info[sid] = {'name': name, 'age': None if age is None else str(age),
+                                 'mail': mail, 'group': group_name}
+
+        return {
+            sid: {
+                'name': data.get('name'),
+                'age': data.get('age'),
+                'mail': data.get('mail'),
+                'group': data.get('group')
+            }
+            for sid, data in info.items()
+        }
 
     def find_worst_attendees(
         self,
@@ -56,6 +210,35 @@ class AttendanceFinder:
         return self._compute_attendance(lecture_ids, worst=True, limit=top_n,
                                         start_date=start_date, end_date=end_date)
 
+    def find_worst_attendees_chunked(
+        self,
+        lecture_id_chunks: Iterable[List[int]],
+        top_n: int = 10,
+        start_date: Optional[str] = None,
+        end_date:   Optional[str] = None
+    ) -> List[Dict]:
+        """
+        Вариант find_worst_attendees для потока lecture_id порциями
+        (см. LectureMaterialSearcher.iter_lecture_id_chunks). Порции содержат
+        разные лекции, поэтому счётчики по студентам просто складываются;
+        top-N выбирается через heapq без сортировки всех студентов.
+        """
+        totals: Dict[int, Dict] = {}
+        for chunk in lecture_id_chunks:
+            for rec in self._compute_attendance(chunk, worst=False, limit=None,
+                                                start_date=start_date, end_date=end_date):
+                acc = totals.get(rec["studentId"])
+                if acc is None:
+                    totals[rec["studentId"]] = rec
+                else:
+                    acc["attendedCount"] += rec["attendedCount"]
+                    acc["totalCount"] += rec["totalCount"]
+
+        for rec in totals.values():
+            rec["attendancePercent"] = round(rec["attendedCount"] / rec["totalCount"] * 100, 2)
+        return heapq.nsmallest(top_n, totals.values(),
+                               key=lambda r: (r["attendancePercent"], r["studentId"]))
+
     def get_attendance_summary(
         self,
         lecture_ids: List[int],
@@ -75,6 +258,9 @@ class AttendanceFinder:
     ) -> List[Dict]:
         if not lecture_ids:
             return []
+        if self.roster_source == "postgres":
+            return self._compute_attendance_postgres(lecture_ids, worst, limit,
+                                                     start_date, end_date)
 
         # --- 1) Находим всех студентов, которые должны были присутствовать ---
         cypher = """
@@ -84,7 +270,7 @@ class AttendanceFinder:
         MATCH (st:Student)<-[:HAS_STUDENT]-(g)
         RETURN DISTINCT st.id AS student_id, st.name AS student_name
         """
-        with self.driver.session() as session:
+        with self.driver.session() as session, track("neo4j", "attendance_roster"):
             neo4j_results = session.run(cypher, lecture_ids=lecture_ids)
             students = [rec.data() for rec in neo4j_results]
 
@@ -102,7 +288,7 @@ class AttendanceFinder:
                AND (%s::date IS NULL OR s.date >= %s::date)
                AND (%s::date IS NULL OR s.date <= %s::date)
         """
-        with self.pg_conn.cursor() as cur:
+        with self.pg_conn.cursor() as cur, track("postgres", "attendance_schedules"):
             cur.execute(sql, (
                 lecture_ids,
                 start_date, start_date,
@@ -117,51 +303,113 @@ class AttendanceFinder:
 
         semesters = list({sem for sem in sid2sem.values()})
 
-        # используем partition key semester, но Postgres сам разложит по нужным PARTITION
+        if self.attendance_backend == "redis" and self.bitmaps is not None and self.bitmaps.ready():
+            if worst:
+                stats = self.bitmaps.worst_attendees(student_ids, schedule_ids, limit or len(student_ids))
+            else:
+                stats = [(sid, attended, total, round(attended / total * 100, 2))
+                         for sid, (attended, total) in self.bitmaps.attendance_counts(student_ids, schedule_ids).items()]
+            return self._format_stats(students, stats, worst, limit)
+
+        # используем partition key semester, но Postgres сам разложит по нужным PARTITION.
+        # Процент, сортировка и top-N считаются в Postgres: для худших
+        # посетителей наружу уходит только LIMIT строк.
+        # Дубликаты строк Attendance считаются одним занятием, как в битовых картах.
         stats_sql = """
             SELECT student_id,
                 SUM((attended)::int) AS attended_count,
-                COUNT(*)             AS total_count
-            FROM Attendance
-            WHERE student_id = ANY(%s)
-            AND schedule_id = ANY(%s)
-            AND semester    = ANY(%s)
+                COUNT(*)             AS total_count,
+                round(100.0 * SUM((attended)::int) / COUNT(*), 2)::float8 AS attendance_percent
+            FROM (
+                SELECT student_id, schedule_id, bool_or(attended) AS attended
+                FROM Attendance
+                WHERE student_id = ANY(%s)
+                AND schedule_id = ANY(%s)
+                AND semester    = ANY(%s)
+                GROUP BY student_id, schedule_id
+            ) a
             GROUP BY student_id
         """
-        with self.pg_conn.cursor() as cur:
-            cur.execute(stats_sql, (student_ids, schedule_ids, semesters))
+        params = [student_ids, schedule_ids, semesters]
+        if worst:
+            stats_sql += " ORDER BY attendance_percent, student_id LIMIT %s"
+            params.append(limit or None)
+        with self.pg_conn.cursor() as cur, track("postgres", "attendance_stats"):
+            cur.execute(stats_sql, params)
             stats = cur.fetchall()
 
-        stat_map = {sid: (att, tot) for sid, att, tot in
-                    ((row[0], row[1], row[2]) for row in stats)}
-
-        results = []
-        for s in students:
-            sid = s["student_id"]
-            name = s["student_name"]
-            attended_count, total_count = stat_map.get(sid, (0, 0))
-            if total_count == 0:
-                continue
-
-            pct = round(attended_count / total_count * 100, 2)
-            results.append({
-                "studentId": sid,
-                "studentName": name,
-                "attendedCount": attended_count,
-                "totalCount": total_count,
-                "attendancePercent": pct
-            })
+        return self._format_stats(students, stats, worst, limit)
 
-        if worst:
-            results.sort(key=lambda x: x["attendancePercent"])
-        else:
-            results.sort(key=lambda x: x["studentName"])
+    @staticmethod
+    def _format_stats(students: List[Dict], stats: List[tuple], worst: bool, limit: Optional[int]) -> List[Dict]:
+        names = {s["student_id"]: s["student_name"] for s in students}
+        results = [{
+            "studentId": sid,
+            "studentName": names[sid],
+            "attendedCount": attended_count,
+            "totalCount": total_count,
+            "attendancePercent": pct
+        } for sid, attended_count, total_count, pct in stats]
 
-        if limit:
-            results = results[:limit]
+        if not worst:
+            results.sort(key=lambda x: x["studentName"])
+            if limit:
+                results = results[:limit]
 
         return results
 
+    def _compute_attendance_postgres(
+        self,
+        lecture_ids: List[int],
+        worst: bool,
+        limit: Optional[int],
+        start_date: Optional[str],
+        end_date: Optional[str]
+    ) -> List[Dict]:
+        # Schedule, Students и Attendance живут в Postgres: состав групп берём
+        # соединением по group_id, без похода в Neo4j и без массива student_id.
+        # Дубликаты строк Attendance считаются одним занятием, как в битовых картах.
+        sql = """
+            SELECT st.id,
+                   st.name,
+                   SUM((st.attended)::int) AS attended_count,
+                   COUNT(*)                AS total_count,
+                   round(100.0 * SUM((st.attended)::int) / COUNT(*), 2)::float8 AS attendance_percent
+              FROM (
+                SELECT st.id, st.name, s.id AS schedule_id, bool_or(a.attended) AS attended
+                  FROM Schedule s
+                  JOIN Students st  ON st.group_id = s.group_id
+                  JOIN Attendance a ON a.student_id  = st.id
+                                   AND a.schedule_id = s.id
+                                   AND a.semester    = s.semester
+                 WHERE s.lecture_id = ANY(%s)
+                   AND (%s::date IS NULL OR s.date >= %s::date)
+                   AND (%s::date IS NULL OR s.date <= %s::date)
+                 GROUP BY st.id, st.name, s.id
+              ) st
+             GROUP BY st.id, st.name
+        """
+        if worst:
+            sql += " ORDER BY attendance_percent, st.id LIMIT %s"
+        else:
+            sql += " ORDER BY st.name LIMIT %s"
+        with self.pg_conn.cursor() as cur, track("postgres", "attendance_report"):
+            cur.execute(sql, (
+                lecture_ids,
+                start_date, start_date,
+                end_date,   end_date,
+                limit or None
+            ))
+            rows = cur.fetchall()
+
+        return [{
+            "studentId": sid,
+            "studentName": name,
+            "attendedCount": attended_count,
+            "totalCount": total_count,
+            "attendancePercent": pct
+        } for sid, name, attended_count, total_count, pct in rows]
+
 if __name__ == '__main__':
     term = "физика"
     searcher = LectureMaterialSearcher(es_password="secret")
@@ -181,8 +429,9 @@ if __name__ == '__main__':
             end_date=end
         )
         print("\n10 студентов с худшей посещаемостью:")
+        worst_info = finder.get_student_info(r, [rec['studentId'] for rec in worst])
         for idx, rec in enumerate(worst, 1):
-            info = r.hgetall(f"student:{rec['studentId']}")
+            info = worst_info.get(rec['studentId'], {})
             info_str = f"[Redis] Name: {info.get('name')}, Age: {info.get('age')}, Mail: {info.get('mail')}, Group: {info.get('group')}"
             print(f"{idx}. {rec['studentName']} — {rec['attendancePercent']}% ({rec['attendedCount']}/{rec['totalCount']}) {info_str}")
 
@@ -192,8 +441,9 @@ if __name__ == '__main__':
             end_date=end
         )
         print("\nСводка посещаемости всех студентов:")
+        summary_info = finder.get_student_info(r, [rec['studentId'] for rec in summary])
         for rec in summary:
-            info = r.hgetall(f"student:{rec['studentId']}")
+            info = summary_info.get(rec['studentId'], {})
             info_str = f"[Redis] Name: {info.get('name')}, Age: {info.get('age')}, Mail: {info.get('mail')}, Group: {info.get('group')}"
             print(f"{rec['studentName']}: {rec['attendancePercent']}% ({rec['attendedCount']}/{rec['totalCount']}) {info_str}")
 
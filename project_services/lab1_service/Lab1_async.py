@@ -0,0 +1,239 @@
+import asyncio
+import heapq
+from datetime import date
+from typing import Dict, List, Optional
+
+from elasticsearch import AsyncElasticsearch
+
+from Lab1 import LectureMaterialSearcher
+from search_cache import SearchCache
+from instrumentation import track
+from tracing import start_span
+
+
+def _to_date(value: Optional[str]) -> Optional[date]:
+    return date.fromisoformat(value) if value else None
+
+
+class AsyncLectureMaterialSearcher:
+    """Асинхронный аналог LectureMaterialSearcher (тот же запрос, PIT + search_after)."""
+    SEARCH_FIELDS = LectureMaterialSearcher.SEARCH_FIELDS
+    FUZZINESS = LectureMaterialSearcher.FUZZINESS
+    _query = LectureMaterialSearcher._query
+
+    def __init__(self, es: AsyncElasticsearch, cache: Optional[SearchCache] = None):
+        self.es = es
+        self.cache = cache
+
+    async def _fetch_lecture_ids(self, query: str, page_size: int,
+                                 max_hits: Optional[int]) -> List[int]:
+        with track("elasticsearch", "open_pit"):
+            pit_id = (await self.es.open_point_in_time(index="lecture_materials", keep_alive="1m"))["id"]
+        lecture_ids: List[int] = []
+        search_after = None
+        try:
+            while True:
+                page = {"search_after": search_after} if search_after is not None else {}
+                with track("elasticsearch", "search_page"):
+                    resp = await self.es.search(
+                        query=self._query(query),
+                        pit={"id": pit_id, "keep_alive": "1m"},
+                        sort=[{"_score": "desc"}, {"_shard_doc": "asc"}],
+                        size=page_size,
+                        source=False,
+                        docvalue_fields=["lecture_id"],
+                        track_total_hits=False,
+                        **page
+                    )
+                pit_id = resp.get("pit_id", pit_id)
+                hits = resp["hits"]["hits"]
+                lecture_ids.extend(hit["fields"]["lecture_id"][0] for hit in hits)
+                if max_hits is not None and len(lecture_ids) >= max_hits:
+                    return lecture_ids[:max_hits]
+                if len(hits) < page_size:
+                    return lecture_ids
+                search_after = hits[-1]["sort"]
+        finally:
+            with track("elasticsearch", "close_pit"):
+                await self.es.close_point_in_time(id=pit_id)
+
+    async def search(self, query: str, max_hits: Optional[int] = None,
+                     page_size: int = 500) -> List[int]:
+        if self.cache is None:
+            return await self._fetch_lecture_ids(query, page_size, max_hits)
+        key = self.cache.make_key(query, self.SEARCH_FIELDS, self.FUZZINESS, max_hits)
+        lecture_ids = self.cache.get(key)
+        if lecture_ids is None:
+            lecture_ids = await self._fetch_lecture_ids(query, page_size, max_hits)
+            self.cache.set(key, lecture_ids)
+        return lecture_ids
+
+
+class AsyncAttendanceFinder:
+    """
+    Асинхронный аналог AttendanceFinder. Этапы вынесены в отдельные методы,
+    чтобы вызывающий код мог запускать независимые из них параллельно.
+    Клиенты (neo4j AsyncDriver, asyncpg.Pool, redis.asyncio.Redis) принадлежат
+    приложению и здесь не закрываются.
+    """
+
+    def __init__(self, neo4j_driver, pg_pool, redis_conn):
+        self.driver = neo4j_driver
+        self.pg_pool = pg_pool
+        self.redis = redis_conn
+
+    async def get_roster(self, lecture_ids: List[int]) -> List[Dict]:
+        cypher = """
+        UNWIND $lecture_ids AS lid
+        MATCH (l:Lecture {id: lid})-[:SCHEDULED_AT]->(e:Schedule)
+        MATCH (g:Group)<-[:FOR_GROUP]-(e)
+        MATCH (st:Student)<-[:HAS_STUDENT]-(g)
+        RETURN DISTINCT st.id AS student_id, st.name AS student_name
+        """
+        async with self.driver.session() as session:
+            with track("neo4j", "attendance_roster"):
+                result = await session.run(cypher, lecture_ids=lecture_ids)
+                return [rec.data() async for rec in result]
+
+    async def get_schedules(self, lecture_ids: List[int], start_date: Optional[str],
+                            end_date: Optional[str]) -> Dict[int, str]:
+        with track("postgres", "attendance_schedules"):
+            rows = await self.pg_pool.fetch(
+                """
+                SELECT s.id, s.semester
+                  FROM Schedule s
+                 WHERE s.lecture_id = ANY($1::int[])
+                   AND ($2::date IS NULL OR s.date >= $2::date)
+                   AND ($3::date IS NULL OR s.date <= $3::date)
+                """,
+                lecture_ids, _to_date(start_date), _to_date(end_date)
+            )
+        return {row[0]: row[1] for row in rows}
+
+    async def get_worst_stats(self, student_ids: List[int], schedule_ids: List[int],
+                              semesters: List[str], top_n: int) -> List[tuple]:
+        with track("postgres", "attendance_stats"):
+            return await self.pg_pool.fetch(
+                """
+                SELECT student_id,
+                    SUM((attended)::int) AS attended_count,
+                    COUNT(*)             AS total_count,
+                    round(100.0 * SUM((attended)::int) / COUNT(*), 2)::float8 AS attendance_percent
+                FROM (
+                    -- дубликаты строк Attendance — одно занятие, как в битовых картах
+                    SELECT student_id, schedule_id, bool_or(attended) AS attended
+                    FROM Attendance
+                    WHERE student_id = ANY($1::int[])
+                    AND schedule_id = ANY($2::int[])
+                    AND semester    = ANY($3::text[])
+                    GROUP BY student_id, schedule_id
+                ) a
+                GROUP BY student_id
+                ORDER BY attendance_percent, student_id
+                LIMIT $4
+                """,
+                student_ids, schedule_ids, semesters, top_n
+            )
+
+    async def get_chunk_stats(self, lecture_ids: List[int], start_date: Optional[str],
+                              end_date: Optional[str]):
+        """Состав и счётчики [(student_id, посещено, всего)] одной порции лекций, без LIMIT."""
+        students, sid2sem = await asyncio.gather(
+            self.get_roster(lecture_ids),
+            self.get_schedules(lecture_ids, start_date, end_date)
+        )
+        if not students or not sid2sem:
+            return students, []
+        with track("postgres", "attendance_stats"):
+            rows = await self.pg_pool.fetch(
+                """
+                SELECT student_id,
+                    SUM((attended)::int) AS attended_count,
+                    COUNT(*)             AS total_count
+                FROM (
+                    SELECT student_id, schedule_id, bool_or(attended) AS attended
+                    FROM Attendance
+                    WHERE student_id = ANY($1::int[])
+                    AND schedule_id = ANY($2::int[])
+                    AND semester    = ANY($3::text[])
+                    GROUP BY student_id, schedule_id
+                ) a
+                GROUP BY student_id
+                """,
+                [s['student_id'] for s in students], list(sid2sem), list(set(sid2sem.values()))
+            )
+        return students, rows
+
+    async def get_worst_stats_chunked(self, lecture_id_chunks: List[List[int]], start_date: Optional[str],
+                                      end_date: Optional[str], top_n: int):
+        """
+        Как AttendanceFinder.find_worst_attendees_chunked: порции лекций считаются
+        параллельно, счётчики по студентам складываются, top-N — через heapq.
+        Возвращает (состав, [(student_id, посещено, всего, процент)]).
+        """
+        tasks = [asyncio.ensure_future(self.get_chunk_stats(chunk, start_date, end_date))
+                 for chunk in lecture_id_chunks]
+        try:
+            results = await asyncio.gather(*tasks)
+        finally:
+            # при ошибке одной порции остальные запросы не продолжают работать впустую
+            for task in tasks:
+                task.cancel()
+        students, totals = {}, {}
+        for chunk_students, rows in results:
+            for student in chunk_students:
+                students[student['student_id']] = student
+            for sid, attended, total in rows:
+                acc_attended, acc_total = totals.get(sid, (0, 0))
+                totals[sid] = (acc_attended + attended, acc_total + total)
+        stats = [(sid, attended, total, round(attended / total * 100, 2))
+                 for sid, (attended, total) in totals.items()]
+        return list(students.values()), heapq.nsmallest(top_n, stats, key=lambda row: (row[3], row[0]))
+
+    async def get_student_info(self, student_ids: List[int]) -> Dict[int, Dict]:
+        """Как AttendanceFinder.get_student_info: один pipeline в Redis + добор из Postgres."""
+        if not student_ids:
+            return {}
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for sid in student_ids:
+                pipe.hgetall(f"student:{sid}")
+            with track("redis", "student_info"):
+                hashes = await pipe.execute()
+        info = {sid: data for sid, data in zip(student_ids, hashes) if data}
+
+        missing = [sid for sid in student_ids if sid not in info]
+        if missing:
+            with track("postgres", "student_info_fallback"):
+                rows = await self.pg_pool.fetch(
+                    """
+                    SELECT s.id, s.name, s.age, s.mail, g.name
+                      FROM Students s
+                      LEFT JOIN St_group g ON g.id = s.group_id
+                     WHERE s.id = ANY($1::int[])
+                    """,
+                    missing
+                )
+            for sid, name, age, mail, group_name in rows:
+                info[sid] = {'name': name, 'age': None if age is None else str(age),
+                             'mail': mail, 'group': group_name}
+
+        return {
+            sid: {
+                'name': data.get('name'),
+                'age': data.get('age'),
+                'mail': data.get('mail'),
+                'group': data.get('group')
+            }
+            for sid, data in info.items()
+        }
+
+
+async def timed(timings: Dict[str, float], stage: str, coro):
+    """Выполняет корутину в span этапа и записывает его длительность в timings (мс)."""
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    try:
+        with start_span(stage):
+            return await coro
+    finally:
+        timings[stage] = round((loop.time() - started) * 1000, 2)
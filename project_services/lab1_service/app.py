@@ -1,9 +1,16 @@
 from flask import Flask, request, jsonify
 from Lab1 import LectureMaterialSearcher, AttendanceFinder 
-import redis
+from attendance_bitmap import AttendanceBitmaps
+from search_cache import SearchCache
+from instrumentation import instrument_app
+from tracing import trace_app
+from pools import ServicePools
+import itertools
 import os
 
 app = Flask(__name__)
+instrument_app(app, "lab1")
+trace_app(app, "lab1")
 
 
 NEO4J_URI = os.getenv("NEO4J_URI", "bolt://neo4j:7687")
@@ -15,6 +22,12 @@ ES_USER = os.getenv("ES_USER", "elastic")
 ES_PASS = os.getenv("ES_PASS", "secret")
 REDIS_HOST = os.getenv("REDIS_HOST", "redis")
 REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
+ROSTER_SOURCE = os.getenv("ATTENDANCE_ROSTER_SOURCE", "neo4j")
+ATTENDANCE_BACKEND = os.getenv("ATTENDANCE_BACKEND", "postgres")
+ES_MAX_LECTURES = int(os.getenv("ES_MAX_LECTURES", 10000))
+LECTURE_CHUNK_SIZE = int(os.getenv("LECTURE_CHUNK_SIZE", 1000))
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", 256))
+SEARCH_CACHE_REDIS = os.getenv("SEARCH_CACHE_REDIS", "1") == "1"
 PG_CONFIG = {
     'dbname': os.getenv("POSTGRES_DB", "postgres_db"),
     'user': os.getenv("POSTGRES_USER", "postgres_user"),
@@ -23,6 +36,43 @@ PG_CONFIG = {
     'port': os.getenv("POSTGRES_PORT", 5432),
 }
 
+# Пулы открываются в воркере (gunicorn.conf.py: post_worker_init) или при первом запросе
+pools = ServicePools(
+    pg_config=PG_CONFIG,
+    neo4j_uri=NEO4J_URI,
+    neo4j_auth=(NEO4J_USER, NEO4J_PASSWORD),
+    redis_host=REDIS_HOST,
+    redis_port=REDIS_PORT,
+    es_config={
+        'hosts': [f"http://{ES_HOST}:{ES_PORT}"],
+        'basic_auth': (ES_USER, ES_PASS),
+        'verify_certs': False
+    }
+)
+
+# Поколение индекса читается из Redis всегда; SEARCH_CACHE_REDIS включает общий второй уровень
+search_cache = SearchCache(
+    max_entries=SEARCH_CACHE_SIZE,
+    redis=pools.redis,
+    redis_values=SEARCH_CACHE_REDIS
+)
+
+
+def _capped_chunks(chunks, limit, lectures):
+    """
+    Порции lecture_id не длиннее limit в сумме; lectures['found'] и
+    lectures['truncated'] заполняются по мере чтения. Лишние id дочитываются
+    и отбрасываются, чтобы поиск дошёл до конца и попал в кэш.
+    """
+    for chunk in chunks:
+        room = limit - lectures['found']
+        if len(chunk) > room:
+            chunk = chunk[:room]
+            lectures['truncated'] = True
+        if chunk:
+            lectures['found'] += len(chunk)
+            yield chunk
+
 
 @app.route('/api/lab1/report', methods=['POST'])
 def generate_attendance_report():
@@ -38,29 +88,53 @@ def generate_attendance_report():
             'received': list(data.keys())
         }), 400
 
-    es_searcher = LectureMaterialSearcher(
-        es_host=ES_HOST,
-        es_port=ES_PORT,
-        es_user=ES_USER,
-        es_password=ES_PASS
-    )
-    lecture_ids = es_searcher.search(data['term'])
-    if not lecture_ids:
+    es_searcher = LectureMaterialSearcher(cache=search_cache, es=pools.es)
+    # Порции из ES идут в AttendanceFinder по мере чтения, без полного списка id.
+    # Один id сверх ES_MAX_LECTURES показывает, что совпадений больше лимита.
+    id_chunks = es_searcher.iter_lecture_id_chunks(data['term'], chunk_size=LECTURE_CHUNK_SIZE,
+                                                   max_hits=ES_MAX_LECTURES + 1)
+    lectures = {'found': 0, 'truncated': False}
+    chunks = _capped_chunks(id_chunks, ES_MAX_LECTURES, lectures)
+    try:
+        first_chunk = next(chunks, None)
+    except Exception:
+        id_chunks.close()
+        es_searcher.close()
+        raise
+    if first_chunk is None:
+        id_chunks.close()
+        es_searcher.close()
         return jsonify({'error': 'No lectures found for the term'}), 404
 
-    finder = AttendanceFinder()
-    redis_conn = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+    pg_conn = pools.getconn()
+    redis_conn = pools.redis()
+    finder = AttendanceFinder(roster_source=ROSTER_SOURCE, driver=pools.neo4j, pg_conn=pg_conn,
+                              attendance_backend=ATTENDANCE_BACKEND, bitmaps=AttendanceBitmaps(redis_conn))
 
     try:
-        worst = finder.find_worst_attendees(
-            lecture_ids,
-            top_n=10,
-            start_date=data['start_date'],
-            end_date=data['end_date']
-        )
+        if len(first_chunk) < LECTURE_CHUNK_SIZE:
+            # неполная порция — последняя: всё решает один запрос с LIMIT;
+            # поток дочитывается, чтобы закрыть PIT и положить поиск в кэш
+            for _ in chunks:
+                pass
+            worst = finder.find_worst_attendees(
+                first_chunk,
+                top_n=10,
+                start_date=data['start_date'],
+                end_date=data['end_date']
+            )
+        else:
+            worst = finder.find_worst_attendees_chunked(
+                itertools.chain([first_chunk], chunks),
+                top_n=10,
+                start_date=data['start_date'],
+                end_date=data['end_date']
+            )
+
+        student_info = finder.get_student_info(redis_conn, [r['studentId'] for r in worst])
 
         def format_student(record):
-            redis_info = redis_conn.hgetall(f"student:{record['studentId']}")
+            redis_info = student_info.get(record['studentId'], {})
             return {
                 **record,
                 'redis_info': {
@@ -74,10 +148,13 @@ def generate_attendance_report():
         report = {
             'search_term': data['term'],
             'period': f"{data['start_date']} - {data['end_date']}",
-            'found_lectures': len(lecture_ids),
+            'found_lectures': lectures['found'],
             'worst_attendees': [format_student(r) for r in worst]
         }
-        return jsonify(report=report, meta={'status': 'success', 'results': len(worst)}), 200
+        return jsonify(report=report, meta={
+            'status': 'success', 'results': len(worst),
+            'lectures_truncated': lectures['truncated'], 'max_lectures': ES_MAX_LECTURES
+        }), 200
 
     except Exception as e:
         app.logger.error(f"Error: {e}")
@@ -85,7 +162,10 @@ def generate_attendance_report():
 
     finally:
         finder.close()
+        id_chunks.close()
+        es_searcher.close()
         redis_conn.close()
+        pools.putconn(pg_conn)
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5001)
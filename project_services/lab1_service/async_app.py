@@ -0,0 +1,189 @@
+import asyncio
+import os
+
+import asyncpg
+import redis.asyncio as aioredis
+from elasticsearch import AsyncElasticsearch
+from neo4j import AsyncGraphDatabase
+from quart import Quart, request, jsonify
+
+from Lab1_async import AsyncLectureMaterialSearcher, AsyncAttendanceFinder, timed
+from search_cache import GENERATION_KEY, SearchCache
+from instrumentation import instrument_quart_app, start_snapshots
+from tracing import trace_quart_app
+
+app = Quart(__name__)
+instrument_quart_app(app, "lab1")
+trace_quart_app(app, "lab1")
+
+
+NEO4J_URI = os.getenv("NEO4J_URI", "bolt://neo4j:7687")
+NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
+NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "strongpassword")
+ES_HOST = os.getenv("ES_HOST", "elasticsearch")
+ES_PORT = int(os.getenv("ES_PORT", 9200))
+ES_USER = os.getenv("ES_USER", "elastic")
+ES_PASS = os.getenv("ES_PASS", "secret")
+REDIS_HOST = os.getenv("REDIS_HOST", "redis")
+REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
+ES_MAX_LECTURES = int(os.getenv("ES_MAX_LECTURES", 10000))
+LECTURE_CHUNK_SIZE = int(os.getenv("LECTURE_CHUNK_SIZE", 1000))
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", 256))
+# Redis-данные для всего состава загружаются параллельно с подсчётом статистики,
+# если студентов не больше этого порога; иначе — только для top-N после подсчёта.
+ENRICH_PREFETCH_LIMIT = int(os.getenv("ENRICH_PREFETCH_LIMIT", 500))
+PG_POOL_MIN = int(os.getenv("PG_POOL_MIN", 1))
+PG_POOL_MAX = int(os.getenv("PG_POOL_MAX", 10))
+PG_CONFIG = {
+    'database': os.getenv("POSTGRES_DB", "postgres_db"),
+    'user': os.getenv("POSTGRES_USER", "postgres_user"),
+    'password': os.getenv("POSTGRES_PASSWORD", "postgres_password"),
+    'host': os.getenv("POSTGRES_HOST", "postgres"),
+    'port': int(os.getenv("POSTGRES_PORT", 5432)),
+}
+
+# Async-вариант берёт состав только из Neo4j, а посещаемость — только из Postgres:
+# остальные режимы app.py здесь не реализованы, поэтому не стартуем молча без них
+ROSTER_SOURCE = os.getenv("ATTENDANCE_ROSTER_SOURCE", "neo4j")
+ATTENDANCE_BACKEND = os.getenv("ATTENDANCE_BACKEND", "postgres")
+if ROSTER_SOURCE != "neo4j" or ATTENDANCE_BACKEND != "postgres":
+    raise RuntimeError(
+        f"async_app supports only ATTENDANCE_ROSTER_SOURCE=neo4j and ATTENDANCE_BACKEND=postgres "
+        f"(got {ROSTER_SOURCE!r}, {ATTENDANCE_BACKEND!r}); serve app:app with gunicorn for the other modes"
+    )
+
+clients = {}
+
+
+async def watch_search_generation(cache, r):
+    """Поколение индекса для SearchCache: redis.asyncio опрашивается здесь, а не в make_key."""
+    while True:
+        try:
+            cache.update_generation(int(await r.get(GENERATION_KEY) or 0))
+        except Exception as e:
+            app.logger.warning(f"Could not read {GENERATION_KEY}: {e}")
+        await asyncio.sleep(cache.generation_check_interval)
+
+
+@app.before_serving
+async def open_clients():
+    clients['es'] = AsyncElasticsearch(
+        hosts=[f"http://{ES_HOST}:{ES_PORT}"],
+        basic_auth=(ES_USER, ES_PASS),
+        verify_certs=False
+    )
+    clients['neo4j'] = AsyncGraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+    clients['pg'] = await asyncpg.create_pool(min_size=PG_POOL_MIN, max_size=PG_POOL_MAX, **PG_CONFIG)
+    clients['redis'] = aioredis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+    clients['search_cache'] = SearchCache(max_entries=SEARCH_CACHE_SIZE)
+    clients['generation_watch'] = asyncio.create_task(
+        watch_search_generation(clients['search_cache'], clients['redis']))
+    start_snapshots()
+
+
+@app.after_serving
+async def close_clients():
+    clients['generation_watch'].cancel()
+    await clients['es'].close()
+    await clients['neo4j'].close()
+    await clients['pg'].close()
+    await clients['redis'].aclose()
+
+
+@app.route('/api/lab1/report', methods=['POST'])
+async def generate_attendance_report():
+
+    if not request.is_json:
+        return jsonify({'error': 'Request must be JSON'}), 400
+
+    data = await request.get_json()
+    required_fields = ['term', 'start_date', 'end_date']
+    if not all(field in data for field in required_fields):
+        return jsonify({
+            'error': f"Missing required fields: {required_fields}",
+            'received': list(data.keys())
+        }), 400
+
+    searcher = AsyncLectureMaterialSearcher(clients['es'], cache=clients['search_cache'])
+    finder = AsyncAttendanceFinder(clients['neo4j'], clients['pg'], clients['redis'])
+    timings = {}
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+
+    try:
+        # один id сверх ES_MAX_LECTURES показывает, что совпадений больше лимита
+        lecture_ids = await timed(timings, 'es_search',
+                                  searcher.search(data['term'], max_hits=ES_MAX_LECTURES + 1))
+        truncated = len(lecture_ids) > ES_MAX_LECTURES
+        lecture_ids = lecture_ids[:ES_MAX_LECTURES]
+        if not lecture_ids:
+            return jsonify({'error': 'No lectures found for the term'}), 404
+
+        if len(lecture_ids) > LECTURE_CHUNK_SIZE:
+            # как в app.py: в запросы уходит не больше LECTURE_CHUNK_SIZE лекций за раз
+            students, stats = await timed(timings, 'chunked_stats', finder.get_worst_stats_chunked(
+                [lecture_ids[i:i + LECTURE_CHUNK_SIZE] for i in range(0, len(lecture_ids), LECTURE_CHUNK_SIZE)],
+                data['start_date'], data['end_date'], 10))
+            student_info = await timed(timings, 'redis_enrich',
+                                       finder.get_student_info([row[0] for row in stats]))
+        else:
+            # Состав групп (Neo4j) и расписания (Postgres) друг от друга не зависят
+            students, sid2sem = await asyncio.gather(
+                timed(timings, 'neo4j_roster', finder.get_roster(lecture_ids)),
+                timed(timings, 'pg_schedules',
+                      finder.get_schedules(lecture_ids, data['start_date'], data['end_date']))
+            )
+            stats, student_info = [], {}
+            if students and sid2sem:
+                student_ids = [s['student_id'] for s in students]
+                enrich_task = None
+                try:
+                    if len(student_ids) <= ENRICH_PREFETCH_LIMIT:
+                        enrich_task = asyncio.create_task(
+                            timed(timings, 'redis_enrich', finder.get_student_info(student_ids)))
+
+                    stats = await timed(timings, 'pg_stats', finder.get_worst_stats(
+                        student_ids, list(sid2sem), list(set(sid2sem.values())), 10))
+
+                    if enrich_task is not None:
+                        student_info = await enrich_task
+                    else:
+                        student_info = await timed(timings, 'redis_enrich',
+                                                   finder.get_student_info([row[0] for row in stats]))
+                finally:
+                    # ошибка в pg_stats не должна оставить prefetch работать без хозяина
+                    if enrich_task is not None:
+                        enrich_task.cancel()
+
+        worst = []
+        if stats:
+            names = {s['student_id']: s['student_name'] for s in students}
+            worst = [{
+                'studentId': sid,
+                'studentName': names[sid],
+                'attendedCount': attended_count,
+                'totalCount': total_count,
+                'attendancePercent': pct,
+                'redis_info': student_info.get(sid, {
+                    'name': None, 'age': None, 'mail': None, 'group': None
+                })
+            } for sid, attended_count, total_count, pct in stats]
+
+        timings['total'] = round((loop.time() - started) * 1000, 2)
+        report = {
+            'search_term': data['term'],
+            'period': f"{data['start_date']} - {data['end_date']}",
+            'found_lectures': len(lecture_ids),
+            'worst_attendees': worst
+        }
+        return jsonify(report=report, meta={
+            'status': 'success', 'results': len(worst), 'timings_ms': timings,
+            'lectures_truncated': truncated, 'max_lectures': ES_MAX_LECTURES
+        }), 200
+
+    except Exception as e:
+        app.logger.error(f"Error: {e}")
+        return jsonify({'error': 'Data processing failed'}), 500
+
+if __name__ == '__main__':
+    app.run(host='0.0.0.0', port=5001)
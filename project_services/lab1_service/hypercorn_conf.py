@@ -0,0 +1,26 @@
+"""
+Настройки hypercorn для async-варианта lab1:
+`hypercorn --config file:hypercorn_conf.py async_app:app`.
+
+Пулы (asyncpg, neo4j, redis.asyncio, AsyncElasticsearch) создаются в
+before_serving каждого воркера и закрываются в after_serving после того,
+как hypercorn дождётся текущих запросов (graceful_timeout).
+
+Метрики воркеров суммируются через METRICS_MULTIPROC_DIR, как под gunicorn
+(см. instrumentation.py); конфиг читается один раз в мастере, там же
+удаляются снимки прошлого запуска.
+"""
+import glob
+import multiprocessing
+import os
+
+os.environ.setdefault("METRICS_MULTIPROC_DIR", "/tmp/metrics/lab1-async")
+for _path in glob.glob(os.path.join(os.environ["METRICS_MULTIPROC_DIR"], "*.json*")):
+    os.remove(_path)
+
+bind = [f"0.0.0.0:{os.getenv('PORT', '5001')}"]
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "asyncio"
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keep_alive_timeout = int(os.getenv("GUNICORN_KEEPALIVE", 5))
+accesslog = "-"
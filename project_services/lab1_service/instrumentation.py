@@ -0,0 +1,330 @@
+"""
+Метрики латентности для сервисов (gateway, lab1-3) в текстовом формате Prometheus.
+
+Одинаковая копия модуля лежит в каталоге каждого сервиса (как neo4j_sync.py
+у lab2/lab3), так как образы собираются из своего каталога.
+
+    with track("postgres", "attendance_stats"):
+        cur.execute(...)
+
+    instrument_app(app, "lab1")   # HTTP-метрики + GET /metrics
+
+METRICS_SAMPLE_RATE (0..1) задаёт долю вызовов, попадающих в гистограммы;
+счётчики и in-flight считаются всегда.
+
+Под gunicorn у каждого воркера свой реестр, а /metrics отвечает тот воркер,
+которому достался запрос. Поэтому gunicorn.conf.py задаёт METRICS_MULTIPROC_DIR.
+Каждый воркер раз в METRICS_SNAPSHOT_INTERVAL_S записывает снимок реестра
+в файл <pid>.json этого каталога, и /metrics суммирует снимки всех воркеров.
+Отвечающий воркер перед сводкой записывает свой снимок заново.
+Снимки завершившихся воркеров остаются, чтобы счётчики и гистограммы
+не убывали; у них мастер обнуляет только gauge (mark_process_dead).
+Без METRICS_MULTIPROC_DIR (python app.py) отдаётся реестр процесса.
+"""
+import glob
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+import tracing
+
+SAMPLE_RATE = float(os.getenv("METRICS_SAMPLE_RATE", "1.0"))
+MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR")
+SNAPSHOT_INTERVAL_S = float(os.getenv("METRICS_SNAPSHOT_INTERVAL_S", "1.0"))
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def snapshot(self):
+        """[[метки, значение]] — для файла снимка воркера."""
+        with self._lock:
+            return [[list(labels), value] for labels, value in self._values.items()]
+
+    @staticmethod
+    def merge(total, value):
+        return value if total is None else total + value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, labels=(), amount=1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self, items=None):
+        if items is None:
+            with self._lock:
+                items = list(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {value}" for labels, value in items
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, labels=(), amount=1.0):
+        self.inc(labels, -amount)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, labels=()):
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(labels), [list(s[0]), s[1], s[2]]] for labels, s in self._values.items()]
+
+    @staticmethod
+    def merge(total, value):
+        if total is None:
+            return [list(value[0]), value[1], value[2]]
+        return [[a + b for a, b in zip(total[0], value[0])], total[1] + value[1], total[2] + value[2]]
+
+    def render(self, items=None):
+        if items is None:
+            with self._lock:
+                items = [(labels, (list(s[0]), s[1], s[2])) for labels, s in self._values.items()]
+        lines = self.header()
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, ('le', bound))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, ('le', '+Inf'))} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+CALL_LATENCY = Histogram("backend_call_duration_seconds",
+                         "Latency of calls to ES/Neo4j/Postgres/Redis/upstream services",
+                         ("backend", "operation"))
+CALLS = Counter("backend_calls_total", "Calls to backends by outcome",
+                ("backend", "operation", "status"))
+CALLS_IN_FLIGHT = Gauge("backend_calls_in_flight", "Backend calls currently running", ("backend",))
+HTTP_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency",
+                         ("service", "endpoint", "method"))
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests by status code",
+                        ("service", "endpoint", "method", "status"))
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests currently being served", ("service",))
+
+REGISTRY = [CALL_LATENCY, CALLS, CALLS_IN_FLIGHT, HTTP_LATENCY, HTTP_REQUESTS, HTTP_IN_FLIGHT]
+
+
+def _sampled():
+    return SAMPLE_RATE >= 1.0 or random.random() < SAMPLE_RATE
+
+
+@contextmanager
+def track(backend, operation):
+    """Замеряет вызов внешней системы: гистограмма, счётчик по статусу, in-flight и дочерний span."""
+    CALLS_IN_FLIGHT.inc((backend,))
+    span, token = tracing.begin_span(f"{backend}.{operation}", "client",
+                                     {"backend": backend, "operation": operation})
+    status = "ok"
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException as exc:
+        status = "error"
+        span.record_error(exc)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        tracing.finish_span(span, token)
+        CALLS_IN_FLIGHT.dec((backend,))
+        CALLS.inc((backend, operation, status))
+        if _sampled():
+            CALL_LATENCY.observe(elapsed, (backend, operation))
+
+
+def _snapshot_path(pid):
+    return os.path.join(MULTIPROC_DIR, f"{pid}.json")
+
+
+def write_snapshot():
+    """Записывает реестр процесса в <pid>.json; замена файла атомарна."""
+    path = _snapshot_path(os.getpid())
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({metric.name: metric.snapshot() for metric in REGISTRY}, f)
+    os.replace(tmp, path)
+
+
+def _snapshot_loop():
+    while True:
+        time.sleep(SNAPSHOT_INTERVAL_S)
+        try:
+            write_snapshot()
+        except OSError as exc:
+            print(f"metrics snapshot failed: {exc}", flush=True)
+
+
+def start_snapshots():
+    """Фоновая запись снимков в воркере (gunicorn post_worker_init); без каталога — ничего."""
+    if not MULTIPROC_DIR:
+        return
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)
+    write_snapshot()
+    threading.Thread(target=_snapshot_loop, name="metrics-snapshot", daemon=True).start()
+
+
+def clear_multiproc_dir():
+    """Удаляет снимки прошлого запуска (gunicorn on_starting, в мастере)."""
+    if not MULTIPROC_DIR:
+        return
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)
+    for path in glob.glob(os.path.join(MULTIPROC_DIR, "*.json*")):
+        os.remove(path)
+
+
+def mark_process_dead(pid):
+    """
+    Обнуляет gauge завершившегося воркера (gunicorn child_exit, в мастере).
+    Его запросы уже не выполняются; счётчики и гистограммы остаются в сумме.
+    """
+    if not MULTIPROC_DIR:
+        return
+    path = _snapshot_path(pid)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        return
+    for metric in REGISTRY:
+        if isinstance(metric, Gauge):
+            snapshot.pop(metric.name, None)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(snapshot, f)
+    os.replace(tmp, path)
+
+
+def _merged_items():
+    """{имя метрики: [(метки, сумма по воркерам)]} из всех снимков каталога."""
+    write_snapshot()
+    merged = {metric.name: {} for metric in REGISTRY}
+    for path in glob.glob(os.path.join(MULTIPROC_DIR, "*.json")):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue  # воркер как раз пишет снимок или файл удалён
+        for metric in REGISTRY:
+            values = merged[metric.name]
+            for labels, value in snapshot.get(metric.name, []):
+                labels = tuple(labels)
+                values[labels] = metric.merge(values.get(labels), value)
+    return {name: list(values.items()) for name, values in merged.items()}
+
+
+def render_metrics():
+    lines = []
+    items = _merged_items() if MULTIPROC_DIR else {}
+    for metric in REGISTRY:
+        lines.extend(metric.render(items.get(metric.name)))
+    return "\n".join(lines) + "\n"
+
+
+def metrics_response():
+    """(body, status, headers) — подходит как ответ и для Flask, и для Quart."""
+    return render_metrics(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
+
+def instrument_app(app, service):
+    """Подключает HTTP-метрики к Flask-приложению и регистрирует GET /metrics."""
+    from flask import g, request
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_started = time.perf_counter()
+        HTTP_IN_FLIGHT.inc((service,))
+
+    @app.after_request
+    def _record_request(response):
+        started = g.pop("_metrics_started", None)
+        if started is not None:
+            endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+            HTTP_REQUESTS.inc((service, endpoint, request.method, str(response.status_code)))
+            if _sampled():
+                HTTP_LATENCY.observe(time.perf_counter() - started, (service, endpoint, request.method))
+        return response
+
+    @app.teardown_request
+    def _finish(exc):
+        HTTP_IN_FLIGHT.dec((service,))
+
+    app.add_url_rule("/metrics", "metrics", metrics_response, methods=["GET"])
+    return app
+
+
+def instrument_quart_app(app, service):
+    """То же для Quart: асинхронные хуки и асинхронный GET /metrics."""
+    from quart import g, request
+
+    @app.before_request
+    async def _start_timer():
+        g._metrics_started = time.perf_counter()
+        HTTP_IN_FLIGHT.inc((service,))
+
+    @app.after_request
+    async def _record_request(response):
+        started = g.pop("_metrics_started", None)
+        if started is not None:
+            endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+            HTTP_REQUESTS.inc((service, endpoint, request.method, str(response.status_code)))
+            if _sampled():
+                HTTP_LATENCY.observe(time.perf_counter() - started, (service, endpoint, request.method))
+        return response
+
+    @app.teardown_request
+    async def _finish(exc):
+        HTTP_IN_FLIGHT.dec((service,))
+
+    async def _metrics():
+        return metrics_response()
+
+    app.add_url_rule("/metrics", "metrics", _metrics, methods=["GET"])
+    return app
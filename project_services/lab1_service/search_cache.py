@@ -0,0 +1,110 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+# Счётчик поколений индекса lecture_materials. Увеличивается при каждой
+# переиндексации (elastic_gen_sync.generate_and_sync_lecture_materials,
+# CDC-индексатор); входит в ключ кэша, поэтому старые записи просто
+# перестают находиться и вытесняются LRU / истекают по TTL в Redis.
+GENERATION_KEY = "lecture_materials:generation"
+
+logger = logging.getLogger('search_cache')
+
+
+class SearchCache:
+    """
+    Кэш результатов LectureMaterialSearcher.search.
+    Первый уровень — LRU в памяти процесса, второй (необязательный, redis_values) —
+    Redis, общий для всех воркеров.
+
+    redis — фабрика клиентов без аргументов (ServicePools.redis): клиент берётся
+    при обращении, так что соединения открываются уже в воркере. Поколение
+    индекса читается из Redis и при выключенном втором уровне. Без фабрики
+    (async-вариант с redis.asyncio) поколение передаётся в update_generation.
+    """
+
+    def __init__(self, max_entries: int = 256, local_ttl: float = 60.0,
+                 redis=None, redis_values: bool = True, redis_ttl: int = 3600,
+                 generation_check_interval: float = 1.0):
+        self.max_entries = max_entries
+        self.local_ttl = local_ttl
+        self.redis = redis
+        self.redis_values = redis is not None and redis_values
+        self.redis_ttl = redis_ttl
+        self.generation_check_interval = generation_check_interval
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._generation_checked_at = 0.0
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        return " ".join(query.lower().split())
+
+    def generation(self) -> int:
+        """Текущее поколение индекса; в Redis ходим не чаще generation_check_interval."""
+        if self.redis is None:
+            return self._generation
+        now = time.monotonic()
+        if now - self._generation_checked_at >= self.generation_check_interval:
+            try:
+                self._generation = int(self.redis().get(GENERATION_KEY) or 0)
+            except Exception as e:
+                # остаёмся на известном поколении: после переиндексации возможны
+                # устаревшие результаты, пока Redis недоступен
+                logger.warning(f"Could not read {GENERATION_KEY}: {e}")
+            self._generation_checked_at = now
+        return self._generation
+
+    def update_generation(self, generation: int) -> None:
+        """Поколение, прочитанное вызывающим кодом (async-вариант опрашивает Redis сам)."""
+        self._generation = int(generation)
+
+    def make_key(self, query: str, fields: List[str], fuzziness: str,
+                 max_hits: Optional[int]) -> str:
+        raw = json.dumps([self.normalize(query), fields, fuzziness, max_hits],
+                         ensure_ascii=False)
+        digest = hashlib.sha1(raw.encode("utf-8")).hexdigest()
+        return f"cache:lecture_search:{self.generation()}:{digest}"
+
+    def get(self, key: str) -> Optional[List[int]]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, stored_at = entry
+                if now - stored_at < self.local_ttl:
+                    self._entries.move_to_end(key)
+                    return value
+                del self._entries[key]
+
+        if self.redis_values:
+            try:
+                cached = self.redis().get(key)
+            except Exception as e:
+                logger.warning(f"Search cache read from Redis failed: {e}")
+                cached = None
+            if cached is not None:
+                value = json.loads(cached)
+                self._store_local(key, value)
+                return value
+        return None
+
+    def set(self, key: str, value: List[int]) -> None:
+        self._store_local(key, value)
+        if self.redis_values:
+            try:
+                self.redis().set(key, json.dumps(value), ex=self.redis_ttl)
+            except Exception as e:
+                logger.warning(f"Search cache write to Redis failed: {e}")
+
+    def _store_local(self, key: str, value: List[int]) -> None:
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
@@ -0,0 +1,321 @@
+"""
+Трассировка запросов через gateway -> lab1-3 -> ES/Neo4j/Postgres/Redis.
+
+Контекст передаётся заголовком W3C `traceparent`; gateway открывает корневой
+span на входящий запрос и прокидывает заголовок в forward_request, сервисы
+лабораторных продолжают трассу, а instrumentation.track открывает дочерний
+span на каждый вызов хранилища. Копия модуля лежит в каталоге каждого сервиса.
+
+Экспорт (можно оба сразу):
+    TRACE_EXPORT_PATH    - JSON-lines файл, по строке на span
+    TRACE_OTLP_ENDPOINT  - OTLP/HTTP JSON коллектор, например http://otel-collector:4318
+TRACE_SAMPLE_RATE (0..1) - доля трасс, решение принимает корневой сервис.
+"""
+import json
+import os
+import queue
+import random
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH")
+OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT")
+SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+OTLP_BATCH_SIZE = 512
+OTLP_FLUSH_INTERVAL = 1.0
+
+SPAN_KINDS = {"internal": 1, "server": 2, "client": 3}
+
+_current_span = ContextVar("current_span", default=None)
+_service_name = os.getenv("TRACE_SERVICE_NAME", "unknown")
+
+
+class Span:
+    __slots__ = ("name", "kind", "trace_id", "span_id", "parent_id", "sampled",
+                 "attributes", "start_ns", "end_ns", "error")
+
+    def __init__(self, name, kind="internal", trace_id=None, parent_id=None, sampled=None, attributes=None):
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id or os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.sampled = (random.random() < SAMPLE_RATE) if sampled is None else sampled
+        self.attributes = dict(attributes or {})
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def record_error(self, exc):
+        self.error = f"{type(exc).__name__}: {exc}"
+
+    @property
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def to_dict(self):
+        return {
+            "service": _service_name,
+            "name": self.name,
+            "kind": self.kind,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+def parse_traceparent(value):
+    """'00-<trace_id>-<span_id>-<flags>' -> (trace_id, span_id, sampled) или None."""
+    if not value:
+        return None
+    parts = value.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+        flags = int(parts[3], 16)
+    except ValueError:
+        return None
+    if parts[1] == "0" * 32 or parts[2] == "0" * 16:
+        return None
+    return parts[1], parts[2], bool(flags & 1)
+
+
+def current_span():
+    return _current_span.get()
+
+
+def inject(headers=None):
+    """Добавляет traceparent текущего span в заголовки исходящего запроса."""
+    headers = dict(headers or {})
+    span = _current_span.get()
+    if span is not None:
+        headers["traceparent"] = span.traceparent
+    return headers
+
+
+def begin_span(name, kind="internal", attributes=None, traceparent=None):
+    """Открывает span дочерним к текущему (или к удалённому traceparent) и делает его текущим."""
+    parent = _current_span.get()
+    remote = parse_traceparent(traceparent) if parent is None else None
+    if parent is not None:
+        span = Span(name, kind, parent.trace_id, parent.span_id, parent.sampled, attributes)
+    elif remote is not None:
+        span = Span(name, kind, remote[0], remote[1], remote[2], attributes)
+    else:
+        span = Span(name, kind, attributes=attributes)
+    return span, _current_span.set(span)
+
+
+def finish_span(span, token):
+    span.end_ns = time.time_ns()
+    try:
+        _current_span.reset(token)
+    except ValueError:
+        # token создан в другом контексте (например, хук фреймворка в другом потоке)
+        _current_span.set(None)
+    if span.sampled:
+        _export(span)
+
+
+@contextmanager
+def start_span(name, kind="internal", **attributes):
+    span, token = begin_span(name, kind, attributes)
+    try:
+        yield span
+    except BaseException as exc:
+        span.record_error(exc)
+        raise
+    finally:
+        finish_span(span, token)
+
+
+class JsonLinesExporter:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, span):
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str)
+        with self._lock, open(self.path, "a", encoding="utf-8") as fh:
+            fh.write(line + "\n")
+
+
+class OtlpHttpExporter:
+    """Копит span'ы в очереди и отправляет их пачками в фоновом потоке."""
+
+    def __init__(self, endpoint):
+        endpoint = endpoint.rstrip("/")
+        self.url = endpoint if endpoint.endswith("/v1/traces") else endpoint + "/v1/traces"
+        self._queue = queue.Queue(maxsize=OTLP_BATCH_SIZE * 20)
+        threading.Thread(target=self._run, name="otlp-exporter", daemon=True).start()
+
+    def export(self, span):
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            pass
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + OTLP_FLUSH_INTERVAL
+            while len(batch) < OTLP_BATCH_SIZE:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            try:
+                self._send(batch)
+            except Exception as exc:
+                print(f"[tracing] не удалось отправить {len(batch)} span(ов) в {self.url}: {exc}")
+
+    def _send(self, spans):
+        payload = {"resourceSpans": [{
+            "resource": {"attributes": [_otlp_attr("service.name", _service_name)]},
+            "scopeSpans": [{
+                "scope": {"name": "project_services.tracing"},
+                "spans": [_otlp_span(span) for span in spans],
+            }],
+        }]}
+        req = urllib.request.Request(
+            self.url, data=json.dumps(payload).encode("utf-8"),
+            headers={"Content-Type": "application/json"}, method="POST"
+        )
+        with urllib.request.urlopen(req, timeout=5):
+            pass
+
+
+def _otlp_attr(key, value):
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+def _otlp_span(span):
+    data = {
+        "traceId": span.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": SPAN_KINDS.get(span.kind, 1),
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(span.end_ns),
+        "attributes": [_otlp_attr(k, v) for k, v in span.attributes.items()],
+        "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+    }
+    if span.parent_id:
+        data["parentSpanId"] = span.parent_id
+    return data
+
+
+EXPORTERS = []
+if EXPORT_PATH:
+    EXPORTERS.append(JsonLinesExporter(EXPORT_PATH))
+if OTLP_ENDPOINT:
+    EXPORTERS.append(OtlpHttpExporter(OTLP_ENDPOINT))
+
+
+def _export(span):
+    for exporter in EXPORTERS:
+        try:
+            exporter.export(span)
+        except Exception as exc:
+            print(f"[tracing] ошибка экспорта span {span.name}: {exc}")
+
+
+def set_service_name(service):
+    global _service_name
+    _service_name = os.getenv("TRACE_SERVICE_NAME", service)
+
+
+def trace_app(app, service):
+    """Открывает server-span на каждый запрос Flask-приложения, продолжая входящий traceparent."""
+    from flask import g, request
+
+    set_service_name(service)
+
+    @app.before_request
+    def _start_span():
+        span, token = begin_span(
+            f"{request.method} {request.path}", "server",
+            {"http.method": request.method, "http.target": request.path},
+            request.headers.get("traceparent")
+        )
+        g._trace_span, g._trace_token = span, token
+
+    @app.after_request
+    def _tag_response(response):
+        span = g.get("_trace_span")
+        if span is not None:
+            if request.url_rule is not None:
+                span.set_attribute("http.route", request.url_rule.rule)
+            span.set_attribute("http.status_code", response.status_code)
+            if response.status_code >= 500:
+                span.error = f"HTTP {response.status_code}"
+            response.headers["traceparent"] = span.traceparent
+        return response
+
+    @app.teardown_request
+    def _end_span(exc):
+        span = g.pop("_trace_span", None)
+        token = g.pop("_trace_token", None)
+        if span is not None:
+            if exc is not None:
+                span.record_error(exc)
+            finish_span(span, token)
+
+    return app
+
+
+def trace_quart_app(app, service):
+    """То же для Quart: хуки асинхронные, чтобы span жил в контексте задачи запроса."""
+    from quart import g, request
+
+    set_service_name(service)
+
+    @app.before_request
+    async def _start_span():
+        g._trace_span, g._trace_token = begin_span(
+            f"{request.method} {request.path}", "server",
+            {"http.method": request.method, "http.target": request.path},
+            request.headers.get("traceparent")
+        )
+
+    @app.after_request
+    async def _tag_response(response):
+        span = getattr(g, "_trace_span", None)
+        if span is not None:
+            span.set_attribute("http.status_code", response.status_code)
+            if response.status_code >= 500:
+                span.error = f"HTTP {response.status_code}"
+            response.headers["traceparent"] = span.traceparent
+        return response
+
+    @app.teardown_request
+    async def _end_span(exc):
+        span = getattr(g, "_trace_span", None)
+        if span is not None:
+            g._trace_span = None
+            if exc is not None:
+                span.record_error(exc)
+            finish_span(span, g._trace_token)
+
+    return app
@@ -2,8 +2,14 @@ from flask import Flask, request, jsonify
 import redis
 import os
 import neo4j_sync
+import audience_snapshot
+from instrumentation import instrument_app
+from tracing import trace_app
+from pools import ServicePools
 
 app = Flask(__name__)
+instrument_app(app, "lab2")
+trace_app(app, "lab2")
 
 NEO4J_URI = os.getenv("NEO4J_URI", "bolt://neo4j:7687")
 NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
@@ -22,6 +28,13 @@ PG_CONFIG = {
     'port': os.getenv("POSTGRES_PORT", 5432),
 }
 
+# Пулы открываются в воркере (gunicorn.conf.py: post_worker_init) или при первом запросе
+pools = ServicePools(
+    pg_config=PG_CONFIG,
+    neo4j_uri=NEO4J_URI,
+    neo4j_auth=(NEO4J_USER, NEO4J_PASSWORD)
+)
+
 @app.route('/api/lab2/audience_report', methods=['POST'])
 def get_audience_report():
     data = request.get_json(force=True)
@@ -29,16 +42,34 @@ def get_audience_report():
     semester = data.get('semester')
     if year is None or semester is None:
         return jsonify({'error': 'Required fields: year, semester'}), 400
+    # audience_report_snapshot: CHECK (semester IN (1, 2)) — проверяем до запросов
+    try:
+        year, semester = int(year), int(semester)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'year and semester must be integers'}), 400
+    if semester not in (1, 2):
+        return jsonify({'error': 'semester must be 1 or 2'}), 400
+    # fresh=true — пересчитать в Neo4j, а не отдавать снимок
+    fresh = str(data.get('fresh', request.args.get('fresh', ''))).lower() in ('1', 'true', 'yes')
+    pg_conn = pools.getconn()
+    service = None
     try:
-        service = neo4j_sync.SyncService()
-        report = service.generate_audience_report(year=year, semester=semester)
-        return jsonify(report=report, meta={'status': 'success', 'count': len(report)}), 200
+        snapshot = None if fresh else audience_snapshot.load_snapshot(pg_conn, year, semester)
+        if snapshot is not None:
+            report, built_at = snapshot
+            return jsonify(report=report, meta={'status': 'success', 'count': len(report),
+                                                'source': 'snapshot', 'built_at': built_at.isoformat()}), 200
+        # снимка ещё нет (или fresh): считаем и сохраняем — следующий запрос прочитает снимок
+        service = neo4j_sync.SyncService(pg_conn=pg_conn, neo4j_driver=pools.neo4j)
+        report = audience_snapshot.build_snapshot(service, year, semester)
+        return jsonify(report=report, meta={'status': 'success', 'count': len(report), 'source': 'live'}), 200
     except Exception as e:
         app.logger.error(f"Audience report error: {e}")
         return jsonify({'error': 'Failed to generate audience report'}), 500
     finally:
         try: service.close()
         except: pass
+        pools.putconn(pg_conn)
 
 
 if __name__ == '__main__':
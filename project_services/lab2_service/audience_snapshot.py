@@ -0,0 +1,271 @@
+"""
+Снимки отчёта по аудиториям (generate_audience_report) по семестрам.
+
+Отчёт за семестр считается по всему графу расписаний (COUNT(DISTINCT s) на
+каждое занятие, COLLECT(DISTINCT m.name) на каждую лекцию), поэтому он
+материализуется в таблицу audience_report_snapshot (DB_Postgres/init/postgres.py):
+одна строка на (year, semester). /api/lab2/audience_report читает строку по
+первичному ключу; пересчёт — только с fresh=true.
+
+Снимки пересобираются фоновым процессом по CDC-событиям Debezium:
+  - postgres_server.public.schedule — пересобираются семестры старой и новой даты занятия;
+  - students — меняет численность старой и новой группы студента, поэтому
+    пересобираются сохранённые семестры, в которых у этих групп есть занятия
+    (правка имени или почты численность не меняет и пересборки не вызывает);
+  - lecture, course_of_lecture, material_of_lecture — меняют названия,
+    поэтому пересобираются все уже сохранённые семестры.
+Neo4j обновляется своим sink-коннектором из тех же топиков, поэтому пересборка
+откладывается на SNAPSHOT_DEBOUNCE_S секунд после первого события пачки,
+а offset'ы коммитятся только после записи снимков.
+
+Запуск:
+    python audience_snapshot.py build --all
+    python audience_snapshot.py build --year 2024 --semester 1
+    python audience_snapshot.py consume
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from datetime import date, timedelta
+
+from psycopg2.extras import Json
+
+from instrumentation import track
+
+KAFKA_BOOTSTRAP_SERVERS = os.getenv("KAFKA_BOOTSTRAP_SERVERS", "broker:29092").split(",")
+GROUP_ID = "lab2-audience-snapshot"
+SCHEDULE_TOPIC = "postgres_server.public.schedule"
+STUDENTS_TOPIC = "postgres_server.public.students"
+TOPICS = [
+    SCHEDULE_TOPIC,
+    STUDENTS_TOPIC,
+    "postgres_server.public.lecture",
+    "postgres_server.public.course_of_lecture",
+    "postgres_server.public.material_of_lecture",
+]
+SNAPSHOT_DEBOUNCE_S = float(os.getenv("SNAPSHOT_DEBOUNCE_S", 5))
+
+logger = logging.getLogger('audience_snapshot')
+
+EPOCH = date(1970, 1, 1)
+
+
+def semester_of(day):
+    """
+    (year, semester) по дате занятия — обратное к SyncService._calculate_semester_dates:
+    февраль–июнь — 1-й семестр года, сентябрь–январь — 2-й (январь относится
+    к предыдущему году). Июль и август ни в один семестр не входят: None.
+    """
+    if 2 <= day.month <= 6:
+        return day.year, 1
+    if day.month >= 9:
+        return day.year, 2
+    if day.month == 1:
+        return day.year - 1, 2
+    return None
+
+
+def _event_date(value):
+    """
+    Дата из поля CDC-события. Debezium (JsonConverter без схем) отдаёт TIMESTAMP
+    как микросекунды (MicroTimestamp) или миллисекунды (Timestamp) от эпохи,
+    DATE — как дни от эпохи; строки ISO тоже принимаются.
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    value = int(value)
+    if abs(value) < 1_000_000:
+        return EPOCH + timedelta(days=value)
+    if abs(value) < 100_000_000_000_000:
+        return EPOCH + timedelta(milliseconds=value)
+    return EPOCH + timedelta(microseconds=value)
+
+
+def load_snapshot(pg_conn, year, semester):
+    """Возвращает (report, built_at) или None, если снимка ещё нет."""
+    with pg_conn.cursor() as cur, track("postgres", "audience_snapshot"):
+        cur.execute(
+            "SELECT report, built_at FROM audience_report_snapshot WHERE year = %s AND semester = %s",
+            (year, semester)
+        )
+        row = cur.fetchone()
+    pg_conn.commit()
+    return (row[0], row[1]) if row else None
+
+
+def store_snapshot(pg_conn, year, semester, report):
+    with pg_conn.cursor() as cur, track("postgres", "audience_snapshot_store"):
+        cur.execute(
+            "INSERT INTO audience_report_snapshot (year, semester, report, built_at) "
+            "VALUES (%s, %s, %s, now()) "
+            "ON CONFLICT (year, semester) DO UPDATE "
+            "SET report = EXCLUDED.report, built_at = EXCLUDED.built_at",
+            (year, semester, Json(report))
+        )
+    pg_conn.commit()
+
+
+def build_snapshot(service, year, semester):
+    """Пересчитывает отчёт в Neo4j и сохраняет его снимок через соединение сервиса."""
+    report = service.generate_audience_report(year=year, semester=semester)
+    store_snapshot(service.pg_conn, year, semester, report)
+    return report
+
+
+def scheduled_semesters(pg_conn):
+    """Все (year, semester), в которых есть занятия."""
+    with pg_conn.cursor() as cur:
+        cur.execute("SELECT DISTINCT date::date FROM Schedule")
+        days = [row[0] for row in cur.fetchall()]
+    return sorted({sem for sem in map(semester_of, days) if sem})
+
+
+def stored_semesters(pg_conn):
+    with pg_conn.cursor() as cur:
+        cur.execute("SELECT year, semester FROM audience_report_snapshot")
+        rows = cur.fetchall()
+    pg_conn.commit()
+    return {(year, semester) for year, semester in rows}
+
+
+def group_semesters(pg_conn, group_ids):
+    """Все (year, semester), в которых есть занятия у групп group_ids."""
+    with pg_conn.cursor() as cur:
+        cur.execute("SELECT DISTINCT date::date FROM Schedule WHERE group_id = ANY(%s)", (list(group_ids),))
+        days = [row[0] for row in cur.fetchall()]
+    pg_conn.commit()
+    return {sem for sem in map(semester_of, days) if sem}
+
+
+def touched_semesters(topic, payload):
+    """
+    Семестры, которые затрагивает событие Schedule. None — «все сохранённые»:
+    так обрабатываются топики справочников и удаление занятия без даты в before
+    (без REPLICA IDENTITY FULL Debezium присылает в before только ключ).
+    """
+    if topic != SCHEDULE_TOPIC:
+        return None
+    touched = set()
+    for image in (payload.get('before'), payload.get('after')):
+        if image and image.get('date') is not None:
+            sem = semester_of(_event_date(image['date']))
+            if sem:
+                touched.add(sem)
+    if not touched and payload.get('op') == 'd':
+        return None
+    return touched
+
+
+def touched_groups(payload):
+    """
+    Группы, численность которых меняет событие Students. Пустое множество —
+    группа студента не изменилась; None — группа неизвестна (в before нет
+    group_id без REPLICA IDENTITY FULL), тогда пересобирается всё сохранённое.
+    """
+    images = [image for image in (payload.get('before'), payload.get('after')) if image]
+    if not images or any('group_id' not in image for image in images):
+        return None
+    groups = {image['group_id'] for image in images}
+    if len(images) == 2 and len(groups) == 1:
+        return set()
+    groups.discard(None)
+    return groups
+
+
+def consume(service):
+    from kafka import KafkaConsumer
+
+    logger.info(f"Starting Kafka consumer for topics: {TOPICS}, group_id={GROUP_ID}")
+    consumer = KafkaConsumer(
+        *TOPICS,
+        bootstrap_servers=KAFKA_BOOTSTRAP_SERVERS,
+        group_id=GROUP_ID,
+        auto_offset_reset='earliest',
+        enable_auto_commit=False,
+        max_poll_records=500,
+        value_deserializer=lambda m: json.loads(m.decode('utf-8')) if m else None
+    )
+
+    dirty, dirty_groups, rebuild_all, dirty_since = set(), set(), False, None
+    try:
+        while True:
+            records = consumer.poll(timeout_ms=1000)
+            for tp, msgs in records.items():
+                for msg in msgs:
+                    raw = msg.value
+                    if not raw:
+                        continue  # tombstone
+                    payload = raw['payload'] if isinstance(raw, dict) and 'payload' in raw else raw
+                    if tp.topic == STUDENTS_TOPIC:
+                        groups = touched_groups(payload)
+                        if groups is None:
+                            rebuild_all = True
+                        else:
+                            dirty_groups |= groups
+                    else:
+                        touched = touched_semesters(tp.topic, payload)
+                        if touched is None:
+                            rebuild_all = True
+                        else:
+                            dirty |= touched
+                    if dirty_since is None and (rebuild_all or dirty or dirty_groups):
+                        dirty_since = time.monotonic()
+
+            if dirty_since is None or time.monotonic() - dirty_since < SNAPSHOT_DEBOUNCE_S:
+                continue
+            if rebuild_all:
+                dirty |= stored_semesters(service.pg_conn)
+            elif dirty_groups:
+                # семестры без снимка посчитаются при первом запросе
+                dirty |= group_semesters(service.pg_conn, dirty_groups) & stored_semesters(service.pg_conn)
+            for year, semester in sorted(dirty):
+                report = build_snapshot(service, year, semester)
+                logger.info(f"Rebuilt audience snapshot {year}/{semester}: {len(report)} rows")
+            # всё прочитанное к этому моменту уже учтено в пересобранных снимках
+            consumer.commit()
+            dirty, dirty_groups, rebuild_all, dirty_since = set(), set(), False, None
+    finally:
+        consumer.close()
+
+
+def main():
+    from neo4j_sync import SyncService
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s %(levelname)s [%(name)s] %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S'
+    )
+    parser = argparse.ArgumentParser(description="Снимки отчёта по аудиториям")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="пересобрать снимки")
+    build.add_argument("--all", action="store_true", help="все семестры, в которых есть занятия")
+    build.add_argument("--year", type=int)
+    build.add_argument("--semester", type=int, choices=(1, 2))
+    sub.add_parser("consume", help="пересобирать снимки по CDC-событиям")
+    args = parser.parse_args()
+
+    service = SyncService()
+    try:
+        if args.command == "consume":
+            consume(service)
+            return
+        if args.all:
+            semesters = scheduled_semesters(service.pg_conn)
+        elif args.year is not None and args.semester is not None:
+            semesters = [(args.year, args.semester)]
+        else:
+            parser.error("build: укажите --all или --year и --semester")
+        for year, semester in semesters:
+            report = build_snapshot(service, year, semester)
+            logger.info(f"Built audience snapshot {year}/{semester}: {len(report)} rows")
+    finally:
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
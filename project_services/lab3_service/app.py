@@ -2,8 +2,14 @@ from flask import Flask, request, jsonify
 import redis
 import os
 import neo4j_sync
+from attendance_bitmap import AttendanceBitmaps
+from instrumentation import instrument_app
+from tracing import trace_app
+from pools import ServicePools
 
 app = Flask(__name__)
+instrument_app(app, "lab3")
+trace_app(app, "lab3")
 
 NEO4J_URI = os.getenv("NEO4J_URI", "bolt://neo4j:7687")
 NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
@@ -14,6 +20,7 @@ ES_USER = os.getenv("ES_USER", "elastic")
 ES_PASS = os.getenv("ES_PASS", "secret")
 REDIS_HOST = os.getenv("REDIS_HOST", "redis")
 REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
+ATTENDANCE_BACKEND = os.getenv("ATTENDANCE_BACKEND", "postgres")
 PG_CONFIG = {
     'dbname': os.getenv("POSTGRES_DB", "postgres_db"),
     'user': os.getenv("POSTGRES_USER", "postgres_user"),
@@ -22,14 +29,28 @@ PG_CONFIG = {
     'port': os.getenv("POSTGRES_PORT", 5432),
 }
 
+# Пулы открываются в воркере (gunicorn.conf.py: post_worker_init) или при первом запросе
+pools = ServicePools(
+    pg_config=PG_CONFIG,
+    neo4j_uri=NEO4J_URI,
+    neo4j_auth=(NEO4J_USER, NEO4J_PASSWORD),
+    redis_host=REDIS_HOST,
+    redis_port=REDIS_PORT
+)
+
 @app.route('/api/lab3/group_report', methods=['POST'])
 def get_group_report():
     data = request.get_json(force=True)
     group_id = data.get('group_id')
     if group_id is None:
         return jsonify({'error': 'Required field: group_id'}), 400
+    pg_conn = pools.getconn()
+    redis_conn = pools.redis() if ATTENDANCE_BACKEND == "redis" else None
     try:
-        service = neo4j_sync.SyncService()
+        service = neo4j_sync.SyncService(
+            pg_conn=pg_conn, neo4j_driver=pools.neo4j,
+            attendance_bitmaps=AttendanceBitmaps(redis_conn) if redis_conn is not None else None
+        )
         report = service.generate_group_report(group_id=group_id)
         return jsonify(report=report, meta={'status': 'success', 'group_id': group_id, 'count': len(report)}), 200
     except Exception as e:
@@ -38,6 +59,9 @@ def get_group_report():
     finally:
         try: service.close()
         except: pass
+        if redis_conn is not None:
+            redis_conn.close()
+        pools.putconn(pg_conn)
 
 
 if __name__ == '__main__':
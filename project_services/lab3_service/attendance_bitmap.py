@@ -0,0 +1,276 @@
+"""
+Посещаемость в битовых картах Redis — быстрый слой поверх таблицы Attendance.
+
+Ключи (строки Redis, бит с номером offset):
+  attendance:sched:{schedule_id}            offset = student_id, 1 — был на занятии
+  attendance:sched:{schedule_id}:recorded   offset = student_id, 1 — есть строка Attendance
+  attendance:student:{student_id}           offset = schedule_id, 1 — был на занятии
+  attendance:student:{student_id}:recorded  offset = schedule_id, 1 — есть строка Attendance
+  attendance:loaded                         метка полной загрузки (время в секундах)
+
+Счётчики «посещено / всего» по набору занятий считаются в Redis: маска занятий
+собирается во временном ключе, BITOP AND с картой студента, затем BITCOUNT —
+всё одним pipeline. Пока метки attendance:loaded нет (карты не загружены или
+идёт полная перезагрузка), сервисы читают Postgres (ATTENDANCE_BACKEND).
+
+Карты заполняются целиком из Attendance и поддерживаются CDC-событиями Debezium.
+Attendance партиционирована, поэтому события приходят в топики партиций
+(postgres_server.public.attendance_<семестр>): consumer подписывается по шаблону.
+Полная загрузка перезаписывает карты целиком, поэтому consumer на её время
+останавливают; `run` (команда сервиса в docker-compose) делает это сам:
+загружает карты, если метки attendance:loaded нет, и затем слушает события.
+
+Дубликаты строк Attendance (у таблицы нет ключа) дают один бит, и отчёты на
+Postgres считают их так же — одним занятием. Но удаление одной из двух
+одинаковых строк по CDC снимает бит, хотя вторая строка осталась; такие
+расхождения исправляет повторный `load`.
+
+Копия модуля лежит в каталогах lab1_service и lab3_service.
+
+Запуск:
+    python attendance_bitmap.py load
+    python attendance_bitmap.py consume
+    python attendance_bitmap.py run
+"""
+import argparse
+import heapq
+import json
+import logging
+import os
+import time
+import uuid
+
+from instrumentation import track
+
+KAFKA_BOOTSTRAP_SERVERS = os.getenv("KAFKA_BOOTSTRAP_SERVERS", "broker:29092").split(",")
+GROUP_ID = "attendance-bitmap-consumer-group"
+TOPIC_PATTERN = r"postgres_server\.public\.attendance.*"
+BACKENDS = ("postgres", "redis")
+
+LOADED_KEY = "attendance:loaded"
+# Время жизни временных ключей запроса — на случай обрыва до DEL
+TMP_TTL_S = 30
+
+logger = logging.getLogger('attendance_bitmap')
+
+
+def schedule_key(schedule_id, recorded=False):
+    return f"attendance:sched:{schedule_id}" + (":recorded" if recorded else "")
+
+
+def student_key(student_id, recorded=False):
+    return f"attendance:student:{student_id}" + (":recorded" if recorded else "")
+
+
+def _set_bit(bitmaps, key, offset):
+    """Бит offset в bytearray с порядком битов Redis (бит 0 — старший бит первого байта)."""
+    bitmap = bitmaps.get(key)
+    if bitmap is None:
+        bitmap = bitmaps[key] = bytearray()
+    byte = offset >> 3
+    if byte >= len(bitmap):
+        bitmap.extend(b"\0" * (byte + 1 - len(bitmap)))
+    bitmap[byte] |= 0x80 >> (offset & 7)
+
+
+class AttendanceBitmaps:
+    def __init__(self, r):
+        self.r = r
+
+    def ready(self):
+        return bool(self.r.exists(LOADED_KEY))
+
+    # --- запись -----------------------------------------------------------------------
+
+    def record(self, pipe, student_id, schedule_id, attended):
+        pipe.setbit(schedule_key(schedule_id, recorded=True), student_id, 1)
+        pipe.setbit(student_key(student_id, recorded=True), schedule_id, 1)
+        pipe.setbit(schedule_key(schedule_id), student_id, 1 if attended else 0)
+        pipe.setbit(student_key(student_id), schedule_id, 1 if attended else 0)
+
+    def forget(self, pipe, student_id, schedule_id):
+        for recorded in (False, True):
+            pipe.setbit(schedule_key(schedule_id, recorded), student_id, 0)
+            pipe.setbit(student_key(student_id, recorded), schedule_id, 0)
+
+    def load(self, pg_conn, batch_rows=50000):
+        """
+        Полная загрузка из Attendance. Карты собираются в памяти процесса и пишутся
+        целиком (SET), а не по SETBIT на строку. На время загрузки метка снимается,
+        и сервисы читают Postgres. SET перекрывает то, что consumer успел записать
+        за время загрузки, поэтому consumer на это время останавливают.
+        """
+        self.r.delete(LOADED_KEY)
+        bitmaps = {}
+        rows = 0
+        # именованный курсор: строки читаются с сервера порциями, а не все сразу
+        with pg_conn.cursor(name="attendance_bitmap_load") as cur:
+            cur.itersize = batch_rows
+            cur.execute("SELECT student_id, schedule_id, attended FROM Attendance")
+            for student_id, schedule_id, attended in cur:
+                _set_bit(bitmaps, schedule_key(schedule_id, recorded=True), student_id)
+                _set_bit(bitmaps, student_key(student_id, recorded=True), schedule_id)
+                if attended:
+                    _set_bit(bitmaps, schedule_key(schedule_id), student_id)
+                    _set_bit(bitmaps, student_key(student_id), schedule_id)
+                rows += 1
+        pg_conn.commit()
+
+        stale = [key for key in self.r.scan_iter(match="attendance:s*", count=1000)
+                 if (key.decode() if isinstance(key, bytes) else key) not in bitmaps]
+        pipe = self.r.pipeline(transaction=False)
+        for i in range(0, len(stale), 1000):
+            pipe.unlink(*stale[i:i + 1000])
+        for i, (key, bitmap) in enumerate(bitmaps.items(), 1):
+            pipe.set(key, bytes(bitmap))
+            if i % 1000 == 0:
+                pipe.execute()
+        pipe.set(LOADED_KEY, int(time.time()))
+        pipe.execute()
+        return rows, len(bitmaps)
+
+    # --- чтение -----------------------------------------------------------------------
+
+    def attendance_counts(self, student_ids, schedule_ids):
+        """
+        {student_id: (посещено, всего)} по занятиям schedule_ids; студенты без
+        строк Attendance по этим занятиям не возвращаются (как GROUP BY в SQL).
+        """
+        if not student_ids or not schedule_ids:
+            return {}
+        token = uuid.uuid4().hex
+        mask, tmp = f"attendance:tmp:{token}:mask", f"attendance:tmp:{token}"
+        pipe = self.r.pipeline(transaction=False)
+        for schedule_id in schedule_ids:
+            pipe.setbit(mask, schedule_id, 1)
+        pipe.expire(mask, TMP_TTL_S)
+        for student_id in student_ids:
+            pipe.bitop("AND", tmp, student_key(student_id), mask)
+            pipe.bitcount(tmp)
+            pipe.bitop("AND", tmp, student_key(student_id, recorded=True), mask)
+            pipe.bitcount(tmp)
+        pipe.delete(tmp, mask)
+        with track("redis", "attendance_bitmap_counts"):
+            replies = pipe.execute()
+        counts = replies[len(schedule_ids) + 1:-1][1::2]
+        result = {}
+        for i, student_id in enumerate(student_ids):
+            attended, total = counts[2 * i], counts[2 * i + 1]
+            if total:
+                result[student_id] = (attended, total)
+        return result
+
+    def worst_attendees(self, student_ids, schedule_ids, top_n):
+        """top_n студентов с наименьшим процентом посещаемости: [(student_id, посещено, всего, процент)]."""
+        rows = [(sid, attended, total, round(attended / total * 100, 2))
+                for sid, (attended, total) in self.attendance_counts(student_ids, schedule_ids).items()]
+        return heapq.nsmallest(top_n, rows, key=lambda row: (row[3], row[0]))
+
+    def schedule_counts(self, schedule_ids):
+        """{schedule_id: (пришло, всего отмечено)} — BITCOUNT карт занятий."""
+        pipe = self.r.pipeline(transaction=False)
+        for schedule_id in schedule_ids:
+            pipe.bitcount(schedule_key(schedule_id))
+            pipe.bitcount(schedule_key(schedule_id, recorded=True))
+        with track("redis", "attendance_bitmap_schedules"):
+            replies = pipe.execute()
+        return {sid: (replies[2 * i], replies[2 * i + 1]) for i, sid in enumerate(schedule_ids)}
+
+    def present_at_all(self, schedule_ids):
+        """Число студентов, бывших на каждом из занятий (BITOP AND карт занятий)."""
+        if not schedule_ids:
+            return 0
+        tmp = f"attendance:tmp:{uuid.uuid4().hex}"
+        pipe = self.r.pipeline(transaction=False)
+        pipe.bitop("AND", tmp, *[schedule_key(sid) for sid in schedule_ids])
+        pipe.bitcount(tmp)
+        pipe.delete(tmp)
+        with track("redis", "attendance_bitmap_present"):
+            return pipe.execute()[1]
+
+
+def consume(bitmaps, batch_timeout=1000):
+    """Применяет CDC-события Attendance; offset'ы коммитятся после pipeline."""
+    from kafka import KafkaConsumer
+
+    logger.info(f"Starting Kafka consumer for pattern: {TOPIC_PATTERN}, group_id={GROUP_ID}")
+    consumer = KafkaConsumer(
+        bootstrap_servers=KAFKA_BOOTSTRAP_SERVERS,
+        group_id=GROUP_ID,
+        auto_offset_reset='earliest',
+        enable_auto_commit=False,
+        max_poll_records=5000,
+        value_deserializer=lambda m: json.loads(m.decode('utf-8')) if m else None
+    )
+    consumer.subscribe(pattern=TOPIC_PATTERN)
+    try:
+        while True:
+            records = consumer.poll(timeout_ms=batch_timeout)
+            pipe = bitmaps.r.pipeline(transaction=False)
+            events = 0
+            for msgs in records.values():
+                for msg in msgs:
+                    raw = msg.value
+                    if not raw:
+                        continue  # tombstone
+                    payload = raw['payload'] if isinstance(raw, dict) and 'payload' in raw else raw
+                    before, after = payload.get('before'), payload.get('after')
+                    # before с полями строки есть благодаря REPLICA IDENTITY FULL у партиций
+                    if before and before.get('student_id') is not None:
+                        bitmaps.forget(pipe, before['student_id'], before['schedule_id'])
+                    if payload.get('op') != 'd' and after:
+                        bitmaps.record(pipe, after['student_id'], after['schedule_id'], after.get('attended'))
+                    events += 1
+            if not events:
+                continue
+            pipe.execute()
+            consumer.commit()
+            logger.info(f"Applied {events} attendance events")
+    finally:
+        consumer.close()
+
+
+def main():
+    import psycopg2
+    import redis
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s %(levelname)s [%(name)s] %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S'
+    )
+    parser = argparse.ArgumentParser(description="Битовые карты посещаемости в Redis")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("load", help="загрузить карты из Attendance целиком")
+    sub.add_parser("consume", help="поддерживать карты по CDC-событиям")
+    sub.add_parser("run", help="load, если карты не загружены, затем consume")
+    args = parser.parse_args()
+
+    r = redis.Redis(host=os.getenv("REDIS_HOST", "redis"), port=int(os.getenv("REDIS_PORT", 6379)))
+    bitmaps = AttendanceBitmaps(r)
+    try:
+        if args.command == "consume" or (args.command == "run" and bitmaps.ready()):
+            consume(bitmaps)
+            return
+        pg_conn = psycopg2.connect(
+            dbname=os.getenv("POSTGRES_DB", "postgres_db"),
+            user=os.getenv("POSTGRES_USER", "postgres_user"),
+            password=os.getenv("POSTGRES_PASSWORD", "postgres_password"),
+            host=os.getenv("POSTGRES_HOST", "postgres"),
+            port=os.getenv("POSTGRES_PORT", 5432)
+        )
+        try:
+            t0 = time.time()
+            rows, keys = bitmaps.load(pg_conn)
+            logger.info(f"Loaded {rows} attendance rows into {keys} bitmaps in {time.time() - t0:.1f}s")
+        finally:
+            pg_conn.close()
+        if args.command == "run":
+            # события, пришедшие во время загрузки, применяются уже поверх неё
+            consume(bitmaps)
+    finally:
+        r.close()
+
+
+if __name__ == "__main__":
+    main()
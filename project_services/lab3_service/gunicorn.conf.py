@@ -0,0 +1,54 @@
+"""
+Настройки gunicorn для lab3: `gunicorn --config gunicorn.conf.py app:app`.
+
+WEB_CONCURRENCY          - число процессов-воркеров (по умолчанию 2 * CPU + 1)
+GUNICORN_THREADS         - потоков на воркер; > 1 включает gthread-воркеры
+GUNICORN_TIMEOUT         - сколько может выполняться один запрос, с
+GUNICORN_GRACEFUL_TIMEOUT - сколько ждать текущие запросы при остановке, с
+GUNICORN_MAX_REQUESTS    - перезапуск воркера после N запросов (0 - выключено)
+METRICS_MULTIPROC_DIR    - каталог снимков метрик воркеров (по умолчанию /tmp/metrics/lab3);
+                           /metrics суммирует их, см. instrumentation.py
+"""
+import multiprocessing
+import os
+
+# до импорта instrumentation в мастере и воркерах
+os.environ.setdefault("METRICS_MULTIPROC_DIR", "/tmp/metrics/lab3")
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5003')}"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv("GUNICORN_THREADS", 4))
+worker_class = "gthread" if threads > 1 else "sync"
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 60))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 5))
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 0))
+max_requests_jitter = max_requests // 10
+# приложение грузится в каждом воркере: пулы соединений создаются уже после fork
+preload_app = False
+accesslog = "-"
+
+
+def on_starting(server):
+    # снимки прошлого запуска не должны попасть в сумму
+    import instrumentation
+    instrumentation.clear_multiproc_dir()
+
+
+def post_worker_init(worker):
+    # соединения открываются до первого запроса, а не внутри него
+    from app import pools
+    pools.open()
+    import instrumentation
+    instrumentation.start_snapshots()
+
+
+def child_exit(server, worker):
+    import instrumentation
+    instrumentation.mark_process_dead(worker.pid)
+
+
+def worker_exit(server, worker):
+    # gunicorn уже дождался текущих запросов (graceful_timeout) — закрываем пулы
+    from app import pools
+    pools.close()
@@ -1,6 +1,7 @@
 from neo4j import GraphDatabase
 from datetime import date, timedelta
 import psycopg2
+from instrumentation import track
 
 # PostgreSQL connection parameters
 PG_CONFIG = {
@@ -17,19 +18,28 @@ NEO4J_USER = "neo4j"
 NEO4J_PASSWORD = "strongpassword"
 
 class SyncService:
-    def __init__(self):
+    def __init__(self, pg_conn=None, neo4j_driver=None, attendance_bitmaps=None):
+        # Соединения можно передать из пулов воркера (pools.ServicePools) —
+        # тогда close() их не закрывает.
+        # attendance_bitmaps (attendance_bitmap.AttendanceBitmaps): часы посещения
+        # для generate_group_report берутся из битовых карт Redis, если они загружены.
+        self.attendance_bitmaps = attendance_bitmaps
+        self._owns_pg = pg_conn is None
+        self._owns_neo4j = neo4j_driver is None
         # Initialize Postgres connection
-        self.pg_conn = psycopg2.connect(**PG_CONFIG)
+        self.pg_conn = pg_conn if pg_conn is not None else psycopg2.connect(**PG_CONFIG)
         self.pg_cur = self.pg_conn.cursor()
         # Initialize Neo4j driver
-        self.neo4j_driver = GraphDatabase.driver(
+        self.neo4j_driver = neo4j_driver if neo4j_driver is not None else GraphDatabase.driver(
             NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD)
         )
 
     def close(self):
         self.pg_cur.close()
-        self.pg_conn.close()
-        self.neo4j_driver.close()
+        if self._owns_pg:
+            self.pg_conn.close()
+        if self._owns_neo4j:
+            self.neo4j_driver.close()
 
     def sync_universities(self):
         self.pg_cur.execute("SELECT id, name, location FROM University")
@@ -136,14 +146,16 @@ class SyncService:
         )
         for id, date, lecture_id, group_id in self.pg_cur.fetchall():
             with self.neo4j_driver.session() as session:
+                # sch.day — дата занятия типа Date: по ней работает диапазонный индекс
+                # schedule_day_range (sch.date — LocalDateTime, с date($start) не сравнивается)
                 session.run(
                     "MATCH (l:Lecture {id: $lid}), (g:Group {id: $gid})"
                     " MERGE (sch:Schedule {id: $id}) "
-                    "SET sch.date = $date "
+                    "SET sch.date = $date, sch.day = $day "
                     "MERGE (l)-[:SCHEDULED_AT]->(sch) "
                     "MERGE (sch)-[:FOR_GROUP]->(g)",
                     lid=lecture_id, gid=group_id,
-                    id=id, date=date
+                    id=id, date=date, day=date.date()
                 )
 
     def sync_students(self):
@@ -215,6 +227,62 @@ class SyncService:
         row = self.pg_cur.fetchone()
         return bool(row[0]) if row else False
 
+    def get_scheduled_students_batch(self, schedule_ids):
+        """
+        Пакетный вариант get_scheduled_students: один Cypher-запрос на все расписания.
+        Возвращает словарь {schedule_id: [{'id': ..., 'name': ...}, ...]}.
+        """
+        query = (
+            "UNWIND $sids AS sid "
+            "MATCH (sch:Schedule {id: sid})-[:FOR_GROUP]->(g:Group)"
+            "-[:HAS_STUDENT]->(s:Student)"
+            " RETURN sid AS schedule_id, collect({id: s.id, name: s.name}) AS students"
+        )
+        rosters = {sid: [] for sid in schedule_ids}
+        with self.neo4j_driver.session() as session, track("neo4j", "scheduled_students_batch"):
+            for record in session.run(query, sids=list(schedule_ids)):
+                rosters[record['schedule_id']] = record['students']
+        return rosters
+
+    def check_attendance_batch(self, student_ids, schedule_ids):
+        """
+        Пакетный вариант check_attendance: один запрос с ANY() вместо N×M.
+        Возвращает плотную матрицу посещаемости в виде битовых масок
+        {schedule_id: int}: бит i установлен, если student_ids[i] присутствовал.
+        """
+        student_pos = {sid: i for i, sid in enumerate(student_ids)}
+        matrix = {sch: 0 for sch in schedule_ids}
+        if not student_pos or not matrix:
+            return matrix
+        with track("postgres", "attendance_matrix"):
+            self.pg_cur.execute(
+                "SELECT student_id, schedule_id FROM Attendance "
+                "WHERE attended AND student_id = ANY(%s) AND schedule_id = ANY(%s)",
+                (list(student_pos), list(matrix))
+            )
+            rows = self.pg_cur.fetchall()
+        for student_id, schedule_id in rows:
+            matrix[schedule_id] |= 1 << student_pos[student_id]
+        return matrix
+
+    def get_roll_call(self, schedule_ids):
+        """
+        Ведомость посещаемости по списку расписаний за два запроса
+        (Neo4j + PostgreSQL). Возвращает
+        {schedule_id: [{'id': ..., 'name': ..., 'attended': bool}, ...]}.
+        """
+        rosters = self.get_scheduled_students_batch(schedule_ids)
+        student_ids = list({s['id'] for roster in rosters.values() for s in roster})
+        student_pos = {sid: i for i, sid in enumerate(student_ids)}
+        matrix = self.check_attendance_batch(student_ids, list(rosters))
+        return {
+            sch: [
+                {**s, 'attended': bool(matrix[sch] >> student_pos[s['id']] & 1)}
+                for s in roster
+            ]
+            for sch, roster in rosters.items()
+        }
+
     def generate_audience_report(self, year: int, semester: int):
         """
         Генерирует отчёт по аудитории: для всех лекций в семестре возвращает курс, лекцию,
@@ -224,7 +292,7 @@ class SyncService:
         start_date, end_date = self._calculate_semester_dates(year, semester)
         cypher = (
             "MATCH (sch:Schedule) "
-            "WHERE sch.date >= date($start) AND sch.date <= date($end) "
+            "WHERE sch.day >= date($start) AND sch.day <= date($end) "
             "MATCH (sch)-[:FOR_GROUP]->(g:Group)-[:HAS_STUDENT]->(s:Student) "
             "WITH sch, COUNT(DISTINCT s) AS total_students "
             "MATCH (l:Lecture)-[:SCHEDULED_AT]->(sch) "
@@ -234,7 +302,7 @@ class SyncService:
             "COLLECT(DISTINCT m.name) AS tech_requirements, total_students "
             "ORDER BY course_name, lecture_name"
         )
-        with self.neo4j_driver.session() as session:
+        with self.neo4j_driver.session() as session, track("neo4j", "audience_report"):
             results = session.run(
                 cypher,
                 start=str(start_date), end=str(end_date)
@@ -243,7 +311,7 @@ class SyncService:
 
     def generate_group_report(self, group_id: int, start_date=None, end_date=None):
         # 1. Извлекаем из Neo4j информацию по группе и её кафедре
-        with self.neo4j_driver.session() as session:
+        with self.neo4j_driver.session() as session, track("neo4j", "group_report"):
             # Сама группа
             rec = session.run(
                 "MATCH (g:Group {id:$gid}) "
@@ -298,22 +366,12 @@ class SyncService:
         student_ids  = [s['student_id']  for s in students]
         schedule_ids = [s['schedule_id'] for s in schedules]
 
-        # 3. Получаем фактические часы посещения из Postgres (с учётом партиций)
-        sql_att = """
-        SELECT
-        student_id,
-        schedule_id,
-        SUM((attended::int) * 2) AS attended_hours
-        FROM Attendance
-        WHERE student_id = ANY(%s)
-        AND schedule_id = ANY(%s)
-        GROUP BY student_id, schedule_id
-        """
-        self.pg_cur.execute(sql_att, (student_ids, schedule_ids))
-        att_map = {
-            (stu, sch): hrs
-            for stu, sch, hrs in self.pg_cur.fetchall()
-        }
+        if self.attendance_bitmaps is not None and self.attendance_bitmaps.ready():
+            # 3. Фактические часы посещения — BITOP/BITCOUNT по картам студентов в Redis
+            counts = self.attendance_bitmaps.attendance_counts(student_ids, schedule_ids)
+            attended_hours = {sid: 2 * attended for sid, (attended, _) in counts.items()}
+        else:
+            attended_hours = self._attended_hours(student_ids, schedule_ids)
 
         total_planned_all = 2 * len(schedule_ids)
 
@@ -322,10 +380,7 @@ class SyncService:
             sid = student['student_id']
             sname = student['student_name']
             # Сколько часов реально отслушал студент по всем расписаниям:
-            attended_total = sum(
-                att_map.get((sid, sch), 0)
-                for sch in schedule_ids
-            )
+            attended_total = attended_hours.get(sid, 0)
             remaining = total_planned_all - attended_total
 
             report.append({
@@ -338,6 +393,31 @@ class SyncService:
 
         return report
 
+    def _attended_hours(self, student_ids, schedule_ids):
+        # 3. Получаем фактические часы посещения из Postgres (с учётом партиций);
+        # дубликаты строк Attendance — одно занятие (2 часа), как в битовых картах
+        sql_att = """
+        SELECT
+        student_id,
+        schedule_id,
+        bool_or(attended)::int * 2 AS attended_hours
+        FROM Attendance
+        WHERE student_id = ANY(%s)
+        AND schedule_id = ANY(%s)
+        GROUP BY student_id, schedule_id
+        """
+        with track("postgres", "group_attendance"):
+            self.pg_cur.execute(sql_att, (student_ids, schedule_ids))
+            att_rows = self.pg_cur.fetchall()
+        att_map = {
+            (stu, sch): hrs
+            for stu, sch, hrs in att_rows
+        }
+        return {
+            sid: sum(att_map.get((sid, sch), 0) for sch in schedule_ids)
+            for sid in student_ids
+        }
+
 if __name__ == '__main__':
     service = SyncService()
     data = {'group_id': 1}
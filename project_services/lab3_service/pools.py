@@ -0,0 +1,95 @@
+"""
+Пулы соединений процесса-воркера (Postgres, Neo4j, Redis, Elasticsearch).
+
+Пулы открываются лениво при первом обращении или явно из gunicorn-хука
+post_worker_init, т.е. уже после fork: сокеты не делятся между воркерами.
+Если пулы всё же были открыты в мастере (preload_app), open() в воркере
+заметит смену pid и откроет свои. worker_exit вызывает close(): к этому
+моменту gunicorn уже дождался текущих запросов (graceful_timeout).
+
+Копия модуля лежит в каталоге каждого сервиса, как instrumentation.py.
+"""
+import os
+import threading
+
+PG_POOL_MIN = int(os.getenv("PG_POOL_MIN", 1))
+PG_POOL_MAX = int(os.getenv("PG_POOL_MAX", os.getenv("GUNICORN_THREADS", 4)))
+NEO4J_POOL_SIZE = int(os.getenv("NEO4J_POOL_SIZE", 50))
+REDIS_POOL_SIZE = int(os.getenv("REDIS_POOL_SIZE", 50))
+
+
+class ServicePools:
+    def __init__(self, pg_config=None, neo4j_uri=None, neo4j_auth=None,
+                 redis_host=None, redis_port=6379, es_config=None):
+        self.pg_config = pg_config
+        self.neo4j_uri = neo4j_uri
+        self.neo4j_auth = neo4j_auth
+        self.redis_host = redis_host
+        self.redis_port = redis_port
+        self.es_config = es_config
+        self._pid = None
+        self._lock = threading.Lock()
+        self._pg = self._neo4j = self._redis = self._es = None
+
+    def open(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return self
+            # пулы, унаследованные от родителя, не закрываем: их сокеты принадлежат ему
+            if self.pg_config is not None:
+                from psycopg2.pool import ThreadedConnectionPool
+                self._pg = ThreadedConnectionPool(PG_POOL_MIN, PG_POOL_MAX, **self.pg_config)
+            if self.neo4j_uri is not None:
+                from neo4j import GraphDatabase
+                self._neo4j = GraphDatabase.driver(self.neo4j_uri, auth=self.neo4j_auth,
+                                                   max_connection_pool_size=NEO4J_POOL_SIZE)
+            if self.redis_host is not None:
+                import redis
+                self._redis = redis.ConnectionPool(host=self.redis_host, port=self.redis_port,
+                                                   max_connections=REDIS_POOL_SIZE, decode_responses=True)
+            if self.es_config is not None:
+                from elasticsearch import Elasticsearch
+                self._es = Elasticsearch(**self.es_config)
+            self._pid = os.getpid()
+        return self
+
+    @property
+    def neo4j(self):
+        return self.open()._neo4j
+
+    @property
+    def es(self):
+        return self.open()._es
+
+    def redis(self):
+        """Клиент поверх общего пула; close() у него пул не закрывает."""
+        import redis
+        return redis.Redis(connection_pool=self.open()._redis)
+
+    def getconn(self):
+        """Соединение Postgres из пула; вернуть через putconn() в finally."""
+        return self.open()._pg.getconn()
+
+    def putconn(self, conn):
+        if self._pg is None:
+            conn.close()
+            return
+        if not conn.closed and not conn.autocommit:
+            # незавершённая транзакция не должна достаться следующему запросу
+            conn.rollback()
+        self._pg.putconn(conn, close=bool(conn.closed))
+
+    def close(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            if self._pg is not None:
+                self._pg.closeall()
+            if self._neo4j is not None:
+                self._neo4j.close()
+            if self._redis is not None:
+                self._redis.disconnect()
+            if self._es is not None:
+                self._es.close()
+            self._pg = self._neo4j = self._redis = self._es = None
+            self._pid = None